@@ -0,0 +1,515 @@
+"""
+Almacén persistente de vehículos registrados.
+
+Sustituye a la lista guardada en session['vehiculos'] (una cookie firmada
+que crecía con cada vehículo y se reenviaba en cada petición). Cada
+vehículo pertenece al usuario que lo registró y se identifica por un id
+estable, de modo que editar o eliminar no depende de la posición en la lista.
+
+El listado se pagina por cursor (keyset): el cursor codifica el valor de
+ordenación y el id del último vehículo de la página, de modo que cada
+página es una búsqueda por índice y su coste no depende de cuántos
+vehículos haya antes.
+
+Implementaciones:
+  - sqlite: fichero SQLite en modo WAL compartido entre workers (por defecto)
+  - memoria: diccionario en proceso, para desarrollo y pruebas
+"""
+
+import base64
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from datos import ruta_datos
+
+log = logging.getLogger(__name__)
+
+# Campos por los que se puede ordenar el listado
+ORDENES = ('fecha', 'kilometros')
+
+LIMITE_PAGINA_MAX = 200
+
+
+def _fecha_actual():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def kilometros_numericos(kilometros):
+    """Valor numérico de los kilómetros para ordenar (0 si no hay dígitos)"""
+    digitos = re.sub(r'\D', '', str(kilometros or ''))
+    return int(digitos) if digitos else 0
+
+
+def normalizar_prefijo(prefijo):
+    """Prefijo de matrícula en mayúsculas y sin espacios ni guiones"""
+    return re.sub(r'[\s-]', '', prefijo or '').upper()
+
+
+def limites_fecha(desde=None, hasta=None):
+    """
+    Convierte un rango de días 'AAAA-MM-DD' (ambos incluidos) en límites
+    [inicio, fin) comparables con la columna fecha
+
+    Raises:
+        ValueError: si alguna fecha no tiene el formato AAAA-MM-DD
+    """
+    inicio = fin = None
+    if desde:
+        inicio = datetime.strptime(desde, '%Y-%m-%d').strftime('%Y-%m-%d %H:%M:%S')
+    if hasta:
+        fin = (datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    return inicio, fin
+
+
+def codificar_cursor(valor, id_vehiculo):
+    """Cursor opaco con el valor de ordenación y el id del último vehículo"""
+    return base64.urlsafe_b64encode(json.dumps([valor, id_vehiculo]).encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """
+    Inverso de codificar_cursor
+
+    Raises:
+        ValueError: si el cursor no es válido
+    """
+    try:
+        valor, id_vehiculo = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Cursor no válido")
+    if not isinstance(id_vehiculo, int) or not isinstance(valor, (int, str)):
+        raise ValueError("Cursor no válido")
+    return valor, id_vehiculo
+
+
+class AlmacenVehiculos:
+    """Interfaz común de los almacenes de vehículos"""
+
+    nombre = 'base'
+
+    @classmethod
+    def desde_entorno(cls):
+        """
+        Crea el almacén indicado en VEHICULOS_ALMACEN ('sqlite' o 'memoria').
+        El fichero SQLite se toma de VEHICULOS_RUTA (por defecto
+        vehiculos.sqlite3 en el directorio de datos, ver datos.py).
+        """
+        nombre = os.getenv('VEHICULOS_ALMACEN', 'sqlite')
+        if nombre not in ALMACENES_DISPONIBLES:
+            raise ValueError(f"Almacén de vehículos desconocido: {nombre}")
+        if nombre == 'sqlite':
+            ruta = os.getenv('VEHICULOS_RUTA')
+            if not ruta:
+                ruta = ruta_datos('vehiculos.sqlite3')
+                # Las versiones anteriores lo guardaban en el directorio de trabajo
+                if not os.path.exists(ruta) and os.path.exists('vehiculos.sqlite3'):
+                    log.warning("Usando vehiculos.sqlite3 del directorio de trabajo; muévelo a %s", ruta)
+                    ruta = 'vehiculos.sqlite3'
+            return AlmacenVehiculosSQLite(ruta)
+        return ALMACENES_DISPONIBLES[nombre]()
+
+    def agregar(self, usuario, matricula, kilometros, fecha=None):
+        """
+        Registra un vehículo
+
+        Returns:
+            dict: Vehículo guardado con su id
+        """
+        raise NotImplementedError
+
+    def agregar_varios(self, usuario, vehiculos):
+        """Registra varios vehículos ({'matricula', 'kilometros', 'fecha'}) de una vez"""
+        for vehiculo in vehiculos:
+            self.agregar(usuario, vehiculo['matricula'], vehiculo['kilometros'], vehiculo.get('fecha'))
+
+    def agregar_lotes(self, usuario, lotes):
+        """
+        Registra vehículos por lotes (importación masiva), un lote por
+        transacción
+
+        Args:
+            usuario: Propietario de los vehículos
+            lotes: Iterable de listas de vehículos
+
+        Returns:
+            int: Número de vehículos registrados
+        """
+        total = 0
+        for lote in lotes:
+            self.agregar_varios(usuario, lote)
+            total += len(lote)
+        return total
+
+    def obtener(self, usuario, id_vehiculo):
+        """Devuelve el vehículo o None si no existe o es de otro usuario"""
+        raise NotImplementedError
+
+    def editar(self, usuario, id_vehiculo, matricula, kilometros):
+        """Actualiza un vehículo. Devuelve el vehículo actualizado o None si no existe"""
+        raise NotImplementedError
+
+    def eliminar(self, usuario, id_vehiculo):
+        """Elimina un vehículo. Devuelve el vehículo eliminado o None si no existe"""
+        raise NotImplementedError
+
+    def iterar(self, usuario):
+        """Recorre los vehículos del usuario en orden de registro"""
+        raise NotImplementedError
+
+    def listar(self, usuario):
+        """Lista los vehículos del usuario en orden de registro"""
+        return list(self.iterar(usuario))
+
+    def contar(self, usuario):
+        """Número de vehículos del usuario"""
+        raise NotImplementedError
+
+    def buscar_matricula(self, usuario, matricula):
+        """Registros de una matrícula del usuario, del más reciente al más antiguo"""
+        raise NotImplementedError
+
+    def lecturas_contiguas(self, usuario, matricula, fecha):
+        """
+        Registros de una matrícula inmediatamente anterior (o de la misma
+        fecha) y posterior a una fecha
+
+        Returns:
+            tuple: (anterior, siguiente), cada uno un vehículo o None
+        """
+        anterior = siguiente = None
+        for vehiculo in self.buscar_matricula(usuario, matricula):
+            if vehiculo['fecha'] <= fecha:
+                anterior = vehiculo
+                break
+            siguiente = vehiculo
+        return anterior, siguiente
+
+    def paginar(self, usuario, orden='fecha', descendente=True, prefijo=None, desde=None, hasta=None,
+                cursor=None, limite=50):
+        """
+        Página del listado de vehículos del usuario
+
+        Esta implementación filtra y ordena en memoria; los almacenes con
+        índices la sustituyen por una consulta.
+
+        Args:
+            usuario: Propietario de los vehículos
+            orden: Campo de ordenación ('fecha' o 'kilometros')
+            descendente: Orden descendente
+            prefijo: Prefijo de matrícula
+            desde: Primer día incluido ('AAAA-MM-DD')
+            hasta: Último día incluido ('AAAA-MM-DD')
+            cursor: Cursor devuelto en 'siguiente' por la página anterior
+            limite: Vehículos por página (máximo LIMITE_PAGINA_MAX)
+
+        Returns:
+            dict: {'vehiculos', 'siguiente'} y 'total' (solo en la primera página)
+
+        Raises:
+            ValueError: si el orden, las fechas o el cursor no son válidos
+        """
+        if orden not in ORDENES:
+            raise ValueError(f"Orden no válido: {orden}")
+        prefijo = normalizar_prefijo(prefijo)
+        inicio, fin = limites_fecha(desde, hasta)
+        limite = max(1, min(limite, LIMITE_PAGINA_MAX))
+
+        def clave(v):
+            valor = kilometros_numericos(v['kilometros']) if orden == 'kilometros' else v['fecha']
+            return valor, v['id']
+
+        candidatos = [
+            v for v in self.iterar(usuario)
+            if v['matricula'].startswith(prefijo)
+            and (inicio is None or v['fecha'] >= inicio)
+            and (fin is None or v['fecha'] < fin)
+        ]
+        resultado = {}
+        if cursor is None:
+            resultado['total'] = len(candidatos)
+        else:
+            posicion = decodificar_cursor(cursor)
+            candidatos = [v for v in candidatos if (clave(v) < posicion if descendente else clave(v) > posicion)]
+
+        candidatos.sort(key=clave, reverse=descendente)
+        pagina = candidatos[:limite]
+        resultado['vehiculos'] = pagina
+        resultado['siguiente'] = codificar_cursor(*clave(pagina[-1])) if len(candidatos) > limite else None
+        return resultado
+
+
+class AlmacenVehiculosSQLite(AlmacenVehiculos):
+    """Almacén en SQLite (WAL) con índices por usuario, matrícula y fecha"""
+
+    nombre = 'sqlite'
+
+    TAMANO_LOTE = 500
+
+    # Caché de páginas (KiB) durante las importaciones masivas
+    CACHE_CARGA_KB = 65536
+
+    def __init__(self, ruta):
+        """
+        Inicializa el almacén
+
+        Args:
+            ruta: Ruta del fichero SQLite (se crea si no existe)
+        """
+        self.ruta = ruta
+        self._local = threading.local()
+        self._inicializar()
+
+    def _conexion(self):
+        """Devuelve una conexión SQLite propia del hilo actual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _inicializar(self):
+        """Crea la tabla y los índices si no existen"""
+        conn = self._conexion()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS vehiculos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario TEXT NOT NULL,
+                    matricula TEXT NOT NULL,
+                    kilometros TEXT NOT NULL,
+                    fecha TEXT NOT NULL,
+                    km INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Tablas creadas antes de poder ordenar por kilómetros
+            columnas = [c['name'] for c in conn.execute("PRAGMA table_info(vehiculos)")]
+            if 'km' not in columnas:
+                conn.create_function('kilometros_numericos', 1, kilometros_numericos)
+                conn.execute("ALTER TABLE vehiculos ADD COLUMN km INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE vehiculos SET km = kilometros_numericos(kilometros)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vehiculos_usuario_id ON vehiculos (usuario, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vehiculos_usuario_fecha ON vehiculos (usuario, fecha)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vehiculos_usuario_matricula "
+                         "ON vehiculos (usuario, matricula, fecha)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vehiculos_usuario_km ON vehiculos (usuario, km)")
+        log.info("Almacén de vehículos SQLite en %s", self.ruta)
+
+    @staticmethod
+    def _a_dict(fila):
+        return {
+            'id': fila['id'],
+            'matricula': fila['matricula'],
+            'kilometros': fila['kilometros'],
+            'fecha': fila['fecha'],
+        }
+
+    def agregar(self, usuario, matricula, kilometros, fecha=None):
+        fecha = fecha or _fecha_actual()
+        conn = self._conexion()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO vehiculos (usuario, matricula, kilometros, fecha, km) VALUES (?, ?, ?, ?, ?)",
+                (usuario, matricula, kilometros, fecha, kilometros_numericos(kilometros))
+            )
+        return {'id': cursor.lastrowid, 'matricula': matricula, 'kilometros': kilometros, 'fecha': fecha}
+
+    def agregar_varios(self, usuario, vehiculos):
+        conn = self._conexion()
+        with conn:
+            conn.executemany(
+                "INSERT INTO vehiculos (usuario, matricula, kilometros, fecha, km) VALUES (?, ?, ?, ?, ?)",
+                ((usuario, v['matricula'], v['kilometros'], v.get('fecha') or _fecha_actual(),
+                  kilometros_numericos(v['kilometros']))
+                 for v in vehiculos)
+            )
+
+    def agregar_lotes(self, usuario, lotes):
+        # Con más caché las páginas de los índices se actualizan en memoria
+        # durante la carga en lugar de releerse del disco en cada lote
+        conn = self._conexion()
+        anterior = conn.execute("PRAGMA cache_size").fetchone()[0]
+        conn.execute(f"PRAGMA cache_size = -{self.CACHE_CARGA_KB}")
+        try:
+            return super().agregar_lotes(usuario, lotes)
+        finally:
+            conn.execute(f"PRAGMA cache_size = {anterior}")
+
+    def obtener(self, usuario, id_vehiculo):
+        fila = self._conexion().execute(
+            "SELECT * FROM vehiculos WHERE id = ? AND usuario = ?", (id_vehiculo, usuario)
+        ).fetchone()
+        return self._a_dict(fila) if fila else None
+
+    def editar(self, usuario, id_vehiculo, matricula, kilometros):
+        conn = self._conexion()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE vehiculos SET matricula = ?, kilometros = ?, km = ? WHERE id = ? AND usuario = ?",
+                (matricula, kilometros, kilometros_numericos(kilometros), id_vehiculo, usuario)
+            )
+        if cursor.rowcount == 0:
+            return None
+        return self.obtener(usuario, id_vehiculo)
+
+    def eliminar(self, usuario, id_vehiculo):
+        conn = self._conexion()
+        with conn:
+            fila = conn.execute(
+                "SELECT * FROM vehiculos WHERE id = ? AND usuario = ?", (id_vehiculo, usuario)
+            ).fetchone()
+            if fila is None:
+                return None
+            conn.execute("DELETE FROM vehiculos WHERE id = ?", (id_vehiculo,))
+        return self._a_dict(fila)
+
+    def iterar(self, usuario):
+        # Por lotes usando el índice (usuario, id), sin cargar todo en memoria
+        ultimo = 0
+        while True:
+            filas = self._conexion().execute(
+                "SELECT * FROM vehiculos WHERE usuario = ? AND id > ? ORDER BY id LIMIT ?",
+                (usuario, ultimo, self.TAMANO_LOTE)
+            ).fetchall()
+            for fila in filas:
+                yield self._a_dict(fila)
+            if len(filas) < self.TAMANO_LOTE:
+                return
+            ultimo = filas[-1]['id']
+
+    def contar(self, usuario):
+        return self._conexion().execute(
+            "SELECT COUNT(*) FROM vehiculos WHERE usuario = ?", (usuario,)
+        ).fetchone()[0]
+
+    def buscar_matricula(self, usuario, matricula):
+        filas = self._conexion().execute(
+            "SELECT * FROM vehiculos WHERE usuario = ? AND matricula = ? ORDER BY fecha DESC, id DESC",
+            (usuario, matricula)
+        ).fetchall()
+        return [self._a_dict(f) for f in filas]
+
+    def lecturas_contiguas(self, usuario, matricula, fecha):
+        # Dos búsquedas con LIMIT 1 sobre el índice (usuario, matricula, fecha)
+        conn = self._conexion()
+        anterior = conn.execute(
+            "SELECT * FROM vehiculos WHERE usuario = ? AND matricula = ? AND fecha <= ? "
+            "ORDER BY fecha DESC, id DESC LIMIT 1", (usuario, matricula, fecha)
+        ).fetchone()
+        siguiente = conn.execute(
+            "SELECT * FROM vehiculos WHERE usuario = ? AND matricula = ? AND fecha > ? "
+            "ORDER BY fecha, id LIMIT 1", (usuario, matricula, fecha)
+        ).fetchone()
+        return (self._a_dict(anterior) if anterior else None,
+                self._a_dict(siguiente) if siguiente else None)
+
+    def paginar(self, usuario, orden='fecha', descendente=True, prefijo=None, desde=None, hasta=None,
+                cursor=None, limite=50):
+        if orden not in ORDENES:
+            raise ValueError(f"Orden no válido: {orden}")
+        campo = 'km' if orden == 'kilometros' else 'fecha'
+        prefijo = normalizar_prefijo(prefijo)
+        inicio, fin = limites_fecha(desde, hasta)
+        limite = max(1, min(limite, LIMITE_PAGINA_MAX))
+
+        condiciones = ["usuario = ?"]
+        parametros = [usuario]
+        if prefijo:
+            # Rango [prefijo, prefijo siguiente) para aprovechar el índice por matrícula
+            condiciones.append("matricula >= ? AND matricula < ?")
+            parametros += [prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)]
+        if inicio:
+            condiciones.append("fecha >= ?")
+            parametros.append(inicio)
+        if fin:
+            condiciones.append("fecha < ?")
+            parametros.append(fin)
+
+        conn = self._conexion()
+        resultado = {}
+        if cursor is None:
+            resultado['total'] = conn.execute(
+                f"SELECT COUNT(*) FROM vehiculos WHERE {' AND '.join(condiciones)}", parametros
+            ).fetchone()[0]
+        else:
+            condiciones.append(f"({campo}, id) {'<' if descendente else '>'} (?, ?)")
+            parametros += list(decodificar_cursor(cursor))
+
+        direccion = 'DESC' if descendente else 'ASC'
+        filas = conn.execute(
+            f"SELECT * FROM vehiculos WHERE {' AND '.join(condiciones)} "
+            f"ORDER BY {campo} {direccion}, id {direccion} LIMIT ?",
+            parametros + [limite + 1]
+        ).fetchall()
+
+        resultado['vehiculos'] = [self._a_dict(f) for f in filas[:limite]]
+        resultado['siguiente'] = None
+        if len(filas) > limite:
+            ultima = filas[limite - 1]
+            resultado['siguiente'] = codificar_cursor(ultima[campo], ultima['id'])
+        return resultado
+
+
+class AlmacenVehiculosMemoria(AlmacenVehiculos):
+    """Almacén en memoria del proceso (no se comparte entre workers ni persiste)"""
+
+    nombre = 'memoria'
+
+    def __init__(self):
+        self._vehiculos = {}
+        self._siguiente_id = 1
+        self._lock = threading.Lock()
+
+    def agregar(self, usuario, matricula, kilometros, fecha=None):
+        with self._lock:
+            vehiculo = {'id': self._siguiente_id, 'matricula': matricula, 'kilometros': kilometros,
+                        'fecha': fecha or _fecha_actual()}
+            self._siguiente_id += 1
+            self._vehiculos.setdefault(usuario, {})[vehiculo['id']] = vehiculo
+            return dict(vehiculo)
+
+    def obtener(self, usuario, id_vehiculo):
+        with self._lock:
+            vehiculo = self._vehiculos.get(usuario, {}).get(id_vehiculo)
+            return dict(vehiculo) if vehiculo else None
+
+    def editar(self, usuario, id_vehiculo, matricula, kilometros):
+        with self._lock:
+            vehiculo = self._vehiculos.get(usuario, {}).get(id_vehiculo)
+            if vehiculo is None:
+                return None
+            vehiculo['matricula'] = matricula
+            vehiculo['kilometros'] = kilometros
+            return dict(vehiculo)
+
+    def eliminar(self, usuario, id_vehiculo):
+        with self._lock:
+            return self._vehiculos.get(usuario, {}).pop(id_vehiculo, None)
+
+    def iterar(self, usuario):
+        with self._lock:
+            vehiculos = [dict(v) for v in self._vehiculos.get(usuario, {}).values()]
+        return iter(vehiculos)
+
+    def contar(self, usuario):
+        with self._lock:
+            return len(self._vehiculos.get(usuario, {}))
+
+    def buscar_matricula(self, usuario, matricula):
+        with self._lock:
+            encontrados = [dict(v) for v in self._vehiculos.get(usuario, {}).values()
+                           if v['matricula'] == matricula]
+        return sorted(encontrados, key=lambda v: (v['fecha'], v['id']), reverse=True)
+
+
+ALMACENES_DISPONIBLES = {
+    'sqlite': AlmacenVehiculosSQLite,
+    'memoria': AlmacenVehiculosMemoria,
+}
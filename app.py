@@ -1,15 +1,32 @@
 """
 Aplicación Flask para reconocimiento OCR de matrículas y cuentakilómetros.
 Utiliza OpenCV y Google Gemini Vision.
+
+El OCR (ocr_processor, ocr_imagen y con ellos OpenCV, NumPy, Pillow y el
+cliente de Gemini) se importa la primera vez que hace falta o en el hilo de
+precalentamiento de cada worker, no al importar este módulo: el worker
+atiende /health, el login y los vehículos desde el primer momento.
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g
+from flask.wrappers import Request
+from werkzeug.exceptions import RequestEntityTooLarge
 import base64
-import io
-from PIL import Image
-import cv2
-import numpy as np
-from ocr_processor import OCRProcessor
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cola_ocr import ColaOCR, ESTADOS_FINALES
+from metricas import etapa, exportar as exportar_metricas, observar_peticion
+from registro import configurar_registro, copiar_contexto, id_peticion
+from almacen_vehiculos import LIMITE_PAGINA_MAX, AlmacenVehiculos
+from exportacion import generar_csv, generar_xlsx
+from importacion import importar_vehiculos
+from plausibilidad import ValidadorKilometraje
+from validacion import limpiar_cuentakilometros, limpiar_matricula
 import os
 from functools import wraps
 from dotenv import load_dotenv
@@ -18,8 +35,46 @@ from datetime import datetime
 # Cargar variables de entorno
 load_dotenv()
 
+# Registro en cola (antes de crear la app, para que Flask no añada su propio manejador)
+configurar_registro()
+
+# Tamaño máximo de los ficheros de importación de vehículos (MB)
+VEHICULOS_IMPORTACION_MAX_MB = int(os.getenv('VEHICULOS_IMPORTACION_MAX_MB', '200'))
+
+# Tamaño del lote de OCR: número máximo de imágenes y MB por imagen (ya en
+# base64, que ocupa un tercio más que la imagen)
+OCR_BATCH_MAX_IMAGENES = int(os.getenv('OCR_BATCH_MAX_IMAGENES', '200'))
+OCR_BATCH_MB_POR_IMAGEN = float(os.getenv('OCR_BATCH_MB_POR_IMAGEN', '2'))
+
+
+def limite_lote_bytes():
+    """
+    Tamaño máximo del cuerpo de /ocr/batch: proporcional al número de
+    imágenes y nunca menor que el límite general de una imagen
+    """
+    return max(int(OCR_BATCH_MAX_IMAGENES * OCR_BATCH_MB_POR_IMAGEN * 1024 * 1024),
+               app.config['MAX_CONTENT_LENGTH'])
+
+
+class PeticionApp(Request):
+    """Petición con límites de tamaño propios para la importación de vehículos y los lotes"""
+    
+    @property
+    def max_content_length(self):
+        # Werkzeug guarda en un temporal en disco los ficheros subidos, así que
+        # el límite mayor no aumenta la memoria usada
+        if self.endpoint == 'importar_vehiculos_fichero':
+            return VEHICULOS_IMPORTACION_MAX_MB * 1024 * 1024
+        # El lote llega como un único JSON con todas las imágenes: el límite
+        # general de 16MB pensado para una imagen lo cortaría a unas pocas
+        if self.endpoint == 'procesar_lote':
+            return limite_lote_bytes()
+        return super().max_content_length
+
+
 # Inicializar Flask
 app = Flask(__name__)
+app.request_class = PeticionApp
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Límite de 16MB para imágenes
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', os.urandom(24))  # Clave secreta para sesiones
 
@@ -36,24 +91,388 @@ def cargar_usuarios():
 
 USUARIOS = cargar_usuarios()
 
-# Inicializar procesador OCR con Gemini
+# Procesador OCR, uno por proceso y compartido por todos sus hilos (y su
+# cliente de Gemini con él). Con OCR_PRECALENTAR cada worker de gunicorn lo
+# crea y precalienta al arrancar (gunicorn.conf.py) en lugar de en la
+# primera lectura; /health responde 503 mientras tanto. Sin él, el worker
+# solo importa los módulos del OCR en segundo plano.
+OCR_PRECALENTAR = os.getenv('OCR_PRECALENTAR', '1') == '1'
 ocr_gemini = None
+ocr_lock = threading.Lock()
+ocr_precalentando = False
+ocr_error = False
 
-def get_ocr_processor():
-    """Obtiene el procesador OCR de Gemini"""
-    global ocr_gemini
+def get_ocr_processor(precalentar=False):
+    """
+    Obtiene el procesador OCR; los hilos que lo piden mientras se crea
+    esperan a que termine y reciben el mismo. Con precalentar=True, si hay
+    que crearlo se precalienta antes de ponerlo a disposición de los demás.
+    """
+    global ocr_gemini, ocr_error
     
     if ocr_gemini is None:
-        app.logger.info("Inicializando OCR Processor...")
-        try:
-            ocr_gemini = OCRProcessor(motor='gemini')
-            app.logger.info("OCR Processor inicializado correctamente")
-        except Exception as e:
-            app.logger.error(f"Error al inicializar OCR Processor: {str(e)}")
-            raise
+        with ocr_lock:
+            if ocr_gemini is None:
+                app.logger.info("Inicializando OCR Processor...")
+                try:
+                    # Importación diferida (ver el docstring del módulo)
+                    from ocr_processor import OCRProcessor
+                    procesador = OCRProcessor(motor=os.getenv('OCR_MOTORES', 'gemini'))
+                    if precalentar:
+                        procesador.precalentar()
+                except Exception as e:
+                    ocr_error = True
+                    app.logger.error(f"Error al inicializar OCR Processor: {str(e)}")
+                    raise
+                # Se publica ya precalentado: ningún hilo lo usa a medias
+                ocr_gemini = procesador
+                ocr_error = False
+                app.logger.info("OCR Processor inicializado correctamente")
     return ocr_gemini
 
 
+def precargar_modulos():
+    """Importa los módulos del OCR sin crear el procesador"""
+    try:
+        import ocr_processor  # noqa: F401
+    except Exception as e:
+        app.logger.error(f"Error al importar los módulos del OCR: {str(e)}")
+
+
+def iniciar_precalentamiento():
+    """
+    Crea y precalienta el procesador OCR en un hilo de fondo o, con
+    OCR_PRECALENTAR=0, solo importa sus módulos (sin afectar a /health).
+    Se llama en cada proceso que atiende peticiones, después del fork (las
+    conexiones de Gemini no deben compartirse entre procesos).
+    """
+    global ocr_precalentando
+    
+    if not OCR_PRECALENTAR:
+        threading.Thread(target=precargar_modulos, name='ocr-precargar', daemon=True).start()
+        return
+    
+    def precalentar():
+        global ocr_precalentando
+        try:
+            get_ocr_processor(precalentar=True)
+        except Exception:
+            pass  # Queda registrado y /health lo indica; se reintenta en la primera lectura
+        finally:
+            ocr_precalentando = False
+    
+    if ocr_gemini is None:
+        ocr_precalentando = True
+        threading.Thread(target=precalentar, name='ocr-precalentar', daemon=True).start()
+
+
+# Pool de hilos compartido para el procesamiento OCR por lotes.
+# Limita el número de llamadas concurrentes a Gemini por proceso,
+# independientemente del número de hilos de gunicorn.
+OCR_BATCH_CONCURRENCIA = int(os.getenv('OCR_BATCH_CONCURRENCIA', '8'))
+executor_ocr = None
+executor_lock = threading.Lock()
+
+def get_executor_ocr():
+    """Obtiene el pool de hilos para OCR por lotes"""
+    global executor_ocr
+    
+    with executor_lock:
+        if executor_ocr is None:
+            executor_ocr = ThreadPoolExecutor(
+                max_workers=OCR_BATCH_CONCURRENCIA,
+                thread_name_prefix='ocr-batch'
+            )
+    return executor_ocr
+
+
+# Almacén de vehículos (SQLite por defecto), compartido por los hilos del proceso
+almacen_vehiculos = None
+almacen_lock = threading.Lock()
+
+def get_almacen():
+    """Obtiene el almacén de vehículos configurado en VEHICULOS_*"""
+    global almacen_vehiculos
+    
+    with almacen_lock:
+        if almacen_vehiculos is None:
+            almacen_vehiculos = AlmacenVehiculos.desde_entorno()
+    return almacen_vehiculos
+
+
+# Comprobación del kilometraje con el historial de la matrícula
+VEHICULOS_KM_RELEER = os.getenv('VEHICULOS_KM_RELEER', '1') == '1'
+validador_kilometraje = None
+
+def get_validador_kilometraje():
+    """Obtiene el validador de kilometraje sobre el almacén de vehículos"""
+    global validador_kilometraje
+    
+    almacen = get_almacen()
+    with almacen_lock:
+        if validador_kilometraje is None:
+            validador_kilometraje = ValidadorKilometraje.desde_entorno(almacen)
+    return validador_kilometraje
+
+
+def evaluar_kilometraje(usuario, matricula, kilometros):
+    """Plausibilidad de una lectura según el historial de la matrícula del usuario"""
+    matricula = limpiar_matricula(matricula) or matricula
+    return get_validador_kilometraje().evaluar(usuario, matricula, kilometros)
+
+
+def verificar_lectura_kilometraje(resultado, usuario, matricula, img_cuentakilometros):
+    """
+    Añade al resultado del OCR la plausibilidad del kilometraje leído. Si
+    no es plausible, vuelve a leer el cuentakilómetros una vez (sin lectura
+    local ni caché) y se queda con la nueva lectura si esta sí lo es.
+    """
+    if not resultado.get('exito') or not matricula or not resultado.get('kilometros'):
+        return resultado
+    
+    plausibilidad = evaluar_kilometraje(usuario, matricula, resultado['kilometros'])
+    if not plausibilidad['plausible'] and VEHICULOS_KM_RELEER:
+        app.logger.info(f"Kilometraje no plausible para {matricula} ({plausibilidad['motivo']}), releyendo")
+        ocr = get_ocr_processor()
+        relectura = ocr.procesar_cuentakilometros(img_cuentakilometros, releer=True)
+        if relectura.get('exito') and relectura['kilometros'] != resultado['kilometros']:
+            plausibilidad_relectura = evaluar_kilometraje(usuario, matricula, relectura['kilometros'])
+            if plausibilidad_relectura['plausible']:
+                lectura = {
+                    'confianza': relectura.get('confianza', 0.0),
+                    'metodo': relectura.get('metodo', 'gemini')
+                }
+                resultado = {**resultado, 'kilometros': relectura['kilometros'], 'releido': True}
+                if 'campos' in resultado:
+                    # Lectura de vehículo: solo cambia el campo del cuentakilómetros
+                    resultado['campos'] = {**resultado['campos'], 'kilometros': lectura}
+                    resultado.update(ocr.resumir_campos(resultado['campos']))
+                else:
+                    resultado.update(lectura)
+                plausibilidad = plausibilidad_relectura
+    
+    resultado['plausibilidad'] = plausibilidad
+    return resultado
+
+
+def ejecutar_ocr(tipo, imagenes, usuario, matricula=None):
+    """
+    Lectura OCR completa de una petición (la usan los endpoints y la cola)
+    
+    Args:
+        tipo: 'matricula', 'cuentakilometros' o 'vehiculo'
+        imagenes: {campo: ImagenOCR}; 'image' o, para 'vehiculo',
+                  'matricula' y 'cuentakilometros'
+        usuario: Usuario cuyo historial se usa para comprobar el kilometraje
+        matricula: Matrícula del vehículo al leer solo el cuentakilómetros
+        
+    Returns:
+        dict: Resultado del OCR
+    """
+    ocr = get_ocr_processor()
+    if tipo == 'matricula':
+        return ocr.procesar_matricula(imagenes['image'])
+    if tipo == 'cuentakilometros':
+        resultado = ocr.procesar_cuentakilometros(imagenes['image'])
+        return verificar_lectura_kilometraje(resultado, usuario, matricula, imagenes['image'])
+    resultado = ocr.procesar_vehiculo(imagenes['matricula'], imagenes['cuentakilometros'])
+    return verificar_lectura_kilometraje(resultado, usuario, resultado.get('matricula'), imagenes['cuentakilometros'])
+
+
+def ejecutar_trabajo_ocr(tipo, imagenes, usuario, parametros):
+    """Ejecuta un trabajo de la cola OCR (imágenes como bytes codificados)"""
+    from ocr_imagen import ImagenOCR
+    
+    imagenes = {campo: ImagenOCR.desde_bytes(datos) for campo, datos in imagenes.items()}
+    return ejecutar_ocr(tipo, imagenes, usuario, parametros.get('matricula'))
+
+
+# Cola de trabajos OCR: con OCR_COLA=1 los clientes que envían
+# 'Prefer: respond-async' reciben un 202 con el trabajo en lugar de
+# esperar a la lectura, que hacen los hilos de la cola
+OCR_COLA = os.getenv('OCR_COLA', '0') == '1'
+OCR_COLA_EVENTOS_MAX = float(os.getenv('OCR_COLA_EVENTOS_MAX', '30'))
+cola_ocr = None
+cola_lock = threading.Lock()
+
+def get_cola_ocr():
+    """Obtiene la cola de trabajos OCR y arranca sus hilos en este proceso"""
+    global cola_ocr
+    
+    with cola_lock:
+        if cola_ocr is None:
+            cola_ocr = ColaOCR.desde_entorno(ejecutar_trabajo_ocr)
+            cola_ocr.iniciar()
+    return cola_ocr
+
+
+def preferir_asincrono():
+    """Si la petición OCR se debe encolar (cola activa y el cliente lo acepta)"""
+    return OCR_COLA and 'respond-async' in request.headers.get('Prefer', '')
+
+
+def encolar_ocr(tipo, imagenes, matricula=None):
+    """
+    Encola una lectura OCR y responde 202 con el trabajo
+    
+    Returns:
+        Response: {'trabajo', 'estado', 'url', 'eventos'} con la cabecera
+        Location apuntando al estado del trabajo
+    """
+    cola = get_cola_ocr()
+    id_trabajo = cola.encolar(
+        session['username'], tipo,
+        {campo: imagen.datos for campo, imagen in imagenes.items()},
+        {'matricula': matricula} if matricula else None
+    )
+    url = url_for('consultar_trabajo_ocr', id_trabajo=id_trabajo)
+    respuesta = jsonify({
+        'trabajo': id_trabajo,
+        'estado': 'pendiente',
+        'url': url,
+        'eventos': url_for('eventos_trabajo_ocr', id_trabajo=id_trabajo)
+    })
+    app.logger.info("Lectura OCR encolada como trabajo %s", id_trabajo, extra={'tipo': tipo})
+    respuesta.status_code = 202
+    respuesta.headers['Location'] = url
+    respuesta.headers['Preference-Applied'] = 'respond-async'
+    return respuesta
+
+
+def migrar_vehiculos_sesion():
+    """Traslada al almacén los vehículos que aún estén en la cookie de sesión"""
+    vehiculos = session.pop('vehiculos', None)
+    if vehiculos:
+        get_almacen().agregar_varios(session['username'], vehiculos)
+        app.logger.info(f"Migrados {len(vehiculos)} vehículos de la sesión de {session['username']}")
+
+
+class ImagenNoValida(ValueError):
+    """Los datos recibidos no son una imagen (los endpoints responden 400)"""
+
+
+def decodificar_imagen(image_data):
+    """
+    Decodifica una imagen en base64 (con o sin prefijo data URL)
+    
+    Args:
+        image_data: Cadena base64 o data URL
+        
+    Returns:
+        ImagenOCR: Imagen con los bytes originales, sin decodificar
+        
+    Raises:
+        ImagenNoValida: Si no es base64 válido o no contiene una imagen
+    """
+    if not isinstance(image_data, str):
+        raise ImagenNoValida("La imagen debe ser una cadena base64")
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',', 1)[1]
+    
+    try:
+        datos = base64.b64decode(image_data)
+    except ValueError as e:
+        raise ImagenNoValida(str(e)) from e
+    return imagen_desde_bytes(datos)
+
+
+def imagen_desde_bytes(datos):
+    """
+    Envuelve el fichero de imagen recibido (JPEG, PNG...) sin decodificarlo;
+    cada etapa del OCR decodifica solo la representación que necesita
+    
+    Args:
+        datos: bytes con el fichero de imagen
+        
+    Returns:
+        ImagenOCR: Imagen con los bytes originales
+        
+    Raises:
+        ImagenNoValida: Si los datos no son una imagen
+    """
+    # Importación diferida: OpenCV, NumPy y Pillow solo cuando llega una imagen
+    from ocr_imagen import ImagenOCR
+    
+    try:
+        imagen = ImagenOCR.desde_bytes(datos)
+        # Rechazar lo que no es una imagen leyendo solo la cabecera
+        imagen.tamano
+    except ValueError as e:
+        raise ImagenNoValida(str(e)) from e
+    return imagen
+
+
+def leer_imagen_peticion(campo='image', tipo=None):
+    """
+    Lee una imagen de la petición en cualquiera de los formatos admitidos:
+      - cuerpo binario con Content-Type image/* (p. ej. un Blob de canvas.toBlob)
+      - multipart/form-data con el fichero en el campo indicado
+      - JSON con la imagen en base64 (data URL) en el campo indicado
+    
+    La lectura se mide como la etapa 'lectura' del tipo indicado (por
+    defecto, el nombre del campo).
+    
+    Returns:
+        ImagenOCR: Imagen con los bytes recibidos, o None si la petición no
+        trae imagen
+        
+    Raises:
+        ImagenNoValida: Si lo recibido no es una imagen
+    """
+    with etapa('lectura', tipo or campo) as medida:
+        if request.mimetype.startswith('image/'):
+            datos = request.get_data(cache=False)
+            imagen = imagen_desde_bytes(datos) if datos else None
+        elif request.mimetype == 'multipart/form-data':
+            archivo = request.files.get(campo)
+            datos = archivo.read() if archivo else b''
+            imagen = imagen_desde_bytes(datos) if datos else None
+        else:
+            data = request.get_json(silent=True) or {}
+            imagen = decodificar_imagen(data[campo]) if data.get(campo) else None
+        if imagen is not None:
+            medida.bytes = len(imagen.datos)
+    return imagen
+
+
+def parametro_peticion(nombre):
+    """Parámetro adicional de una petición OCR (JSON, formulario o query string)"""
+    if request.is_json:
+        return (request.get_json(silent=True) or {}).get(nombre)
+    return request.form.get(nombre) or request.args.get(nombre)
+
+
+# Identificadores de petición aceptados en X-Request-ID (los demás se sustituyen)
+ID_PETICION_VALIDO = re.compile(r'[\w.:-]{1,64}')
+
+
+@app.before_request
+def iniciar_medida_peticion():
+    g.inicio_peticion = time.perf_counter()
+    # Identificador que acompaña a los registros de la petición
+    valor = request.headers.get('X-Request-ID', '')
+    g.id_peticion = valor if ID_PETICION_VALIDO.fullmatch(valor) else uuid.uuid4().hex[:16]
+    id_peticion.set(g.id_peticion)
+
+
+@app.after_request
+def medir_peticion(response):
+    """Registra la duración de la petición (en las respuestas en flujo, hasta el primer byte)"""
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        observar_peticion(request.endpoint, request.method, response.status_code,
+                          time.perf_counter() - inicio)
+    if 'id_peticion' in g:
+        response.headers['X-Request-ID'] = g.id_peticion
+    return response
+
+
+@app.teardown_request
+def terminar_registro_peticion(error):
+    # El hilo puede atender después otras tareas: que no hereden el identificador
+    id_peticion.set('-')
+
+
 def login_required(f):
     """Decorador para requerir login en las rutas"""
     @wraps(f)
@@ -103,13 +522,10 @@ def vehiculos():
     Pantalla de gestión de vehículos.
     Muestra tabla con matrículas y kilometrajes detectados.
     """
-    # Inicializar lista de vehículos en sesión si no existe
-    if 'vehiculos' not in session:
-        session['vehiculos'] = []
+    migrar_vehiculos_sesion()
     
-    return render_template('vehiculos.html', 
-                         username=session.get('username'),
-                         vehiculos=session.get('vehiculos', []))
+    # La tabla se rellena desde /api/vehiculos página a página
+    return render_template('vehiculos.html', username=session.get('username'))
 
 
 @app.route('/captura')
@@ -127,11 +543,17 @@ def procesar_matricula():
     """
     Endpoint para procesar imágenes de matrículas.
     
-    Espera un JSON con la imagen en base64:
+    Acepta la imagen como cuerpo binario (Content-Type image/jpeg), como
+    fichero 'image' de un formulario multipart o, como hasta ahora, en un
+    JSON en base64:
     {
         "image": "data:image/jpeg;base64,..."
     }
     
+    Con OCR_COLA=1 y la cabecera 'Prefer: respond-async' la lectura se
+    encola y se responde 202 con el trabajo (ver /ocr/trabajos/<id>); lo
+    mismo vale para /ocr/cuentakilometros y /ocr/vehiculo.
+    
     Retorna JSON con el resultado:
     {
         "success": true,
@@ -142,31 +564,28 @@ def procesar_matricula():
     }
     """
     try:
-        # Obtener datos de la imagen
-        data = request.get_json()
-        if not data or 'image' not in data:
+        # Leer la imagen de la petición (se decodifica solo si hace falta)
+        imagen = leer_imagen_peticion(tipo='matricula')
+        if imagen is None:
             return jsonify({
                 'success': False,
                 'error': 'No se recibió ninguna imagen'
             }), 400
         
-        # Decodificar imagen base64
-        image_data = data['image']
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convertir a formato OpenCV
-        img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        if preferir_asincrono():
+            return encolar_ocr('matricula', {'image': imagen})
         
         # Procesar matrícula con Gemini
-        ocr = get_ocr_processor()
-        resultado = ocr.procesar_matricula(img_cv)
+        resultado = ejecutar_ocr('matricula', {'image': imagen}, session['username'])
         
         return jsonify(resultado)
     
+    except ImagenNoValida as e:
+        app.logger.info(f"Imagen de matrícula no válida: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Imagen no válida'
+        }), 400
     except Exception as e:
         app.logger.error(f"Error procesando matrícula: {str(e)}")
         return jsonify({
@@ -181,9 +600,14 @@ def procesar_cuentakilometros():
     """
     Endpoint para procesar imágenes de cuentakilómetros.
     
-    Espera un JSON con la imagen en base64:
+    Acepta la imagen como cuerpo binario (Content-Type image/jpeg), como
+    fichero 'image' de un formulario multipart o en un JSON en base64, y
+    opcionalmente la matrícula del vehículo (campo del JSON o del
+    formulario, o ?matricula= con cuerpo binario) para comprobar la lectura
+    con su historial:
     {
-        "image": "data:image/jpeg;base64,..."
+        "image": "data:image/jpeg;base64,...",
+        "matricula": "1234ABC"
     }
     
     Retorna JSON con el resultado:
@@ -194,39 +618,37 @@ def procesar_cuentakilometros():
         "confianza": 90.2,
         "mensaje": "Lectura reconocida correctamente"
     }
+    
+    Con matrícula se añade 'plausibilidad' (ver ValidadorKilometraje) y
+    'releido' si la primera lectura no era plausible y se sustituyó.
     """
     try:
-        app.logger.info("Recibida petición para procesar cuentakilómetros")
-        
-        # Obtener datos de la imagen
-        data = request.get_json()
-        if not data or 'image' not in data:
+        # Leer la imagen de la petición (se decodifica solo si hace falta)
+        imagen = leer_imagen_peticion(tipo='cuentakilometros')
+        if imagen is None:
             app.logger.error("No se recibió imagen en la petición")
             return jsonify({
                 'exito': False,
                 'error': 'No se recibió ninguna imagen'
             }), 400
         
-        # Decodificar imagen base64
-        image_data = data['image']
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convertir a formato OpenCV
-        img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        if preferir_asincrono():
+            return encolar_ocr('cuentakilometros', {'image': imagen}, parametro_peticion('matricula'))
         
         # Procesar cuentakilómetros con Gemini
-        app.logger.info("Procesando con motor: Gemini")
-        ocr = get_ocr_processor()
-        resultado = ocr.procesar_cuentakilometros(img_cv)
+        resultado = ejecutar_ocr('cuentakilometros', {'image': imagen}, session['username'],
+                                 parametro_peticion('matricula'))
         
-        app.logger.info(f"Resultado OCR: {resultado}")
+        app.logger.debug("Resultado OCR: %s", resultado)
         
         return jsonify(resultado)
     
+    except ImagenNoValida as e:
+        app.logger.info(f"Imagen de cuentakilómetros no válida: {str(e)}")
+        return jsonify({
+            'exito': False,
+            'error': 'Imagen no válida'
+        }), 400
     except Exception as e:
         app.logger.error(f"Error procesando cuentakilómetros: {str(e)}", exc_info=True)
         return jsonify({
@@ -235,14 +657,314 @@ def procesar_cuentakilometros():
         }), 500
 
 
+@app.route('/ocr/vehiculo', methods=['POST'])
+@login_required
+def procesar_vehiculo():
+    """
+    Endpoint para procesar matrícula y cuentakilómetros en una sola petición.
+    
+    Espera ambas imágenes como ficheros 'matricula' y 'cuentakilometros' de
+    un formulario multipart o en un JSON en base64:
+    {
+        "matricula": "data:image/jpeg;base64,...",
+        "cuentakilometros": "data:image/jpeg;base64,..."
+    }
+    
+    Retorna JSON con el resultado:
+    {
+        "exito": true,
+        "matricula": "1234ABC",
+        "kilometros": "123456",
+        "confianza": 0.95,
+        "metodo": "gemini_combinado",
+        "campos": {
+            "matricula": {"metodo": "gemini_combinado", "confianza": 0.95},
+            "kilometros": {"metodo": "gemini_combinado", "confianza": 0.95}
+        },
+        "plausibilidad": {"plausible": true, ...}
+    }
+    
+    'metodo' une los métodos de ambos campos (p. ej. "cache+local_7seg")
+    y 'confianza' es la menor de las dos.
+    """
+    try:
+        img_matricula = leer_imagen_peticion('matricula')
+        img_cuentakilometros = leer_imagen_peticion('cuentakilometros')
+        if img_matricula is None or img_cuentakilometros is None:
+            return jsonify({
+                'exito': False,
+                'error': 'Se requieren las imágenes de matrícula y cuentakilómetros'
+            }), 400
+        
+        imagenes = {'matricula': img_matricula, 'cuentakilometros': img_cuentakilometros}
+        if preferir_asincrono():
+            return encolar_ocr('vehiculo', imagenes)
+        
+        resultado = ejecutar_ocr('vehiculo', imagenes, session['username'])
+        
+        return jsonify(resultado)
+    
+    except ImagenNoValida as e:
+        app.logger.info(f"Imagen de vehículo no válida: {str(e)}")
+        return jsonify({
+            'exito': False,
+            'error': 'Imagen no válida'
+        }), 400
+    except Exception as e:
+        app.logger.error(f"Error procesando vehículo: {str(e)}", exc_info=True)
+        return jsonify({
+            'exito': False,
+            'error': f'Error al procesar las imágenes: {str(e)}'
+        }), 500
+
+
+def procesar_item_lote(indice, item):
+    """
+    Procesa una imagen de un lote (se ejecuta en el pool de OCR).
+    
+    Returns:
+        dict: Resultado del OCR con el índice e id del elemento
+    """
+    base = {'indice': indice, 'id': item.get('id'), 'tipo': item.get('tipo')}
+    try:
+        tipo = item.get('tipo')
+        if tipo not in ('matricula', 'cuentakilometros'):
+            return {**base, 'exito': False, 'error': f'Tipo de OCR no válido: {tipo}'}
+        if not item.get('image'):
+            return {**base, 'exito': False, 'error': 'No se recibió ninguna imagen'}
+        
+        with etapa('lectura', tipo) as medida:
+            imagen = decodificar_imagen(item['image'])
+            medida.bytes = len(imagen.datos)
+        ocr = get_ocr_processor()
+        if tipo == 'matricula':
+            resultado = ocr.procesar_matricula(imagen)
+        else:
+            resultado = ocr.procesar_cuentakilometros(imagen)
+        return {**base, **resultado}
+    
+    except ImagenNoValida:
+        return {**base, 'exito': False, 'error': 'Imagen no válida'}
+    except Exception as e:
+        app.logger.error(f"Error procesando elemento {indice} del lote: {str(e)}")
+        return {**base, 'exito': False, 'error': f'Error al procesar la imagen: {str(e)}'}
+
+
+@app.route('/ocr/batch', methods=['POST'])
+@login_required
+def procesar_lote():
+    """
+    Endpoint para procesar un lote de imágenes de forma concurrente.
+    
+    Espera un JSON con la lista de imágenes:
+    {
+        "imagenes": [
+            {"id": "v1", "tipo": "matricula", "image": "data:image/jpeg;base64,..."},
+            {"id": "v1", "tipo": "cuentakilometros", "image": "data:image/jpeg;base64,..."}
+        ]
+    }
+    
+    Devuelve NDJSON (una línea JSON por imagen) a medida que se completan:
+    {"indice": 0, "id": "v1", "tipo": "matricula", "exito": true, "matricula": "1234ABC", ...}
+    
+    El cuerpo admite hasta OCR_BATCH_MB_POR_IMAGEN MB por cada una de las
+    OCR_BATCH_MAX_IMAGENES imágenes; por encima responde 413.
+    """
+    try:
+        data = request.get_json(silent=True)
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': f'El lote supera el máximo de {limite_lote_bytes() // (1024 * 1024)} MB'
+        }), 413
+    imagenes = data.get('imagenes') if isinstance(data, dict) else None
+    if not isinstance(imagenes, list) or not imagenes:
+        return jsonify({
+            'success': False,
+            'error': 'Se requiere una lista de imágenes'
+        }), 400
+    
+    if len(imagenes) > OCR_BATCH_MAX_IMAGENES:
+        return jsonify({
+            'success': False,
+            'error': f'El lote supera el máximo de {OCR_BATCH_MAX_IMAGENES} imágenes'
+        }), 400
+    
+    # Inicializar el procesador antes de lanzar los hilos
+    try:
+        get_ocr_processor()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error al inicializar OCR: {str(e)}'
+        }), 500
+    
+    executor = get_executor_ocr()
+    futuros = [
+        executor.submit(copiar_contexto(procesar_item_lote), indice, item if isinstance(item, dict) else {})
+        for indice, item in enumerate(imagenes)
+    ]
+    del data, imagenes
+    
+    def generar():
+        try:
+            for futuro in as_completed(futuros):
+                yield json.dumps(futuro.result(), ensure_ascii=False) + '\n'
+        finally:
+            # Si el cliente se desconecta, cancelar lo que aún no ha empezado
+            for futuro in futuros:
+                futuro.cancel()
+    
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson')
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """
     Endpoint para verificar el estado de la aplicación.
+    
+    Responde 503 mientras el worker precalienta el procesador OCR, para que
+    el balanceador no le envíe tráfico hasta que esté listo. 'ocr' indica el
+    estado del procesador: 'listo', 'pendiente' (se creará en la primera
+    lectura) o 'error' (la aplicación sigue funcionando sin OCR).
     """
+    if ocr_precalentando:
+        return jsonify({
+            'status': 'iniciando',
+            'message': 'Preparando el procesador OCR',
+            'ocr': 'pendiente'
+        }), 503
     return jsonify({
         'status': 'ok',
-        'message': 'Aplicación OCR funcionando correctamente'
+        'message': 'Aplicación OCR funcionando correctamente',
+        'ocr': 'listo' if ocr_gemini is not None else 'error' if ocr_error else 'pendiente'
+    })
+
+
+# Token opcional para /metrics (el scraper de Prometheus no inicia sesión)
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """
+    Métricas en el formato de texto de Prometheus: duración y tamaño de cada
+    etapa del OCR y duración de las peticiones por endpoint, sumando todos
+    los workers de gunicorn. Con METRICAS_TOKEN definido se exige la
+    cabecera 'Authorization: Bearer <token>'.
+    """
+    if METRICAS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                  f'Bearer {METRICAS_TOKEN}'):
+        return jsonify({
+            'success': False,
+            'error': 'No autorizado'
+        }), 401
+    cuerpo, content_type = exportar_metricas()
+    return Response(cuerpo, content_type=content_type)
+
+
+@app.route('/ocr/cache/estadisticas', methods=['GET'])
+@login_required
+def estadisticas_cache():
+    """
+    Devuelve los contadores de la caché de resultados OCR
+    (aciertos, fallos, llamadas a la API evitadas y latencia ahorrada).
+    """
+    ocr = get_ocr_processor()
+    return jsonify(ocr.cache.estadisticas())
+
+
+@app.route('/ocr/trabajos/<id_trabajo>', methods=['GET'])
+@login_required
+def consultar_trabajo_ocr(id_trabajo):
+    """
+    Estado de un trabajo OCR encolado:
+    {"trabajo": "...", "tipo": "matricula", "estado": "pendiente", "posicion": 1}
+    {"trabajo": "...", "tipo": "matricula", "estado": "completado", "resultado": {...}}
+    {"trabajo": "...", "tipo": "matricula", "estado": "error", "error": "..."}
+    """
+    trabajo = get_cola_ocr().consultar(id_trabajo, session['username']) if OCR_COLA else None
+    if trabajo is None:
+        return jsonify({
+            'success': False,
+            'error': 'Trabajo no encontrado'
+        }), 404
+    
+    respuesta = jsonify(trabajo)
+    if trabajo['estado'] not in ESTADOS_FINALES:
+        respuesta.headers['Retry-After'] = '1'
+    return respuesta
+
+
+@app.route('/ocr/trabajos/<id_trabajo>/eventos', methods=['GET'])
+@login_required
+def eventos_trabajo_ocr(id_trabajo):
+    """
+    Server-sent events con los cambios de estado de un trabajo OCR (mismo
+    JSON que /ocr/trabajos/<id>); el flujo se cierra al terminar el trabajo
+    o tras OCR_COLA_EVENTOS_MAX segundos (EventSource vuelve a conectar).
+    
+    Con gunicorn en modo hilos cada conexión abierta ocupa un hilo, por lo
+    que captura.js consulta el estado por sondeo; los eventos están pensados
+    para el worker gevent (GUNICORN_WORKER_CLASS=gevent).
+    """
+    cola = get_cola_ocr() if OCR_COLA else None
+    usuario = session['username']
+    if cola is None or cola.consultar(id_trabajo, usuario) is None:
+        return jsonify({
+            'success': False,
+            'error': 'Trabajo no encontrado'
+        }), 404
+    
+    def generar():
+        anterior = None
+        inicio = time.monotonic()
+        ultimo_envio = inicio
+        while True:
+            trabajo = cola.consultar(id_trabajo, usuario)
+            if trabajo is None:
+                return
+            if trabajo != anterior:
+                yield f"event: {trabajo['estado']}\ndata: {json.dumps(trabajo, ensure_ascii=False)}\n\n"
+                anterior = trabajo
+                ultimo_envio = time.monotonic()
+            if trabajo['estado'] in ESTADOS_FINALES or time.monotonic() - inicio > OCR_COLA_EVENTOS_MAX:
+                return
+            if time.monotonic() - ultimo_envio > 15:
+                # Comentario para que los proxies no cierren la conexión
+                yield ": \n\n"
+                ultimo_envio = time.monotonic()
+            time.sleep(0.25)
+    
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/ocr/cola', methods=['GET'])
+@login_required
+def estadisticas_cola():
+    """
+    Devuelve el número de trabajos OCR por estado y los contadores de los
+    hilos de la cola de este proceso.
+    """
+    if not OCR_COLA:
+        return jsonify({'activa': False})
+    return jsonify({'activa': True, **get_cola_ocr().estadisticas()})
+
+
+@app.route('/ocr/motores', methods=['GET'])
+@login_required
+def estadisticas_motores():
+    """
+    Devuelve el orden actual de los motores OCR y sus estadísticas recientes
+    (latencia, tasa de errores y confianza) usadas por el enrutador, junto
+    con los plazos agotados y coberturas de las llamadas a Gemini.
+    """
+    ocr = get_ocr_processor()
+    return jsonify({
+        'orden': [m.nombre for m in ocr.enrutador.ordenar()],
+        'motores': ocr.enrutador.resumen(),
+        'gemini': ocr.llamador.estadisticas() if ocr.llamador else None
     })
 
 
@@ -264,12 +986,56 @@ def debug_config():
     })
 
 
+@app.route('/api/vehiculos', methods=['GET'])
+@login_required
+def listar_vehiculos():
+    """
+    Listado paginado de los vehículos del usuario.
+    
+    Parámetros (query string, todos opcionales):
+      - matricula: prefijo de matrícula
+      - desde / hasta: rango de días AAAA-MM-DD (ambos incluidos)
+      - orden: 'fecha' (por defecto) o 'kilometros'
+      - direccion: 'desc' (por defecto) o 'asc'
+      - limite: vehículos por página (50 por defecto, máximo 200)
+      - cursor: valor de 'siguiente' devuelto por la página anterior
+    
+    La respuesta incluye 'siguiente' (None en la última página) y, en la
+    primera página, 'total' con el número de vehículos que cumplen el filtro.
+    """
+    # Un límite que no es un número se ignora (50); fuera de rango se ajusta
+    limite = max(1, min(request.args.get('limite', 50, type=int), LIMITE_PAGINA_MAX))
+    try:
+        pagina = get_almacen().paginar(
+            session['username'],
+            orden=request.args.get('orden', 'fecha'),
+            descendente=request.args.get('direccion', 'desc') != 'asc',
+            prefijo=request.args.get('matricula'),
+            desde=request.args.get('desde'),
+            hasta=request.args.get('hasta'),
+            cursor=request.args.get('cursor') or None,
+            limite=limite,
+        )
+    except ValueError as e:
+        app.logger.info(f"Parámetros del listado no válidos: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Parámetros del listado no válidos: revisa las fechas (AAAA-MM-DD), el orden y el cursor'
+        }), 400
+    
+    return jsonify({'success': True, **pagina})
+
+
 @app.route('/agregar_vehiculo', methods=['POST'])
 @login_required
 def agregar_vehiculo():
     """
-    Agrega un vehículo a la lista en sesión.
+    Agrega un vehículo al almacén del usuario.
     Espera JSON con matricula y kilometros.
+    
+    Si el kilometraje no es plausible según el historial de la matrícula
+    se responde 409 con 'plausibilidad', salvo que el JSON incluya
+    "confirmar": true.
     """
     try:
         data = request.get_json()
@@ -282,23 +1048,36 @@ def agregar_vehiculo():
                 'error': 'Se requieren matrícula y kilómetros'
             }), 400
         
-        # Inicializar lista si no existe
-        if 'vehiculos' not in session:
-            session['vehiculos'] = []
+        # Misma forma que las leídas por OCR o importadas (sin espacios ni
+        # guiones; el kilometraje solo con dígitos)
+        matricula = limpiar_matricula(str(matricula))
+        if not matricula:
+            return jsonify({
+                'success': False,
+                'error': 'Matrícula no válida'
+            }), 400
+        kilometros = limpiar_cuentakilometros(str(kilometros))
+        if not kilometros:
+            return jsonify({
+                'success': False,
+                'error': 'Kilometraje no válido'
+            }), 400
         
-        # Agregar vehículo
-        vehiculo = {
-            'matricula': matricula,
-            'kilometros': kilometros,
-            'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        plausibilidad = evaluar_kilometraje(session['username'], matricula, kilometros)
+        if not plausibilidad['plausible'] and not data.get('confirmar'):
+            return jsonify({
+                'success': False,
+                'error': plausibilidad['motivo'],
+                'plausibilidad': plausibilidad
+            }), 409
         
-        session['vehiculos'].append(vehiculo)
-        session.modified = True
+        # Agregar vehículo
+        vehiculo = get_almacen().agregar(session['username'], matricula, kilometros)
         
         return jsonify({
             'success': True,
-            'vehiculo': vehiculo
+            'vehiculo': vehiculo,
+            'plausibilidad': plausibilidad
         })
     
     except Exception as e:
@@ -313,36 +1092,45 @@ def agregar_vehiculo():
 @login_required
 def editar_vehiculo():
     """
-    Edita un vehículo existente en la lista.
-    Espera JSON con index, matricula y kilometros.
+    Edita un vehículo existente del usuario.
+    Espera JSON con id, matricula y kilometros.
     """
     try:
         data = request.get_json()
-        index = data.get('index')
+        id_vehiculo = data.get('id')
         matricula = data.get('matricula', '')
         kilometros = data.get('kilometros', '')
         
-        if index is None or not matricula or not kilometros:
+        if not isinstance(id_vehiculo, int) or not matricula or not kilometros:
+            return jsonify({
+                'success': False,
+                'error': 'Se requieren id, matrícula y kilómetros'
+            }), 400
+        
+        matricula = limpiar_matricula(str(matricula))
+        if not matricula:
             return jsonify({
                 'success': False,
-                'error': 'Se requieren índice, matrícula y kilómetros'
+                'error': 'Matrícula no válida'
+            }), 400
+        kilometros = limpiar_cuentakilometros(str(kilometros))
+        if not kilometros:
+            return jsonify({
+                'success': False,
+                'error': 'Kilometraje no válido'
             }), 400
         
-        # Validar que existe la lista y el índice
-        if 'vehiculos' not in session or index >= len(session['vehiculos']):
+        # Actualizar vehículo (solo si pertenece al usuario)
+        vehiculo = get_almacen().editar(session['username'], id_vehiculo, matricula, kilometros)
+        if vehiculo is None:
             return jsonify({
                 'success': False,
                 'error': 'Vehículo no encontrado'
             }), 404
         
-        # Actualizar vehículo
-        session['vehiculos'][index]['matricula'] = matricula
-        session['vehiculos'][index]['kilometros'] = kilometros
-        session.modified = True
-        
         return jsonify({
             'success': True,
-            'vehiculo': session['vehiculos'][index]
+            'vehiculo': vehiculo
         })
     
     except Exception as e:
@@ -357,30 +1145,27 @@ def editar_vehiculo():
 @login_required
 def eliminar_vehiculo():
     """
-    Elimina un vehículo de la lista.
-    Espera JSON con index.
+    Elimina un vehículo del usuario.
+    Espera JSON con id.
     """
     try:
         data = request.get_json()
-        index = data.get('index')
+        id_vehiculo = data.get('id')
         
-        if index is None:
+        if not isinstance(id_vehiculo, int):
             return jsonify({
                 'success': False,
-                'error': 'Se requiere el índice del vehículo'
+                'error': 'Se requiere el id del vehículo'
             }), 400
         
-        # Validar que existe la lista y el índice
-        if 'vehiculos' not in session or index >= len(session['vehiculos']):
+        # Eliminar vehículo (solo si pertenece al usuario)
+        vehiculo_eliminado = get_almacen().eliminar(session['username'], id_vehiculo)
+        if vehiculo_eliminado is None:
             return jsonify({
                 'success': False,
                 'error': 'Vehículo no encontrado'
             }), 404
         
-        # Eliminar vehículo
-        vehiculo_eliminado = session['vehiculos'].pop(index)
-        session.modified = True
-        
         return jsonify({
             'success': True,
             'vehiculo': vehiculo_eliminado
@@ -394,62 +1179,82 @@ def eliminar_vehiculo():
         }), 500
 
 
-@app.route('/descargar_excel')
+@app.route('/importar_vehiculos', methods=['POST'])
 @login_required
-def descargar_excel():
+def importar_vehiculos_fichero():
     """
-    Genera y descarga un archivo Excel con los vehículos registrados.
+    Importa vehículos desde un fichero CSV o XLSX (campo 'archivo' de un
+    formulario multipart) con columnas Matrícula, Kilometraje y Fecha.
+    
+    Las filas se validan con las mismas reglas que el OCR; las no válidas
+    se cuentan en 'rechazados' y las primeras se detallan en 'errores'.
     """
     try:
-        # Importar openpyxl solo cuando se necesita
-        from openpyxl import Workbook
-        
-        vehiculos = session.get('vehiculos', [])
-        
-        if not vehiculos:
+        archivo = request.files.get('archivo')
+        if archivo is None or not archivo.filename:
             return jsonify({
                 'success': False,
-                'error': 'No hay vehículos para descargar'
+                'error': 'Se requiere un fichero CSV o XLSX'
             }), 400
         
-        # Crear libro de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Vehículos"
-        
-        # Encabezados
-        ws['A1'] = 'Matrícula'
-        ws['B1'] = 'Kilometraje'
-        ws['C1'] = 'Fecha de Registro'
-        
-        # Aplicar formato a encabezados
-        for cell in ws[1]:
-            cell.font = cell.font.copy(bold=True)
-        
-        # Agregar datos
-        for idx, vehiculo in enumerate(vehiculos, start=2):
-            ws[f'A{idx}'] = vehiculo.get('matricula', '')
-            ws[f'B{idx}'] = vehiculo.get('kilometros', '')
-            ws[f'C{idx}'] = vehiculo.get('fecha', '')
-        
-        # Ajustar ancho de columnas
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 20
-        
-        # Guardar en memoria
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        # Nombre del archivo con fecha
-        filename = f'vehiculos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        resumen = importar_vehiculos(get_almacen(), session['username'], archivo.stream,
+                                     nombre=archivo.filename)
+        
+        return jsonify({'success': True, **resumen})
+    
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': f'El fichero supera el máximo de {VEHICULOS_IMPORTACION_MAX_MB} MB'
+        }), 413
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        app.logger.error(f"Error importando vehículos: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def respuesta_exportacion(generador, extension, mimetype):
+    """
+    Respuesta en streaming con la exportación de los vehículos del usuario.
+    Las filas se leen del almacén por lotes mientras se envía el fichero.
+    """
+    usuario = session['username']
+    almacen = get_almacen()
+    
+    if almacen.contar(usuario) == 0:
+        return jsonify({
+            'success': False,
+            'error': 'No hay vehículos para descargar'
+        }), 400
+    
+    # Nombre del archivo con fecha
+    filename = f'vehiculos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    return Response(
+        stream_with_context(generador(almacen.iterar(usuario))),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@app.route('/descargar_excel')
+@login_required
+def descargar_excel():
+    """
+    Descarga un archivo Excel con los vehículos registrados, generado en
+    streaming con memoria acotada.
+    """
+    try:
+        return respuesta_exportacion(
+            generar_xlsx, 'xlsx',
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
     except Exception as e:
@@ -460,6 +1265,24 @@ def descargar_excel():
         }), 500
 
 
+@app.route('/descargar_csv')
+@login_required
+def descargar_csv():
+    """
+    Descarga un archivo CSV (separador ';') con los vehículos registrados,
+    generado en streaming.
+    """
+    try:
+        return respuesta_exportacion(generar_csv, 'csv', 'text/csv; charset=utf-8')
+    
+    except Exception as e:
+        app.logger.error(f"Error generando CSV: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 if __name__ == '__main__':
     # Ejecutar en modo debug para desarrollo
     # En producción, usar un servidor WSGI como Gunicorn
@@ -482,7 +1305,7 @@ if __name__ == '__main__':
     print("=" * 60)
     print("🚀 Iniciando servidor Flask...")
     print("📷 Aplicación OCR - Matrículas y Cuentakilómetros")
-    print("🔄 Motores OCR: Tesseract + OCR.space API + Gemini 2.5 Flash")
+    print(f"🔄 Motores OCR: {os.getenv('OCR_MOTORES', 'gemini')}")
     print(f"🔒 Protocolo: {protocolo.upper()}")
     print("=" * 60)
     print()
@@ -525,6 +1348,10 @@ if __name__ == '__main__':
     if tiene_ssl:
         ssl_context = ('cert.pem', 'key.pem')
     
+    # Con debug el recargador ejecuta la aplicación en un proceso hijo: se precalienta solo allí
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_precalentamiento()
+    
     # host='0.0.0.0' permite acceso desde cualquier IP en la red
     app.run(
         debug=True, 
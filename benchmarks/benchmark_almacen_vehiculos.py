@@ -0,0 +1,106 @@
+"""
+Prueba de carga del almacén de vehículos frente a la lista en sesión.
+
+Con la aplicación Flask en proceso (test_client) y un almacén SQLite
+temporal, rellena la flota del usuario hasta 0, 1.000, 10.000 y 20.000
+vehículos y en cada punto mide:
+  - tamaño de la cookie de sesión que envía el navegador
+  - tamaño que tendría la cookie con la lista en session['vehiculos']
+  - p50/p95 de latencia de agregar, editar y eliminar un vehículo
+
+Uso: python benchmarks/benchmark_almacen_vehiculos.py [--operaciones 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = (0, 1000, 10000, 20000)
+
+
+def cookie_sesion(cliente):
+    """Tamaño en bytes de la cookie de sesión guardada en el cliente"""
+    cookie = cliente.get_cookie('session')
+    return len(cookie.value) if cookie else 0
+
+
+def cookie_lista(app, usuario, vehiculos):
+    """Tamaño de la cookie firmada si la flota estuviera en session['vehiculos']"""
+    serializador = app.session_interface.get_signing_serializer(app)
+    return len(serializador.dumps({'username': usuario, 'vehiculos': vehiculos}))
+
+
+def medir(funcion, operaciones):
+    latencias = []
+    for i in range(operaciones):
+        inicio = time.perf_counter()
+        funcion(i)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return np.percentile(latencias, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operaciones', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['VEHICULOS_ALMACEN'] = 'sqlite'
+    os.environ['VEHICULOS_RUTA'] = os.path.join(tempfile.mkdtemp(), 'vehiculos.sqlite3')
+    os.environ['LOGIN_USERS'] = 'inspector:clave'
+
+    import app as aplicacion
+    app = aplicacion.app
+    almacen = aplicacion.get_almacen()
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'inspector', 'password': 'clave'})
+
+    print(f"{'vehículos':>10} | {'cookie':>7}{'cookie lista':>14} | "
+          f"{'agregar p50/p95':>17}{'editar p50/p95':>17}{'eliminar p50/p95':>18}")
+    print('-' * 90)
+
+    actuales = 0
+    for objetivo in TAMANOS:
+        # Rellenar la flota hasta el tamaño objetivo
+        almacen.agregar_varios('inspector', (
+            {'matricula': f"{i % 10000:04d}BCD", 'kilometros': str(10000 + i)}
+            for i in range(actuales, objetivo)
+        ))
+        actuales = objetivo
+
+        creados = []
+
+        def agregar(i):
+            respuesta = cliente.post('/agregar_vehiculo', json={'matricula': '9999ZZZ', 'kilometros': str(i)})
+            creados.append(respuesta.get_json()['vehiculo']['id'])
+
+        def editar(i):
+            cliente.post('/editar_vehiculo', json={'id': creados[i], 'matricula': '9999ZZY', 'kilometros': '1'})
+
+        def eliminar(i):
+            cliente.post('/eliminar_vehiculo', json={'id': creados[i]})
+
+        agregar_p = medir(agregar, args.operaciones)
+        editar_p = medir(editar, args.operaciones)
+        eliminar_p = medir(eliminar, args.operaciones)
+
+        muestra = [{'matricula': f"{i % 10000:04d}BCD", 'kilometros': str(10000 + i),
+                    'fecha': '2025-12-10 14:30:45'} for i in range(objetivo)]
+        print(f"{objetivo:>10} | {cookie_sesion(cliente):>7}{cookie_lista(app, 'inspector', muestra):>14} | "
+              f"{agregar_p[0]:>8.2f}/{agregar_p[1]:<8.2f}{editar_p[0]:>8.2f}/{editar_p[1]:<8.2f}"
+              f"{eliminar_p[0]:>9.2f}/{eliminar_p[1]:<8.2f}")
+
+    print()
+    print("Latencias en ms. 'cookie lista' es la cookie que habría con la flota en sesión;")
+    print("los navegadores descartan cookies de más de ~4096 bytes.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark del arranque en frío: latencia de la primera lectura OCR de un
+worker frente a la de las siguientes, con y sin precalentamiento
+(OCR_PRECALENTAR).
+
+Arranca gunicorn con un solo worker contra el Gemini simulado, espera a que
+/health responda 200 y envía --lecturas lecturas de matrícula seguidas (sin
+caché, para que todas lleguen a Gemini). Sin
+precalentamiento la primera paga la creación del procesador OCR, la
+configuración del cliente de Gemini, la conexión y la primera ejecución de
+OpenCV; con él, ese trabajo se hace antes de que /health responda. El
+servidor simulado es HTTP local: --conexion-ms añade a la primera petición
+de cada conexión el coste de abrirla (DNS, TCP y TLS con la API real).
+
+Uso: python benchmarks/benchmark_arranque.py [--repeticiones 3] [--lecturas 10] [--gemini-ms 200]
+         [--conexion-ms 150]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_app import RAIZ, ServidorApp  # noqa: E402
+from servidor_gemini_simulado import PerfilLatencia, ServidorGeminiSimulado  # noqa: E402
+
+
+def medir(gemini, precalentar, lecturas):
+    """Segundos hasta /health 200 y latencias (ms) de las lecturas en orden"""
+    entorno = {
+        'OCR_MOTORES': 'gemini',
+        'GEMINI_API_KEY': 'simulada',
+        'GEMINI_API_ENDPOINT': gemini.url,
+        'OCR_PRECALENTAR': '1' if precalentar else '0',
+        'OCR_CACHE_MEMORIA': '0',
+    }
+    with open(os.path.join(RAIZ, 'Matricula1.jpeg'), 'rb') as f:
+        foto = f.read()
+
+    with ServidorApp(entorno=entorno, argumentos=['--workers', '1', '--threads', '4']) as app:
+        sesion = app.sesion()
+        latencias = []
+        for _ in range(lecturas):
+            r = sesion.post(f'{app.url}/ocr/matricula', data=foto,
+                            headers={'Content-Type': 'image/jpeg'}, timeout=60)
+            r.raise_for_status()
+            latencias.append(r.elapsed.total_seconds() * 1000)
+        return app.segundos_arranque, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=3, help="Arranques por configuración")
+    parser.add_argument('--lecturas', type=int, default=10, help="Lecturas tras cada arranque")
+    parser.add_argument('--gemini-ms', type=float, default=200)
+    parser.add_argument('--conexion-ms', type=float, default=150, help="Coste de abrir una conexión con Gemini")
+    args = parser.parse_args()
+
+    print(f"{args.repeticiones} arranques por configuración, {args.lecturas} lecturas, "
+          f"Gemini {args.gemini_ms:.0f} ms (+{args.conexion_ms:.0f} ms por conexión nueva)")
+    print(f"{'precalentar':<13}{'/health':>9}{'1ª lectura':>13}{'siguientes':>13}{'diferencia':>13}")
+    print('-' * 61)
+    perfil = PerfilLatencia(base_ms=args.gemini_ms)
+    with ServidorGeminiSimulado(perfil=perfil, conexion_ms=args.conexion_ms) as gemini:
+        for precalentar in (False, True):
+            arranques, primeras, siguientes = [], [], []
+            for _ in range(args.repeticiones):
+                arranque, latencias = medir(gemini, precalentar, args.lecturas)
+                arranques.append(arranque)
+                primeras.append(latencias[0])
+                siguientes.append(statistics.median(latencias[1:]))
+            primera = statistics.median(primeras)
+            estable = statistics.median(siguientes)
+            print(f"{'sí' if precalentar else 'no':<13}{statistics.median(arranques):>7.2f} s"
+                  f"{primera:>10.0f} ms{estable:>10.0f} ms{primera - estable:>+10.0f} ms")
+
+    print()
+    print("/health: desde el lanzamiento de gunicorn hasta la primera respuesta 200;")
+    print("siguientes: mediana del resto de lecturas. Medianas de los arranques.")
+
+
+if __name__ == '__main__':
+    main()
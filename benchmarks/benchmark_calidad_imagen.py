@@ -0,0 +1,103 @@
+"""
+Benchmark del control de calidad de las imágenes (calidad_imagen.py).
+
+Pasa por ControlCalidad.evaluar las fotos de ejemplo del repositorio y
+versiones degradadas de cada una (borrosa, oscura, quemada, con un reflejo
+y a un tercio de tamaño), codificadas como JPEG tal y como llegan del
+navegador, a su tamaño y ampliadas a --lado píxeles (foto de cámara).
+Muestra qué problemas detecta en cada variante y cuánto tarda (mediana de
+--repeticiones evaluaciones, incluida la decodificación); sin el control,
+cada una de esas imágenes era una llamada a Gemini de varios segundos.
+
+El programa termina con código 1 si rechaza alguna foto original.
+
+Uso: python benchmarks/benchmark_calidad_imagen.py [--repeticiones 20] [--lado 4000]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from calidad_imagen import ControlCalidad  # noqa: E402
+from ocr_imagen import ImagenOCR  # noqa: E402
+
+VARIANTES = ('original', 'borrosa', 'oscura', 'quemada', 'reflejo', 'pequeña')
+
+
+def degradar(bgr, variante):
+    """Versión degradada de la imagen"""
+    alto, ancho = bgr.shape[:2]
+    if variante == 'borrosa':
+        return cv2.GaussianBlur(bgr, (0, 0), max(ancho, alto) / 60)
+    if variante == 'oscura':
+        return (bgr * 0.15).astype(np.uint8)
+    if variante == 'quemada':
+        return np.clip(bgr.astype(np.int16) * 3 + 80, 0, 255).astype(np.uint8)
+    if variante == 'reflejo':
+        reflejo = bgr.copy()
+        cv2.ellipse(reflejo, (ancho // 2, alto // 2), (ancho // 5, alto // 5), 0, 0, 360, (255, 255, 255), -1)
+        return reflejo
+    if variante == 'pequeña':
+        return cv2.resize(bgr, (ancho // 3, alto // 3), interpolation=cv2.INTER_AREA)
+    return bgr
+
+
+def medir(control, datos, repeticiones):
+    """Problemas detectados y mediana de ms por evaluación (imagen nueva cada vez)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        imagen = ImagenOCR.desde_bytes(datos)
+        inicio = time.perf_counter()
+        problemas, _ = control.evaluar(imagen)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return [p['codigo'] for p in problemas], statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--lado', type=int, default=4000, help="Lado mayor de la versión ampliada")
+    args = parser.parse_args()
+
+    control = ControlCalidad()
+    rutas = sorted(glob.glob(os.path.join(RAIZ, 'Matricula*.jpeg')) + glob.glob(os.path.join(RAIZ, 'kilometros*.*')))
+    falsos_rechazos = []
+
+    print(f"{'foto':<18}{'variante':<10}{'problemas':<26}{'ms':>7}   {'ampliada':<25}{'ms':>7}")
+    print('-' * 96)
+    for ruta in rutas:
+        nombre = os.path.basename(ruta)
+        original = cv2.imread(ruta)
+        escala = args.lado / max(original.shape[:2])
+        for variante in VARIANTES:
+            bgr = degradar(original, variante)
+            alto, ancho = bgr.shape[:2]
+            ampliada = cv2.resize(bgr, (round(ancho * escala), round(alto * escala)), interpolation=cv2.INTER_CUBIC)
+            problemas, ms = medir(control, cv2.imencode('.jpg', bgr)[1].tobytes(), args.repeticiones)
+            problemas_grande, ms_grande = medir(control, cv2.imencode('.jpg', ampliada)[1].tobytes(),
+                                                args.repeticiones)
+            if variante == 'original' and problemas:
+                falsos_rechazos.append(nombre)
+            print(f"{nombre:<18}{variante:<10}{', '.join(problemas) or 'válida':<26}{ms:>7.1f}"
+                  f"   {', '.join(problemas_grande) or 'válida':<25}{ms_grande:>7.1f}")
+
+    print()
+    print(f"ms: mediana de {args.repeticiones} evaluaciones, decodificación incluida; ampliada: la misma")
+    print(f"imagen ampliada como si la original tuviera {args.lado} px de lado mayor (la pequeña queda a un tercio).")
+
+    if falsos_rechazos:
+        print(f"\nFOTOS VÁLIDAS RECHAZADAS: {', '.join(falsos_rechazos)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark del arranque de la aplicación: tiempo de importación de app.py
+(python -X importtime) y tiempo hasta que un worker de gunicorn responde.
+
+Importación: en un proceso nuevo importa app y después ocr_processor (lo
+que un worker carga en segundo plano o en la primera lectura) y muestra el
+tiempo acumulado de cada uno, los módulos que más tardan dentro de app y
+si alguno de los módulos pesados del OCR (OpenCV, NumPy, Pillow, cliente
+de Gemini) se ha cargado ya al importar app.
+
+Arranque: lanza gunicorn con un solo worker contra el Gemini simulado, con
+y sin OCR_PRECALENTAR, y mide desde el lanzamiento hasta la primera
+respuesta de /health (el worker ya atiende peticiones) y hasta el primer
+200 (con precalentamiento, el procesador OCR listo).
+
+Como control de regresiones el programa termina con código 1 si app
+importa algún módulo pesado o si se superan --max-importacion-ms o
+--max-health-s.
+
+Uso: python benchmarks/benchmark_carga_modulos.py [--repeticiones 5] [--arranques 3] [--top 8]
+         [--max-importacion-ms 500] [--max-health-s 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_app import RAIZ, ServidorApp  # noqa: E402
+from servidor_gemini_simulado import ServidorGeminiSimulado  # noqa: E402
+
+# Módulos que app no debe importar al cargarse
+PESADOS = ('cv2', 'numpy', 'PIL', 'google.generativeai', 'ocr_processor', 'ocr_imagen')
+
+CODIGO = (
+    "import json, sys\n"
+    "import app\n"
+    f"print(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))\n"
+    "import ocr_processor\n"
+)
+
+
+def importar():
+    """Tiempos de -X importtime de un proceso que importa app y después ocr_processor"""
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO],
+        cwd=RAIZ, capture_output=True, text=True,
+        env={**os.environ, 'VEHICULOS_ALMACEN': 'memoria', 'LOG_NIVEL': 'WARNING'}
+    )
+    if proceso.returncode:
+        raise RuntimeError(proceso.stderr)
+
+    acumulado, directos, dentro_de_app = {}, {}, False
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, cumulativo, nombre = linea.split('|')
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        nombre = nombre.strip()
+        if profundidad == 0:
+            # -X importtime escribe cada módulo al terminar de importarlo:
+            # los de nivel 1 anteriores a 'app' son los suyos
+            acumulado[nombre] = int(cumulativo) / 1000
+            dentro_de_app = False
+            if nombre == 'app':
+                break
+        elif profundidad == 1:
+            if not dentro_de_app:
+                directos.clear()
+                dentro_de_app = True
+            directos[nombre] = int(cumulativo) / 1000
+
+    # ocr_processor se importa después y aparece al final
+    for linea in reversed(proceso.stderr.splitlines()):
+        if linea.rstrip().endswith('| ocr_processor'):
+            acumulado['ocr_processor'] = int(linea.split('|')[1]) / 1000
+            break
+    return {
+        'app_ms': acumulado.get('app', 0.0),
+        'ocr_ms': acumulado.get('ocr_processor', 0.0),
+        'directos': directos,
+        'pesados': json.loads(proceso.stdout.strip().splitlines()[-1]),
+    }
+
+
+def arrancar(gemini, precalentar):
+    """Segundos hasta la primera respuesta de /health y hasta el primer 200"""
+    entorno = {
+        'OCR_MOTORES': 'gemini',
+        'GEMINI_API_KEY': 'simulada',
+        'GEMINI_API_ENDPOINT': gemini.url,
+        'OCR_PRECALENTAR': '1' if precalentar else '0',
+    }
+    with ServidorApp(entorno=entorno, argumentos=['--workers', '1', '--threads', '4']) as app:
+        return app.segundos_primera_respuesta, app.segundos_arranque
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5, help="Importaciones a medir (se toma la mediana)")
+    parser.add_argument('--arranques', type=int, default=3, help="Arranques de gunicorn por configuración")
+    parser.add_argument('--top', type=int, default=8, help="Módulos importados por app a mostrar")
+    parser.add_argument('--max-importacion-ms', type=float, help="Límite del tiempo de importación de app")
+    parser.add_argument('--max-health-s', type=float, help="Límite hasta el primer 200 de /health")
+    args = parser.parse_args()
+
+    regresiones = []
+
+    medidas = [importar() for _ in range(args.repeticiones)]
+    app_ms = statistics.median(m['app_ms'] for m in medidas)
+    ocr_ms = statistics.median(m['ocr_ms'] for m in medidas)
+    pesados = sorted({p for m in medidas for p in m['pesados']})
+    print(f"Importación ({args.repeticiones} procesos, medianas)")
+    print(f"  import app              {app_ms:>8.0f} ms")
+    print(f"  import ocr_processor    {ocr_ms:>8.0f} ms  (después de app: en segundo plano o en la 1ª lectura)")
+    print(f"  módulos pesados con app {', '.join(pesados) if pesados else 'ninguno':>8}")
+    print(f"\n  {'módulo importado por app':<28}{'acumulado':>12}")
+    print('  ' + '-' * 40)
+    directos = {}
+    for m in medidas:
+        for nombre, ms in m['directos'].items():
+            directos.setdefault(nombre, []).append(ms)
+    ordenados = sorted(directos.items(), key=lambda par: statistics.median(par[1]), reverse=True)
+    for nombre, valores in ordenados[:args.top]:
+        print(f"  {nombre:<28}{statistics.median(valores):>9.1f} ms")
+
+    if pesados:
+        regresiones.append(f"app importa módulos pesados: {', '.join(pesados)}")
+    if args.max_importacion_ms is not None and app_ms > args.max_importacion_ms:
+        regresiones.append(f"import app {app_ms:.0f} ms > {args.max_importacion_ms:.0f} ms")
+
+    print(f"\nArranque de gunicorn (1 worker, {args.arranques} arranques, medianas)")
+    print(f"  {'precalentar':<13}{'1ª respuesta':>14}{'/health 200':>14}")
+    print('  ' + '-' * 41)
+    with ServidorGeminiSimulado() as gemini:
+        for precalentar in (False, True):
+            tiempos = [arrancar(gemini, precalentar) for _ in range(args.arranques)]
+            respuesta = statistics.median(t[0] for t in tiempos)
+            sano = statistics.median(t[1] for t in tiempos)
+            print(f"  {'sí' if precalentar else 'no':<13}{respuesta:>12.2f} s{sano:>12.2f} s")
+            if args.max_health_s is not None and sano > args.max_health_s:
+                regresiones.append(f"/health 200 con precalentar={'sí' if precalentar else 'no'} "
+                                   f"{sano:.2f} s > {args.max_health_s:.2f} s")
+
+    print()
+    print("1ª respuesta: desde el lanzamiento de gunicorn hasta que /health responde (503 mientras")
+    print("precalienta); /health 200: hasta que responde 200.")
+
+    if regresiones:
+        print("\nREGRESIONES:")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
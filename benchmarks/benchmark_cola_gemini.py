@@ -0,0 +1,95 @@
+"""
+Benchmark de latencia de cola de las llamadas a Gemini con y sin cobertura.
+
+Arranca el servidor Gemini simulado con un perfil determinista (latencia
+base con pequeña variación y una petición lenta de cada N) y lanza la
+misma secuencia de lecturas de matrícula con tres configuraciones:
+  - sin cobertura y plazo amplio (comportamiento anterior)
+  - sin cobertura y con plazo
+  - con cobertura en el p95 y con plazo
+
+Para cada una muestra p50, p95, p99 y máximo de la latencia de extremo a
+extremo, las peticiones que llegaron al servidor y los plazos agotados.
+La caché se desactiva para que cada lectura llegue a Gemini.
+
+Uso: python benchmarks/benchmark_cola_gemini.py [--lecturas 100] [--cola-ms 5000] [--cada-cola 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_gemini_simulado import PerfilLatencia, ServidorGeminiSimulado  # noqa: E402
+
+
+def ejecutar(servidor, imagen, lecturas, plazo, cobertura):
+    """Devuelve (latencias en ms, peticiones al servidor, estadísticas del llamador)"""
+    from llamadas_gemini import LlamadorGemini
+    from ocr_cache import CacheOCR
+    from ocr_processor import OCRProcessor, get_gemini_model
+
+    modelo = get_gemini_model()
+    llamador = LlamadorGemini(modelo, plazo=plazo, cobertura=cobertura)
+    ocr = OCRProcessor(model=modelo, llamador=llamador, cache=CacheOCR(max_memoria=0))
+
+    peticiones_antes = servidor.peticiones
+    latencias = []
+    for _ in range(lecturas):
+        inicio = time.perf_counter()
+        ocr.procesar_matricula(imagen)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias, servidor.peticiones - peticiones_antes, llamador.estadisticas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lecturas', type=int, default=100)
+    parser.add_argument('--base-ms', type=float, default=150)
+    parser.add_argument('--jitter-ms', type=float, default=60)
+    parser.add_argument('--cola-ms', type=float, default=5000)
+    parser.add_argument('--cada-cola', type=int, default=10)
+    parser.add_argument('--plazo', type=float, default=3.0, help='Plazo por petición en segundos')
+    args = parser.parse_args()
+
+    import cv2
+    imagen = cv2.imread(os.path.join(RAIZ, 'Matricula1.jpeg'))
+
+    perfil = PerfilLatencia(base_ms=args.base_ms, cola_ms=args.cola_ms, cada_cola=args.cada_cola,
+                            jitter_ms=args.jitter_ms)
+    configuraciones = (
+        ('sin cobertura, plazo 60s', 60.0, False),
+        (f'sin cobertura, plazo {args.plazo:g}s', args.plazo, False),
+        (f'cobertura p95, plazo {args.plazo:g}s', args.plazo, True),
+    )
+
+    with ServidorGeminiSimulado(perfil=perfil) as servidor:
+        os.environ['GEMINI_API_KEY'] = 'simulada'
+        os.environ['GEMINI_API_ENDPOINT'] = servidor.url
+
+        filas = []
+        for nombre, plazo, cobertura in configuraciones:
+            latencias, peticiones, estadisticas = ejecutar(servidor, imagen, args.lecturas, plazo, cobertura)
+            filas.append((nombre, latencias, peticiones, estadisticas))
+
+    print()
+    print(f"Perfil: base {args.base_ms:g}ms (+{args.jitter_ms:g}ms), 1 de cada {args.cada_cola} "
+          f"peticiones a {args.cola_ms:g}ms, {args.lecturas} lecturas")
+    cabecera = (f"{'configuración':<28}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}"
+                f"{'peticiones':>12}{'coberturas':>12}{'plazos':>8}")
+    print(cabecera)
+    print('-' * len(cabecera))
+    for nombre, latencias, peticiones, estadisticas in filas:
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+        print(f"{nombre:<28}{p50:>8.0f}{p95:>8.0f}{p99:>8.0f}{max(latencias):>8.0f}"
+              f"{peticiones:>12}{estadisticas['coberturas']:>12}{estadisticas['plazos_agotados']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark de capacidad de gunicorn con y sin la cola de trabajos OCR.
+
+Arranca la aplicación con gunicorn como en el Dockerfile (2 workers x 2
+hilos) y el motor OCR simulado con una latencia fija que imita una llamada
+lenta a Gemini. Lanza a la vez una ráfaga de lecturas de matrícula y,
+mientras tanto, consulta /health cada 100 ms:
+  - sincrono: OCR_COLA=0, cada lectura ocupa un hilo de gunicorn hasta que
+    termina (comportamiento anterior)
+  - cola: OCR_COLA=1 y 'Prefer: respond-async'; la petición se encola y el
+    cliente consulta /ocr/trabajos/<id> cada 250 ms
+
+Para cada modo muestra la latencia de respuesta de la petición OCR (hasta
+recibir el resultado o el 202), el tiempo hasta tener todas las lecturas y
+la latencia de /health durante la ráfaga.
+
+Uso: python benchmarks/benchmark_cola_ocr.py [--lecturas 8] [--latencia-ms 3000] [--hilos-cola 2]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_app import RAIZ, ServidorApp  # noqa: E402
+
+
+def lectura(app, imagen, modo, respuestas, resultados, indice):
+    """Una lectura de matrícula; anota cuándo respondió el servidor y cuándo hubo resultado"""
+    s = app.sesion()
+    url = app.url
+    cabeceras = {'Content-Type': 'image/jpeg'}
+    if modo == 'cola':
+        cabeceras['Prefer'] = 'respond-async'
+    inicio = time.perf_counter()
+    r = s.post(f'{url}/ocr/matricula', data=imagen, headers=cabeceras, timeout=120)
+    respuestas[indice] = time.perf_counter() - inicio
+    if r.status_code == 202:
+        url_trabajo = url + r.json()['url']
+        while True:
+            time.sleep(0.25)
+            if s.get(url_trabajo, timeout=30).json()['estado'] in ('completado', 'error'):
+                break
+    resultados[indice] = time.perf_counter() - inicio
+
+
+def medir(modo, args, imagen, directorio):
+    entorno = {
+        'OCR_MOTORES': 'simulado',
+        'OCR_SIMULADO_LATENCIA_MS': str(args.latencia_ms),
+        'OCR_CACHE_MEMORIA': '0',
+        'OCR_LECTURA_LOCAL': '0',
+        'OCR_COLA': '1' if modo == 'cola' else '0',
+        'OCR_COLA_HILOS': str(args.hilos_cola),
+        'OCR_COLA_RUTA': os.path.join(directorio, f'cola_{modo}.sqlite3'),
+    }
+    with ServidorApp('hilos', entorno) as app:
+        url = app.url
+        # Calentar: inicializar el OCR en ambos workers antes de medir
+        for _ in range(4):
+            app.sesion().post(f'{url}/ocr/matricula', data=imagen, headers={'Content-Type': 'image/jpeg'},
+                              timeout=120)
+
+        respuestas = [None] * args.lecturas
+        resultados = [None] * args.lecturas
+        hilos = [threading.Thread(target=lectura, args=(app, imagen, modo, respuestas, resultados, i))
+                 for i in range(args.lecturas)]
+        salud = []
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        while any(h.is_alive() for h in hilos):
+            t = time.perf_counter()
+            requests.get(f'{url}/health', timeout=120)
+            salud.append(time.perf_counter() - t)
+            time.sleep(0.1)
+        total = time.perf_counter() - inicio
+        return respuestas, resultados, salud, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lecturas', type=int, default=8)
+    parser.add_argument('--latencia-ms', type=int, default=3000)
+    parser.add_argument('--hilos-cola', type=int, default=2, help='OCR_COLA_HILOS por worker')
+    args = parser.parse_args()
+
+    with open(os.path.join(RAIZ, 'Matricula1.jpeg'), 'rb') as f:
+        imagen = f.read()
+    directorio = tempfile.mkdtemp()
+
+    print(f"{args.lecturas} lecturas simultáneas, OCR de {args.latencia_ms} ms, gunicorn 2 workers x 2 hilos\n")
+    print(f"{'modo':<10}{'respuesta p50/max':>20}{'todas leídas':>14}{'/health p50/max':>20}{'consultas':>11}")
+    print('-' * 75)
+    try:
+        for modo in ('sincrono', 'cola'):
+            respuestas, resultados, salud, total = medir(modo, args, imagen, directorio)
+            print(f"{modo:<10}{np.median(respuestas):>11.2f}/{max(respuestas):<6.2f} s"
+                  f"{max(resultados):>12.2f} s{np.median(salud) * 1000:>11.0f}/{max(salud) * 1000:<5.0f} ms"
+                  f"{len(salud):>9}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print()
+    print("respuesta: hasta el resultado (sincrono) o hasta el 202 (cola).")
+    print(f"todas leídas: tiempo hasta tener las {args.lecturas} lecturas; /health: consultas durante la ráfaga.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark del comportamiento bajo cuota de Gemini con varios inspectores a la vez.
+
+Arranca el servidor Gemini simulado con una cuota de peticiones por segundo
+(las que la superan reciben 429 con Retry-After) y lanza lecturas de
+matrícula desde varios hilos con cuatro configuraciones:
+  - sin reintentos ni limitador (comportamiento anterior)
+  - reintentos con backoff / Retry-After, sin limitador
+  - limitador al 90% de la cuota + reintentos
+  - limitador compartido en SQLite entre dos "workers" (dos OCRProcessor)
+
+Para cada una muestra lecturas correctas y fallidas, 429 recibidos,
+lecturas correctas por segundo y p50/p95 de latencia.
+
+Uso: python benchmarks/benchmark_cuota_gemini.py [--hilos 8] [--lecturas 64] [--cuota-rps 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_gemini_simulado import PerfilLatencia, ServidorGeminiSimulado  # noqa: E402
+
+
+def crear_procesadores(limitadores, reintentos):
+    """Un OCRProcessor por limitador, sin caché ni cobertura"""
+    from llamadas_gemini import LlamadorGemini
+    from ocr_cache import CacheOCR
+    from ocr_processor import OCRProcessor, get_gemini_model
+
+    procesadores = []
+    for limitador in limitadores:
+        modelo = get_gemini_model()
+        llamador = LlamadorGemini(modelo, plazo=30.0, cobertura=False, limitador=limitador,
+                                  reintentos=reintentos)
+        procesadores.append(OCRProcessor(model=modelo, llamador=llamador, cache=CacheOCR(max_memoria=0)))
+    return procesadores
+
+
+def ejecutar(servidor, procesadores, imagen, hilos, lecturas):
+    """Devuelve (correctas, fallidas, 429 recibidos, segundos, latencias ms)"""
+    rechazadas_antes = servidor.rechazadas_cuota
+    latencias = []
+    correctas = 0
+    lock = threading.Lock()
+
+    def leer(i):
+        nonlocal correctas
+        ocr = procesadores[i % len(procesadores)]
+        inicio = time.perf_counter()
+        resultado = ocr.procesar_matricula(imagen)
+        with lock:
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            correctas += 1 if resultado.get('exito') else 0
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        list(executor.map(leer, range(lecturas)))
+    segundos = time.perf_counter() - inicio
+    return correctas, lecturas - correctas, servidor.rechazadas_cuota - rechazadas_antes, segundos, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--lecturas', type=int, default=64)
+    parser.add_argument('--cuota-rps', type=int, default=4)
+    parser.add_argument('--base-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    import cv2
+    from limitador_gemini import CuboTokens, CuboTokensCompartido
+
+    imagen = cv2.imread(os.path.join(RAIZ, 'Matricula1.jpeg'))
+    ruta_compartida = os.path.join(tempfile.mkdtemp(), 'limitador.db')
+    # El limitador se configura algo por debajo de la cuota para absorber la variación de red
+    tasa = 0.9 * args.cuota_rps
+
+    configuraciones = (
+        ('sin reintentos', lambda: [CuboTokens()], 0),
+        ('reintentos', lambda: [CuboTokens()], 3),
+        ('limitador + reintentos', lambda: [CuboTokens(tasa)], 3),
+        ('limitador SQLite x2 workers', lambda: [CuboTokensCompartido(ruta_compartida, tasa)
+                                                  for _ in range(2)], 3),
+    )
+
+    filas = []
+    with ServidorGeminiSimulado(perfil=PerfilLatencia(base_ms=args.base_ms), cuota_rps=args.cuota_rps) as servidor:
+        os.environ['GEMINI_API_KEY'] = 'simulada'
+        os.environ['GEMINI_API_ENDPOINT'] = servidor.url
+        for nombre, limitadores, reintentos in configuraciones:
+            procesadores = crear_procesadores(limitadores(), reintentos)
+            # Esperar a que la ventana de cuota del servidor se vacíe entre configuraciones
+            time.sleep(1.5)
+            filas.append((nombre, *ejecutar(servidor, procesadores, imagen, args.hilos, args.lecturas)))
+
+    print()
+    print(f"Cuota simulada: {args.cuota_rps} peticiones/s, {args.hilos} hilos, {args.lecturas} lecturas")
+    cabecera = f"{'configuración':<30}{'ok':>6}{'fallos':>8}{'429':>6}{'ok/s':>7}{'p50 ms':>9}{'p95 ms':>9}"
+    print(cabecera)
+    print('-' * len(cabecera))
+    for nombre, correctas, fallidas, rechazadas, segundos, latencias in filas:
+        p50, p95 = np.percentile(latencias, [50, 95])
+        print(f"{nombre:<30}{correctas:>6}{fallidas:>8}{rechazadas:>6}{correctas / segundos:>7.2f}"
+              f"{p50:>9.0f}{p95:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark de la exportación de vehículos a Excel/CSV con 100.000 filas.
+
+Crea un almacén SQLite temporal con la flota y mide cada método en un
+proceso aparte (para que el pico de memoria de uno no afecte a otro):
+  - openpyxl: libro completo en memoria, celda a celda, guardado en BytesIO
+    (la implementación anterior de /descargar_excel)
+  - openpyxl solo escritura: libro write_only guardado en un temporal y
+    enviado después por bloques
+  - xlsx streaming: exportacion.generar_xlsx sobre el cursor del almacén
+  - csv streaming: exportacion.generar_csv sobre el cursor del almacén
+
+Para cada uno muestra el tiempo hasta el primer byte, el tiempo total, el
+tamaño del fichero y el pico de memoria (RSS) por encima del proceso base
+(en los métodos openpyxl incluye la carga de la librería).
+
+Uso: python benchmarks/benchmark_exportacion.py [--filas 100000]
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+METODOS = ('openpyxl', 'openpyxl_solo_escritura', 'xlsx_streaming', 'csv_streaming')
+USUARIO = 'inspector'
+
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso en MB (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def exportar_openpyxl(almacen):
+    """Implementación anterior: libro completo en memoria"""
+    from openpyxl import Workbook
+
+    vehiculos = almacen.listar(USUARIO)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Vehículos"
+    ws['A1'] = 'Matrícula'
+    ws['B1'] = 'Kilometraje'
+    ws['C1'] = 'Fecha de Registro'
+    for cell in ws[1]:
+        cell.font = cell.font.copy(bold=True)
+    for idx, vehiculo in enumerate(vehiculos, start=2):
+        ws[f'A{idx}'] = vehiculo.get('matricula', '')
+        ws[f'B{idx}'] = vehiculo.get('kilometros', '')
+        ws[f'C{idx}'] = vehiculo.get('fecha', '')
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    yield output.getvalue()
+
+
+def exportar_openpyxl_solo_escritura(almacen):
+    """Libro write_only de openpyxl en un temporal, enviado por bloques"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Vehículos")
+    ws.append(['Matrícula', 'Kilometraje', 'Fecha de Registro'])
+    for vehiculo in almacen.iterar(USUARIO):
+        ws.append([vehiculo['matricula'], vehiculo['kilometros'], vehiculo['fecha']])
+    with tempfile.TemporaryFile() as temporal:
+        wb.save(temporal)
+        temporal.seek(0)
+        for bloque in iter(lambda: temporal.read(64 * 1024), b''):
+            yield bloque
+
+
+def medir_metodo(metodo, ruta):
+    """Se ejecuta en el proceso hijo: mide un método y devuelve un dict"""
+    from almacen_vehiculos import AlmacenVehiculosSQLite
+    from exportacion import generar_csv, generar_xlsx
+
+    almacen = AlmacenVehiculosSQLite(ruta)
+    generadores = {
+        'openpyxl': lambda: exportar_openpyxl(almacen),
+        'openpyxl_solo_escritura': lambda: exportar_openpyxl_solo_escritura(almacen),
+        'xlsx_streaming': lambda: generar_xlsx(almacen.iterar(USUARIO)),
+        'csv_streaming': lambda: generar_csv(almacen.iterar(USUARIO)),
+    }
+
+    base = pico_rss_mb()
+    inicio = time.perf_counter()
+    primer_byte = None
+    total = 0
+    for bloque in generadores[metodo]():
+        if bloque and primer_byte is None:
+            primer_byte = time.perf_counter() - inicio
+        total += len(bloque)
+    return {
+        'primer_byte_ms': primer_byte * 1000,
+        'total_s': time.perf_counter() - inicio,
+        'bytes': total,
+        'pico_mb': pico_rss_mb() - base,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=100000)
+    parser.add_argument('--metodo', choices=METODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--ruta', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.metodo:
+        print(json.dumps(medir_metodo(args.metodo, args.ruta)))
+        return
+
+    from almacen_vehiculos import AlmacenVehiculosSQLite
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'vehiculos.sqlite3')
+    AlmacenVehiculosSQLite(ruta).agregar_varios(USUARIO, (
+        {'matricula': f"{i % 10000:04d}BCD", 'kilometros': str(10000 + i * 7 % 300000),
+         'fecha': f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:{i % 60:02d}:00"}
+        for i in range(args.filas)
+    ))
+
+    print(f"\n{args.filas} filas")
+    print(f"{'método':<26}{'primer byte':>13}{'total':>9}{'tamaño':>10}{'pico RSS':>11}")
+    print('-' * 69)
+    for metodo in METODOS:
+        salida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--metodo', metodo, '--ruta', ruta],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{metodo:<26}{r['primer_byte_ms']:>10.0f} ms{r['total_s']:>7.2f} s"
+              f"{r['bytes'] / 1e6:>7.2f} MB{r['pico_mb']:>8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
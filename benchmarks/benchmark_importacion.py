@@ -0,0 +1,124 @@
+"""
+Benchmark de la importación masiva de vehículos con 1.000.000 de filas.
+
+Genera un CSV y un XLSX con el formato de las exportaciones de la
+aplicación (un 1% de filas no válidas) y mide cada método en un proceso
+aparte, importando en un almacén SQLite temporal vacío:
+  - csv: importacion.importar_vehiculos sobre el CSV
+  - xlsx: importacion.importar_vehiculos sobre el XLSX (expat en streaming)
+  - xlsx_openpyxl: lectura con openpyxl en modo solo lectura y la misma
+    validación e inserción por lotes (referencia para el lector XLSX)
+
+Para cada uno muestra filas importadas y rechazadas, tiempo total, filas
+por segundo y el pico de memoria (RSS) por encima del proceso base (en
+xlsx_openpyxl incluye la carga de la librería).
+
+Uso: python benchmarks/benchmark_importacion.py [--filas 1000000] [--lote 50000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+METODOS = ('csv', 'xlsx', 'xlsx_openpyxl')
+USUARIO = 'inspector'
+
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso en MB (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def registros(filas):
+    """Registros sintéticos; uno de cada cien tiene la matrícula vacía"""
+    for i in range(filas):
+        yield {
+            'matricula': '' if i % 100 == 99 else f"{i % 10000:04d} {'BCDFGHJKLM'[i % 10]}XY",
+            'kilometros': f"{(i * 37) % 400000:,}".replace(',', '.'),
+            'fecha': f"{2015 + i % 10}-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:{i % 60:02d}:00",
+        }
+
+
+def importar_openpyxl(almacen, ruta, lote):
+    """Misma validación e inserción, leyendo el XLSX con openpyxl"""
+    from openpyxl import load_workbook
+    from importacion import validar_filas
+
+    libro = load_workbook(ruta, read_only=True)
+    errores = {'total': 0, 'filas': []}
+    filas = ([valor if valor is not None else '' for valor in fila]
+             for fila in libro.active.iter_rows(values_only=True))
+    vehiculos = validar_filas(filas, '2025-01-01 00:00:00', errores)
+    importados = almacen.agregar_lotes(USUARIO, iter(lambda: list(islice(vehiculos, lote)), []))
+    libro.close()
+    return {'importados': importados, 'rechazados': errores['total']}
+
+
+def medir_metodo(metodo, directorio, lote):
+    """Se ejecuta en el proceso hijo: mide un método y devuelve un dict"""
+    from almacen_vehiculos import AlmacenVehiculosSQLite
+    from importacion import importar_vehiculos
+
+    almacen = AlmacenVehiculosSQLite(os.path.join(directorio, f'{metodo}.sqlite3'))
+    ruta = os.path.join(directorio, 'vehiculos.csv' if metodo == 'csv' else 'vehiculos.xlsx')
+
+    base = pico_rss_mb()
+    inicio = time.perf_counter()
+    if metodo == 'xlsx_openpyxl':
+        resumen = importar_openpyxl(almacen, ruta, lote)
+    else:
+        resumen = importar_vehiculos(almacen, USUARIO, ruta, tamano_lote=lote)
+    return {
+        'importados': resumen['importados'],
+        'rechazados': resumen['rechazados'],
+        'total_s': time.perf_counter() - inicio,
+        'pico_mb': pico_rss_mb() - base,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--lote', type=int, default=50000)
+    parser.add_argument('--metodo', choices=METODOS, help=argparse.SUPPRESS)
+    parser.add_argument('--directorio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.metodo:
+        print(json.dumps(medir_metodo(args.metodo, args.directorio, args.lote)))
+        return
+
+    from exportacion import generar_csv, generar_xlsx
+
+    directorio = tempfile.mkdtemp()
+    for nombre, generador in (('vehiculos.csv', generar_csv), ('vehiculos.xlsx', generar_xlsx)):
+        with open(os.path.join(directorio, nombre), 'wb') as fichero:
+            for bloque in generador(registros(args.filas)):
+                fichero.write(bloque)
+        print(f"{nombre}: {os.path.getsize(os.path.join(directorio, nombre)) / 1e6:.1f} MB")
+
+    print(f"\n{args.filas} filas, lotes de {args.lote}")
+    print(f"{'método':<16}{'importadas':>12}{'rechazadas':>12}{'total':>10}{'filas/s':>11}{'pico RSS':>11}")
+    print('-' * 72)
+    for metodo in METODOS:
+        salida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--metodo', metodo,
+             '--directorio', directorio, '--lote', str(args.lote)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{metodo:<16}{r['importados']:>12}{r['rechazados']:>12}{r['total_s']:>8.1f} s"
+              f"{args.filas / r['total_s']:>11.0f}{r['pico_mb']:>8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark del listado paginado de vehículos.
+
+Con la aplicación Flask en proceso (test_client) y un almacén SQLite
+temporal, rellena la flota del usuario hasta 100, 1.000, 10.000 y 50.000
+vehículos y en cada punto mide (mediana de varias repeticiones):
+  - GET /vehiculos (la página ya no incluye la tabla)
+  - primera página de /api/vehiculos (incluye el total)
+  - página 20 siguiendo el cursor (orden por fecha)
+  - primera página ordenada por kilómetros y filtrada por prefijo/fechas
+  - como referencia, leer la flota completa (lo que hacía antes la página)
+
+Uso: python benchmarks/benchmark_listado_vehiculos.py [--repeticiones 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = (100, 1000, 10000, 50000)
+
+
+def mediana_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(tiempos))
+
+
+def flota(desde, hasta, rng):
+    """Vehículos sintéticos con matrículas, kilómetros y fechas repartidos"""
+    for i in range(desde, hasta):
+        yield {
+            'matricula': f"{rng.randint(0, 9999):04d}{'BCDFGHJKLMNPRSTVWXYZ'[i % 20]}XY",
+            'kilometros': str(rng.randint(0, 400000)),
+            'fecha': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                     f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['VEHICULOS_ALMACEN'] = 'sqlite'
+    os.environ['VEHICULOS_RUTA'] = os.path.join(tempfile.mkdtemp(), 'vehiculos.sqlite3')
+    os.environ['LOGIN_USERS'] = 'inspector:clave'
+
+    import app as aplicacion
+    almacen = aplicacion.get_almacen()
+    cliente = aplicacion.app.test_client()
+    cliente.post('/login', data={'username': 'inspector', 'password': 'clave'})
+    rng = random.Random(7)
+
+    def pagina_20():
+        cursor = None
+        for _ in range(20):
+            url = '/api/vehiculos?limite=50' + (f'&cursor={cursor}' if cursor else '')
+            cursor = cliente.get(url).get_json()['siguiente']
+
+    # La página 20 se mide dividiendo el recorrido de 20 páginas entre 20
+    print(f"{'vehículos':>10} | {'/vehiculos':>11}{'1ª página':>11}{'página 20':>11}"
+          f"{'km+filtro':>11} | {'flota completa':>15}")
+    print('-' * 78)
+
+    actuales = 0
+    for objetivo in TAMANOS:
+        almacen.agregar_varios('inspector', flota(actuales, objetivo, rng))
+        actuales = objetivo
+
+        vista = mediana_ms(lambda: cliente.get('/vehiculos'), args.repeticiones)
+        primera = mediana_ms(lambda: cliente.get('/api/vehiculos?limite=50'), args.repeticiones)
+        veinte = mediana_ms(pagina_20, max(1, args.repeticiones // 4)) / 20
+        filtrada = mediana_ms(lambda: cliente.get(
+            '/api/vehiculos?limite=50&orden=kilometros&matricula=12&desde=2025-03-01&hasta=2025-09-30'
+        ), args.repeticiones)
+        completa = mediana_ms(lambda: almacen.listar('inspector'), max(1, args.repeticiones // 4))
+
+        print(f"{objetivo:>10} | {vista:>11.2f}{primera:>11.2f}{veinte:>11.2f}{filtrada:>11.2f} | {completa:>15.2f}")
+
+    print()
+    print("Tiempos en ms (mediana). 'página 20' es el coste medio por página recorriendo 20 con el cursor.")
+
+
+if __name__ == '__main__':
+    main()
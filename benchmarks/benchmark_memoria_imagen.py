@@ -0,0 +1,124 @@
+"""
+Benchmark de memoria por petición del camino imagen → modelo.
+
+Compara, para lecturas de matrícula y de cuentakilómetros con el mismo
+JPEG recibido del navegador:
+  - anterior: la aplicación decodificaba los bytes con PIL, los copiaba a
+    un array y los convertía a BGR antes de llamar a OCRProcessor
+  - perezosa: OCRProcessor recibe ImagenOCR con los bytes originales y cada
+    etapa decodifica solo lo que necesita (escala de grises reducida para
+    el control de calidad, escala de grises para la lectura local, BGR solo
+    si hay que recortar o reducir); si no hay nada que cambiar el JPEG se
+    envía al modelo sin decodificarlo
+
+El modelo se sustituye por un llamador que solo anota los bytes recibidos,
+la caché está desactivada y el control de calidad activo, como en la
+configuración por defecto. Para cada caso muestra el pico de memoria
+asignada durante la petición (tracemalloc, máximo de las repeticiones), el
+tiempo mediano, los bytes enviados al modelo y si se llegó a decodificar
+la imagen completa en color (la decodificación reducida no cuenta).
+
+tracemalloc no ve los búferes internos de PIL y libjpeg, así que el pico
+del camino anterior está infravalorado (le falta al menos una copia de la
+imagen decodificada, ancho x alto x 3 bytes).
+
+Uso: python benchmarks/benchmark_memoria_imagen.py [--repeticiones 10]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = ((1280, 720), (1920, 1080), (4000, 3000))
+FOTOS = {'matricula': 'Matricula1.jpeg', 'cuentakilometros': 'kilometros2.jpeg'}
+
+
+class LlamadorCaptura:
+    """Sustituye a LlamadorGemini: anota los bytes de imagen recibidos"""
+
+    def __init__(self):
+        self.enviados = 0
+
+    def generar(self, contenido, **kwargs):
+        self.enviados = sum(len(parte['data']) for parte in contenido if isinstance(parte, dict))
+        return SimpleNamespace(text='NO_DETECTADO')
+
+
+def imagen_prueba(nombre, ancho, alto):
+    """JPEG con calidad 0.9 como el que genera canvas.toBlob en captura.js"""
+    foto = cv2.resize(cv2.imread(os.path.join(RAIZ, nombre)), (ancho, alto), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode('.jpg', foto, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def decodificar_anterior(datos):
+    """Decodificación que hacía app.py antes de ImagenOCR"""
+    from PIL import Image
+    return cv2.cvtColor(np.array(Image.open(io.BytesIO(datos))), cv2.COLOR_RGB2BGR)
+
+
+def medir(ocr, llamador, tipo, datos, camino, repeticiones):
+    """(pico en bytes, tiempo mediano en ms, bytes enviados, decodificada en color)"""
+    from ocr_imagen import ImagenOCR
+
+    if tipo == 'matricula':
+        procesar = ocr.procesar_matricula
+    else:
+        procesar = ocr.procesar_cuentakilometros
+    picos, tiempos, en_color = [], [], False
+    for _ in range(repeticiones):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if camino == 'anterior':
+                procesar(decodificar_anterior(datos))
+                en_color = True
+            else:
+                imagen = ImagenOCR.desde_bytes(datos)
+                procesar(imagen)
+                en_color = imagen._bgr is not None
+                del imagen
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        picos.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(picos), float(np.median(tiempos)), llamador.enviados, en_color
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=10)
+    args = parser.parse_args()
+
+    from ocr_cache import CacheOCR
+    from ocr_processor import OCRProcessor
+
+    llamador = LlamadorCaptura()
+    ocr = OCRProcessor(motor='gemini', model=object(), llamador=llamador, cache=CacheOCR(max_memoria=0))
+
+    print(f"{'tipo':<17}{'imagen':<11}{'camino':<10}{'pico memoria':>14}{'tiempo':>10}{'al modelo':>12}{'en color':>10}")
+    print('-' * 84)
+    for tipo, foto in FOTOS.items():
+        for ancho, alto in TAMANOS:
+            datos = imagen_prueba(foto, ancho, alto)
+            for camino in ('anterior', 'perezosa'):
+                pico, tiempo, enviados, en_color = medir(ocr, llamador, tipo, datos, camino, args.repeticiones)
+                print(f"{tipo:<17}{f'{ancho}x{alto}':<11}{camino:<10}{pico / 2**20:>11.1f} MB{tiempo:>7.1f} ms"
+                      f"{enviados / 1024:>9.0f} KB{'sí' if en_color else 'no':>10}")
+        print()
+
+    print("Pico de memoria: asignaciones trazadas por tracemalloc durante la petición")
+    print("(sin los búferes internos de PIL/libjpeg).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark del coste de las métricas por etapa (metricas.etapa).
+
+Mide el tiempo de registrar una etapa (duración y tamaño) y el de exportar
+/metrics en los dos modos de prometheus_client:
+  - proceso: valores en memoria del propio proceso (servidor de desarrollo)
+  - multiproceso: valores en ficheros mapeados de PROMETHEUS_MULTIPROC_DIR,
+    como con gunicorn.conf.py
+
+El modo se fija al importar prometheus_client, así que cada uno se mide en
+un subproceso. También se mide con varios hilos registrando a la vez, y se
+estima el coste por petición OCR (unas 8 etapas y la duración HTTP).
+
+Uso: python benchmarks/benchmark_metricas.py [--repeticiones 100000] [--hilos 4]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ETAPAS_POR_PETICION = 8
+
+
+def medir(repeticiones, hilos):
+    """Ejecutado en el subproceso: devuelve los tiempos en microsegundos"""
+    from metricas import etapa, exportar, observar_peticion
+
+    def registrar(n):
+        for i in range(n):
+            with etapa('preprocesado', 'matricula') as medida:
+                medida.bytes = 40000 + i % 1000
+
+    registrar(1000)
+    inicio = time.perf_counter()
+    registrar(repeticiones)
+    por_etapa = (time.perf_counter() - inicio) / repeticiones * 1e6
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones // 10):
+        observar_peticion('procesar_matricula', 'POST', 200, 0.5)
+    por_peticion_http = (time.perf_counter() - inicio) / (repeticiones // 10) * 1e6
+
+    trabajadores = [threading.Thread(target=registrar, args=(repeticiones // hilos,)) for _ in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    concurrente = (time.perf_counter() - inicio) / (repeticiones // hilos * hilos) * 1e6
+
+    inicio = time.perf_counter()
+    for _ in range(20):
+        cuerpo, _ = exportar()
+    exportacion = (time.perf_counter() - inicio) / 20 * 1000
+
+    return {
+        'etapa_us': por_etapa,
+        'http_us': por_peticion_http,
+        'concurrente_us': concurrente,
+        'peticion_us': por_etapa * ETAPAS_POR_PETICION + por_peticion_http,
+        'exportar_ms': exportacion,
+        'exportar_kb': len(cuerpo) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=100000)
+    parser.add_argument('--hilos', type=int, default=4)
+    parser.add_argument('--interno', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        print(json.dumps(medir(args.repeticiones, args.hilos)))
+        return
+
+    print(f"{'modo':<14}{'etapa':>10}{'HTTP':>9}{f'{args.hilos} hilos':>12}{'por petición':>15}{'/metrics':>12}")
+    print('-' * 72)
+    for modo in ('proceso', 'multiproceso'):
+        entorno = {k: v for k, v in os.environ.items() if k != 'PROMETHEUS_MULTIPROC_DIR'}
+        directorio = None
+        if modo == 'multiproceso':
+            directorio = tempfile.mkdtemp()
+            entorno['PROMETHEUS_MULTIPROC_DIR'] = directorio
+        try:
+            salida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--interno',
+                 '--repeticiones', str(args.repeticiones), '--hilos', str(args.hilos)],
+                env=entorno, capture_output=True, text=True, check=True
+            ).stdout
+        finally:
+            if directorio:
+                shutil.rmtree(directorio, ignore_errors=True)
+        r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{modo:<14}{r['etapa_us']:>7.2f} µs{r['http_us']:>6.2f} µs{r['concurrente_us']:>9.2f} µs"
+              f"{r['peticion_us']:>12.1f} µs{r['exportar_ms']:>9.2f} ms")
+
+    print()
+    print(f"por petición: {ETAPAS_POR_PETICION} etapas + la duración HTTP; {args.hilos} hilos: coste por etapa")
+    print("con varios hilos registrando a la vez; /metrics: tiempo de exportación.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de la comprobación de plausibilidad del kilometraje.
+
+Rellena un almacén SQLite temporal con lecturas históricas (unas 20 por
+matrícula, repartidas en cinco años) hasta 10.000, 100.000, 1.000.000 y
+2.000.000 de registros y en cada punto mide la latencia de
+ValidadorKilometraje.evaluar para matrículas con historial y sin él.
+
+Uso: python benchmarks/benchmark_plausibilidad.py [--consultas 5000] [--max 2000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = (10000, 100000, 1000000, 2000000)
+LECTURAS_POR_MATRICULA = 20
+USUARIO = 'inspector'
+
+
+def matricula(numero):
+    return f"{numero % 10000:04d}{'BCDFGHJKLMNPRSTVWXYZ'[numero // 10000 % 20]}{'BCDFG'[numero // 200000 % 5]}X"
+
+
+def historico(desde, hasta):
+    """Lecturas crecientes por matrícula, en lotes para agregar_lotes"""
+    lote = []
+    for i in range(desde, hasta):
+        numero, orden = divmod(i, LECTURAS_POR_MATRICULA)
+        dia = orden * 90 + numero % 90
+        lote.append({
+            'matricula': matricula(numero),
+            'kilometros': str(orden * 6000 + numero % 1000),
+            'fecha': f"{2020 + dia // 365}-{dia % 365 // 31 + 1:02d}-{dia % 28 + 1:02d} 09:00:00",
+        })
+        if len(lote) == 50000:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--consultas', type=int, default=5000)
+    parser.add_argument('--max', type=int, default=TAMANOS[-1])
+    args = parser.parse_args()
+
+    from almacen_vehiculos import AlmacenVehiculosSQLite
+    from plausibilidad import ValidadorKilometraje
+
+    almacen = AlmacenVehiculosSQLite(os.path.join(tempfile.mkdtemp(), 'vehiculos.sqlite3'))
+    validador = ValidadorKilometraje(almacen)
+    rng = random.Random(3)
+
+    print(f"{'registros':>10} | {'con historial p50/p95/p99':>27} | {'sin historial p50/p99':>22}")
+    print('-' * 68)
+
+    actuales = 0
+    for objetivo in (t for t in TAMANOS if t <= args.max):
+        almacen.agregar_lotes(USUARIO, historico(actuales, objetivo))
+        actuales = objetivo
+        matriculas = actuales // LECTURAS_POR_MATRICULA
+
+        resultados = {}
+        for nombre, elegir in (('con', lambda: matricula(rng.randrange(matriculas))),
+                               ('sin', lambda: f"{rng.randrange(10000):04d}QQQ")):
+            latencias = []
+            for _ in range(args.consultas):
+                placa = elegir()
+                kilometros = str(rng.randrange(200000))
+                inicio = time.perf_counter()
+                validador.evaluar(USUARIO, placa, kilometros)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            resultados[nombre] = np.percentile(latencias, [50, 95, 99])
+
+        con, sin = resultados['con'], resultados['sin']
+        print(f"{objetivo:>10} | {con[0]:>8.3f}/{con[1]:.3f}/{con[2]:<8.3f} | {sin[0]:>10.3f}/{sin[2]:<10.3f}")
+
+    print()
+    print("Latencias en ms por evaluación (dos búsquedas por índice y las reglas).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark del preprocesado de imágenes antes de Gemini.
+
+Compara, para las imágenes de ejemplo del repositorio:
+  - Ruta anterior: PIL → NumPy → RGB2BGR → BGR2RGB → PIL, que la librería de
+    Gemini serializa como WEBP sin pérdida.
+  - Ruta nueva: PIL → NumPy → RGB2BGR → Preprocesador (redimensionado y JPEG).
+
+Además de las imágenes originales (pequeñas) se generan versiones ampliadas
+a 4000x3000 codificadas como JPEG calidad 0.92, equivalentes a un fotograma
+de cámara de móvil enviado por captura.js.
+
+Uso: python benchmarks/benchmark_preprocesado.py [--repeticiones N]
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from preprocesado import Preprocesador  # noqa: E402
+
+
+def imagenes_ejemplo():
+    """Devuelve [(nombre, tipo_ocr, bytes_jpeg)] con las muestras y sus versiones 12MP"""
+    muestras = []
+    rutas = sorted(glob.glob(os.path.join(RAIZ, 'Matricula*.jpeg')))
+    rutas += sorted(glob.glob(os.path.join(RAIZ, 'kilometros*.jp*g')))
+    for ruta in rutas:
+        nombre = os.path.basename(ruta)
+        tipo = 'matricula' if nombre.lower().startswith('matricula') else 'cuentakilometros'
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        muestras.append((nombre, tipo, datos))
+
+        grande = cv2.resize(cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_COLOR),
+                            (4000, 3000), interpolation=cv2.INTER_CUBIC)
+        ok, buffer = cv2.imencode('.jpg', grande, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        muestras.append((f"{nombre}@12MP", tipo, buffer.tobytes()))
+    return muestras
+
+
+def ruta_anterior(datos, tipo_ocr):
+    """Reproduce la ruta original app.py + _extraer_texto_gemini"""
+    image = Image.open(io.BytesIO(datos))
+    img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    img = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
+    # google.generativeai serializa las imágenes PIL sin fichero como WEBP sin pérdida
+    salida = io.BytesIO()
+    img.save(salida, format='webp', lossless=True)
+    return salida.getvalue()
+
+
+def ruta_nueva(preprocesador):
+    def ejecutar(datos, tipo_ocr):
+        image = Image.open(io.BytesIO(datos))
+        img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        return preprocesador.preparar(img_cv, tipo_ocr)['data']
+    return ejecutar
+
+
+def medir(funcion, datos, tipo_ocr, repeticiones):
+    """Devuelve (bytes enviados, ms medios, pico de memoria en MB)"""
+    tracemalloc.start()
+    payload = funcion(datos, tipo_ocr)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(datos, tipo_ocr)
+    ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+    return len(payload), ms, pico / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--lado-max', type=int, default=1600)
+    parser.add_argument('--calidad', type=int, default=85)
+    args = parser.parse_args()
+
+    nueva = ruta_nueva(Preprocesador(lado_max=args.lado_max, calidad_jpeg=args.calidad))
+
+    print(f"{'imagen':<24}{'entrada':>10} | {'antes B':>10}{'ms':>9}{'MB':>8} | {'después B':>10}{'ms':>9}{'MB':>8}")
+    print('-' * 92)
+    totales = np.zeros(6)
+    for nombre, tipo, datos in imagenes_ejemplo():
+        antes = medir(ruta_anterior, datos, tipo, args.repeticiones)
+        despues = medir(nueva, datos, tipo, args.repeticiones)
+        totales += np.array(antes + despues)
+        print(f"{nombre:<24}{len(datos):>10} | {antes[0]:>10}{antes[1]:>9.1f}{antes[2]:>8.1f} | "
+              f"{despues[0]:>10}{despues[1]:>9.1f}{despues[2]:>8.1f}")
+
+    print('-' * 92)
+    print(f"{'TOTAL':<24}{'':>10} | {int(totales[0]):>10}{totales[1]:>9.1f}{totales[2]:>8.1f} | "
+          f"{int(totales[3]):>10}{totales[4]:>9.1f}{totales[5]:>8.1f}")
+    print(f"Reducción de bytes enviados a Gemini: {100 * (1 - totales[3] / totales[0]):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark del recorte local de la matrícula antes de Gemini.
+
+Las imágenes Matricula*.jpeg del repositorio ya vienen encuadradas, así que
+además de medirlas tal cual se generan escenas de 1920x1080 y 4000x3000 con
+la foto ampliada sobre un fondo texturizado, como un fotograma de cámara.
+
+Para cada imagen compara el preprocesado con y sin recorte:
+  - bytes enviados a Gemini
+  - tokens de imagen estimados (258 por tesela de 768x768, o 258 si cabe en 384x384)
+  - tiempo local de preprocesado
+  - con --gemini y GEMINI_API_KEY configurada, latencia real de extremo a extremo
+
+Uso: python benchmarks/benchmark_recorte_matricula.py [--gemini]
+"""
+
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from detector_matricula import localizar_matricula  # noqa: E402
+from preprocesado import Preprocesador  # noqa: E402
+
+
+def tokens_estimados(datos):
+    """Estimación de tokens de imagen de Gemini a partir del JPEG"""
+    imagen = cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    alto, ancho = imagen.shape[0] * 2, imagen.shape[1] * 2
+    if alto <= 384 and ancho <= 384:
+        return 258
+    return 258 * math.ceil(ancho / 768) * math.ceil(alto / 768)
+
+
+def escenas():
+    """Devuelve [(nombre, array BGR)] con las muestras y escenas sintéticas"""
+    rng = np.random.default_rng(42)
+    resultado = []
+    for ruta in sorted(glob.glob(os.path.join(RAIZ, 'Matricula*.jpeg'))):
+        nombre = os.path.basename(ruta)
+        muestra = cv2.imread(ruta)
+        resultado.append((nombre, muestra))
+
+        for ancho, alto, factor in ((1920, 1080, 2.5), (4000, 3000, 5.0)):
+            fondo = cv2.resize((rng.random((alto // 20, ancho // 20, 3)) * 200).astype(np.uint8),
+                               (ancho, alto), interpolation=cv2.INTER_CUBIC)
+            ampliada = cv2.resize(muestra, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+            h, w = ampliada.shape[:2]
+            y = int(rng.integers(0, alto - h))
+            x = int(rng.integers(0, ancho - w))
+            fondo[y:y + h, x:x + w] = ampliada
+            resultado.append((f"{nombre}@{ancho}x{alto}", fondo))
+    return resultado
+
+
+def medir(preprocesador, imagen, repeticiones=3):
+    """Devuelve (bytes, tokens, ms medios de preprocesado, blob)"""
+    blob = preprocesador.preparar(imagen, 'matricula')
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        preprocesador.preparar(imagen, 'matricula')
+    ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+    return len(blob['data']), tokens_estimados(blob['data']), ms, blob
+
+
+def latencia_gemini(modelo, blob):
+    """Latencia real de una petición de matrícula a Gemini en ms"""
+    from ocr_processor import PROMPTS
+    inicio = time.perf_counter()
+    modelo.generate_content([PROMPTS['matricula'], blob])
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gemini', action='store_true', help='Medir también la latencia real de Gemini')
+    parser.add_argument('--umbral', type=float, default=0.6)
+    args = parser.parse_args()
+
+    modelo = None
+    if args.gemini:
+        from ocr_processor import get_gemini_model
+        modelo = get_gemini_model()
+
+    sin_recorte = Preprocesador(detectar_matricula=False)
+    con_recorte = Preprocesador(detectar_matricula=True, umbral_matricula=args.umbral)
+
+    cabecera = f"{'imagen':<28}{'conf':>6} | {'sin B':>9}{'tok':>6}{'ms':>7} | {'con B':>9}{'tok':>6}{'ms':>7}"
+    if modelo:
+        cabecera += f" | {'e2e sin':>9}{'e2e con':>9}"
+    print(cabecera)
+    print('-' * len(cabecera))
+
+    totales = np.zeros(6)
+    for nombre, imagen in escenas():
+        _, confianza = localizar_matricula(imagen)
+        antes = medir(sin_recorte, imagen)
+        despues = medir(con_recorte, imagen)
+        totales += np.array(antes[:3] + despues[:3])
+        linea = (f"{nombre:<28}{confianza:>6.2f} | {antes[0]:>9}{antes[1]:>6}{antes[2]:>7.1f} | "
+                 f"{despues[0]:>9}{despues[1]:>6}{despues[2]:>7.1f}")
+        if modelo:
+            linea += f" | {latencia_gemini(modelo, antes[3]):>9.0f}{latencia_gemini(modelo, despues[3]):>9.0f}"
+        print(linea)
+
+    print('-' * len(cabecera))
+    print(f"{'TOTAL':<28}{'':>6} | {int(totales[0]):>9}{int(totales[1]):>6}{totales[2]:>7.1f} | "
+          f"{int(totales[3]):>9}{int(totales[4]):>6}{totales[5]:>7.1f}")
+    print(f"Reducción de bytes: {100 * (1 - totales[3] / totales[0]):.1f}%  "
+          f"Reducción de tokens estimados: {100 * (1 - totales[4] / totales[1]):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark del coste del registro por petición: print directo a stdout frente
+al registro en cola de registro.py.
+
+Un subproceso simula peticiones que escriben cada una --lineas registros
+(como las trazas que la ruta del OCR escribía con print) y esperan
+--espera-ms (la llamada a Gemini), desde 1 a N hilos a la vez. Su stdout
+es una tubería que este proceso lee a --lectura-kbs KB/s, como un
+recolector de logs lento: con print la petición se bloquea cuando la
+tubería se llena; con la cola solo se encola el registro (si la cola se
+llena se descarta y se cuenta).
+
+Muestra el tiempo que cada petición pasa registrando (p50/p99) y los
+registros descartados.
+
+Uso: python benchmarks/benchmark_registro.py [--peticiones 1000] [--lineas 10] [--espera-ms 10]
+                                             [--hilos 1,8,32] [--lectura-kbs 64]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir(modo, peticiones, lineas, espera, hilos):
+    """Ejecutado en el subproceso: devuelve los tiempos por petición (µs) por stderr"""
+    if modo == 'cola':
+        import logging
+        from registro import configurar_registro, estadisticas, id_peticion
+        configurar_registro()
+        log = logging.getLogger('benchmark')
+
+        def registrar(n, i):
+            id_peticion.set(f'p{n}')
+            log.info("Imagen preparada para Gemini - %d bytes", 40000 + i, extra={'tipo': 'matricula'})
+    else:
+        estadisticas = None
+
+        def registrar(n, i):
+            print(f"INFO: Imagen preparada para Gemini - {40000 + i} bytes [p{n}]")
+
+    tiempos = []
+    lock = threading.Lock()
+
+    def trabajador(inicio, fin):
+        propios = []
+        for n in range(inicio, fin):
+            t0 = time.perf_counter()
+            for i in range(lineas):
+                registrar(n, i)
+            propios.append((time.perf_counter() - t0) * 1e6)
+            time.sleep(espera)
+        with lock:
+            tiempos.extend(propios)
+
+    por_hilo = peticiones // hilos
+    trabajadores = [threading.Thread(target=trabajador, args=(i * por_hilo, (i + 1) * por_hilo))
+                    for i in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    return {
+        'p50_us': percentil(tiempos, 50),
+        'p99_us': percentil(tiempos, 99),
+        'total_s': total,
+        'descartados': estadisticas()['descartados'] if estadisticas else 0,
+    }
+
+
+def ejecutar(modo, args, hilos):
+    """Lanza el subproceso leyendo su stdout al ritmo indicado"""
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--interno', modo,
+         '--peticiones', str(args.peticiones), '--lineas', str(args.lineas),
+         '--espera-ms', str(args.espera_ms), '--hilos', str(hilos)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env={**os.environ, 'LOG_FORMATO': 'json', 'LOG_NIVEL': 'INFO', 'LOG_MUESTREO': '1'}
+    )
+    bloque = 4096
+    pausa = bloque / (args.lectura_kbs * 1024) if args.lectura_kbs else 0
+
+    def leer():
+        while proceso.stdout.read1(bloque):
+            if pausa:
+                time.sleep(pausa)
+
+    lector = threading.Thread(target=leer, daemon=True)
+    lector.start()
+    error = proceso.stderr.read()
+    proceso.wait()
+    lector.join()
+    if proceso.returncode:
+        raise RuntimeError(error.decode(errors='replace'))
+    return json.loads(error.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peticiones', type=int, default=1000)
+    parser.add_argument('--lineas', type=int, default=10, help="Registros por petición")
+    parser.add_argument('--espera-ms', type=float, default=10, help="Resto de la petición (sin registrar)")
+    parser.add_argument('--hilos', default='1,8,32', help="Hilos concurrentes (lista separada por comas)")
+    parser.add_argument('--lectura-kbs', type=int, default=64, help="Velocidad del lector de stdout (0 = sin límite)")
+    parser.add_argument('--interno', choices=('print', 'cola'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        resultado = medir(args.interno, args.peticiones, args.lineas, args.espera_ms / 1000, int(args.hilos))
+        print(json.dumps(resultado), file=sys.stderr)
+        return
+
+    lectura = f'{args.lectura_kbs} KB/s' if args.lectura_kbs else 'sin límite'
+    print(f"{args.peticiones} peticiones de {args.lineas} registros y {args.espera_ms:g} ms; stdout leído a {lectura}")
+    print(f"{'modo':<8}{'hilos':>6}{'p50':>12}{'p99':>12}{'total':>10}{'descartados':>13}")
+    print('-' * 61)
+    for hilos in (int(h) for h in args.hilos.split(',')):
+        for modo in ('print', 'cola'):
+            r = ejecutar(modo, args, hilos)
+            print(f"{modo:<8}{hilos:>6}{r['p50_us']:>9.1f} µs{r['p99_us']:>9.1f} µs"
+                  f"{r['total_s']:>8.2f} s{r['descartados']:>13}")
+
+    print()
+    print("p50/p99: tiempo que cada petición pasa registrando; total: hasta que todos")
+    print("los hilos terminan (sin contar el vaciado final de la cola).")
+
+
+if __name__ == '__main__':
+    main()
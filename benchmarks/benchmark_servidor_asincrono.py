@@ -0,0 +1,119 @@
+"""
+Prueba de carga de gunicorn en modo hilos frente al worker asíncrono gevent.
+
+Arranca el servidor Gemini simulado y la aplicación con el motor Gemini
+apuntando a él, y somete /ocr/matricula a una carga de cliente cerrado:
+N clientes con su propia sesión envían lecturas una tras otra durante el
+tiempo indicado. Configuraciones comparadas:
+  - hilos: la del Dockerfile, --workers 2 --threads 2 (gthread)
+  - gevent: un único worker --worker-class gevent --worker-connections 1000
+
+La caché, la lectura local y la cobertura están desactivadas para que
+cada lectura llegue a Gemini una sola vez. Para cada
+configuración muestra las lecturas completadas por segundo, la latencia
+p50/p99/máxima desde el envío hasta la respuesta (incluida la espera en la
+cola de conexiones de gunicorn), los errores y las peticiones que llegaron
+al Gemini simulado.
+
+Uso: python benchmarks/benchmark_servidor_asincrono.py [--clientes 100] [--duracion 20] [--gemini-ms 500]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_app import RAIZ, ServidorApp  # noqa: E402
+from servidor_gemini_simulado import PerfilLatencia, ServidorGeminiSimulado  # noqa: E402
+
+
+def cliente(s, url, imagen, fin, latencias, errores):
+    """Envía lecturas seguidas hasta el instante fin"""
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            r = s.post(f'{url}/ocr/matricula', data=imagen, headers={'Content-Type': 'image/jpeg'},
+                       timeout=120)
+            correcta = r.ok and r.json().get('exito')
+        except requests.RequestException:
+            correcta = False
+        if correcta:
+            latencias.append(time.perf_counter() - inicio)
+        else:
+            errores.append(1)
+
+
+def medir(modo, args, imagen, servidor):
+    entorno = {
+        'OCR_MOTORES': 'gemini',
+        'GEMINI_API_KEY': 'simulada',
+        'GEMINI_API_ENDPOINT': servidor.url,
+        'OCR_GEMINI_COBERTURA': '0',
+        'OCR_GEMINI_PLAZO': '110',
+        'OCR_CACHE_MEMORIA': '0',
+        'OCR_LECTURA_LOCAL': '0',
+    }
+    with ServidorApp(modo, entorno) as app:
+        url = app.url
+        # Calentar: inicializar el OCR en todos los workers antes de medir
+        for _ in range(4):
+            app.sesion().post(f'{url}/ocr/matricula', data=imagen, headers={'Content-Type': 'image/jpeg'},
+                              timeout=120)
+
+        # Las sesiones se abren antes de medir para que todos los clientes empiecen a la vez
+        sesiones = [app.sesion() for _ in range(args.clientes)]
+        latencias, errores = [], []
+        peticiones_antes = servidor.peticiones
+        inicio = time.perf_counter()
+        fin = inicio + args.duracion
+        hilos = [threading.Thread(target=cliente, args=(s, url, imagen, fin, latencias, errores))
+                 for s in sesiones]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+        return latencias, len(errores), total, servidor.peticiones - peticiones_antes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=100, help='Clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=20, help='Segundos enviando lecturas')
+    parser.add_argument('--gemini-ms', type=float, default=500, help='Latencia base del Gemini simulado')
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--modos', default='hilos,gevent')
+    args = parser.parse_args()
+
+    with open(os.path.join(RAIZ, 'Matricula1.jpeg'), 'rb') as f:
+        imagen = f.read()
+
+    perfil = PerfilLatencia(base_ms=args.gemini_ms, jitter_ms=args.jitter_ms)
+    print(f"{args.clientes} clientes durante {args.duracion:.0f} s, Gemini simulado de "
+          f"{args.gemini_ms:.0f}-{args.gemini_ms + args.jitter_ms:.0f} ms\n")
+    print(f"{'modo':<10}{'lecturas':>10}{'lect./s':>10}{'p50':>9}{'p99':>9}{'máx':>9}{'errores':>9}{'a Gemini':>10}")
+    print('-' * 76)
+    with ServidorGeminiSimulado(perfil=perfil) as servidor:
+        for modo in args.modos.split(','):
+            latencias, errores, total, peticiones = medir(modo, args, imagen, servidor)
+            if latencias:
+                percentiles = (f"{np.percentile(latencias, 50):>8.2f}s{np.percentile(latencias, 99):>8.2f}s"
+                               f"{max(latencias):>8.2f}s")
+            else:
+                percentiles = f"{'-':>9}{'-':>9}{'-':>9}"
+            print(f"{modo:<10}{len(latencias):>10}{len(latencias) / total:>10.1f}{percentiles}"
+                  f"{errores:>9}{peticiones:>10}")
+
+    print()
+    print("lect./s: lecturas correctas entre el tiempo total, incluido el vaciado de las")
+    print("peticiones en curso al terminar; latencia desde el envío hasta la respuesta.")
+
+
+if __name__ == '__main__':
+    main()
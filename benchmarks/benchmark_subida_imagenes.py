@@ -0,0 +1,106 @@
+"""
+Benchmark de la subida de imágenes a los endpoints OCR.
+
+Compara los tres formatos que aceptan /ocr/matricula y /ocr/cuentakilometros:
+  - json: data URL en base64 dentro de un JSON (formato anterior del cliente)
+  - multipart: multipart/form-data con el fichero en el campo 'image'
+  - binario: el JPEG como cuerpo de la petición (Content-Type image/jpeg),
+    como lo envía ahora captura.js
+
+Para cada formato y tamaño de imagen construye la petición tal y como
+llega al servidor y mide, dentro de un contexto de petición de Flask, la
+lectura con leer_imagen_peticion y la decodificación completa a BGR (el
+caso más costoso; el resto del endpoint es idéntico en los tres casos):
+  - bytes en la red (cuerpo de la petición)
+  - pico de memoria asignada por petición (tracemalloc)
+  - tiempo de lectura y decodificación
+
+Uso: python benchmarks/benchmark_subida_imagenes.py [--repeticiones 20]
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = ((1280, 720), (1920, 1080), (4000, 3000))
+CALIDAD = 90
+
+
+def imagen_prueba(ancho, alto):
+    """JPEG a partir de una foto del repositorio, escalada como un fotograma de la cámara"""
+    foto = cv2.imread(os.path.join(RAIZ, 'kilometros1.jpg'))
+    foto = cv2.resize(foto, (ancho, alto), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode('.jpg', foto, [cv2.IMWRITE_JPEG_QUALITY, CALIDAD])[1].tobytes()
+
+
+def cuerpos(jpeg):
+    """(content_type, cuerpo) de cada formato para el mismo JPEG"""
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.test import encode_multipart
+
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode('ascii')
+    limite, multipart = encode_multipart({'image': FileStorage(io.BytesIO(jpeg), 'captura.jpg', content_type='image/jpeg')})
+    return {
+        'json': ('application/json', json.dumps({'image': data_url}).encode()),
+        'multipart': (f'multipart/form-data; boundary={limite}', multipart),
+        'binario': ('image/jpeg', jpeg),
+    }
+
+
+def medir(app, leer_imagen_peticion, content_type, cuerpo, repeticiones):
+    """Pico de memoria (bytes) y tiempo mediano (ms) de leer y decodificar la petición"""
+    from werkzeug.test import EnvironBuilder
+
+    picos, tiempos = [], []
+    for _ in range(repeticiones):
+        entorno = EnvironBuilder('/ocr/cuentakilometros', method='POST', input_stream=io.BytesIO(cuerpo),
+                                 content_type=content_type, content_length=len(cuerpo)).get_environ()
+        with app.request_context(entorno):
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            imagen = leer_imagen_peticion()
+            imagen.bgr
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            picos.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        assert imagen is not None
+        del imagen
+    return max(picos), float(np.median(tiempos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault('OCR_MOTORES', 'simulado')
+    os.environ.setdefault('VEHICULOS_ALMACEN', 'memoria')
+    from app import app, leer_imagen_peticion
+
+    print(f"{'imagen':<11}{'formato':<11}{'en la red':>12}{'vs binario':>12}{'pico memoria':>14}{'tiempo':>10}")
+    print('-' * 70)
+    for ancho, alto in TAMANOS:
+        jpeg = imagen_prueba(ancho, alto)
+        for formato, (content_type, cuerpo) in cuerpos(jpeg).items():
+            pico, tiempo = medir(app, leer_imagen_peticion, content_type, cuerpo, args.repeticiones)
+            print(f"{f'{ancho}x{alto}':<11}{formato:<11}{len(cuerpo) / 1024:>9.0f} KB"
+                  f"{len(cuerpo) / len(jpeg):>11.2f}x{pico / 2**20:>11.1f} MB{tiempo:>7.1f} ms")
+        print()
+
+    print("Pico de memoria: asignaciones trazadas durante la lectura y decodificación.")
+    print("Imagen decodificada = ancho x alto x 3 bytes.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+La aplicación servida por gunicorn en un subproceso, para las pruebas de carga.
+
+Arranca gunicorn con la configuración indicada (modo hilos como en el
+Dockerfile o worker gevent), espera a que /health responda, abre sesiones
+ya autenticadas y mide la memoria residente del maestro y sus workers
+leyendo /proc (solo Linux; en otros sistemas la memoria queda en None).
+
+    with ServidorApp('hilos', entorno={'OCR_MOTORES': 'simulado'}) as app:
+        s = app.sesion()
+        s.post(f'{app.url}/ocr/matricula', ...)
+        app.pico_memoria()
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USUARIO, CLAVE = 'bench', 'bench'
+
+# Argumentos de gunicorn de cada modo de servidor
+MODOS = {
+    'hilos': ['--workers', '2', '--threads', '2'],
+    'gevent': ['--workers', '1', '--worker-class', 'gevent', '--worker-connections', '1000'],
+}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _rss(pid):
+    """Memoria residente de un proceso en bytes (None si no se puede leer)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _hijos(pid):
+    """PIDs de los procesos hijos directos"""
+    hijos = []
+    try:
+        entradas = os.listdir('/proc')
+    except OSError:
+        return hijos
+    for entrada in entradas:
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as f:
+                # El nombre va entre paréntesis y puede contener espacios
+                campos = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(campos[1]) == pid:
+            hijos.append(int(entrada))
+    return hijos
+
+
+class ServidorApp:
+    """gunicorn con la aplicación en un subproceso"""
+
+    def __init__(self, modo='hilos', entorno=None, timeout=120, muestreo=0.2, argumentos=None):
+        """
+        Args:
+            modo: Clave de MODOS ('hilos' o 'gevent')
+            argumentos: Argumentos de gunicorn en lugar de los del modo
+            entorno: Variables de entorno adicionales de la aplicación
+            timeout: --timeout de gunicorn (segundos)
+            muestreo: Segundos entre mediciones de memoria
+        """
+        self.modo = modo
+        self.entorno = {
+            'LOGIN_USERS': f'{USUARIO}:{CLAVE}',
+            # Sin clave fija cada worker genera la suya y no acepta las sesiones de los demás
+            'SECRET_KEY': 'benchmark',
+            'VEHICULOS_ALMACEN': 'memoria',
+            **(entorno or {}),
+        }
+        self.timeout = timeout
+        self.muestreo = muestreo
+        self.argumentos = argumentos if argumentos is not None else MODOS[modo]
+        self.proceso = None
+        self.segundos_arranque = None
+        self.segundos_primera_respuesta = None
+        self.url = None
+        self._pico = None
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """Lanza gunicorn y espera a que /health responda 200 (con el procesador OCR listo)"""
+        puerto = puerto_libre()
+        inicio = time.perf_counter()
+        self.proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{puerto}',
+             '--timeout', str(self.timeout), *self.argumentos],
+            cwd=RAIZ, env={**os.environ, **self.entorno},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.url = f'http://127.0.0.1:{puerto}'
+        for _ in range(600):
+            try:
+                respuesta = requests.get(f'{self.url}/health', timeout=1)
+                if self.segundos_primera_respuesta is None:
+                    # El worker ya atiende peticiones, aunque /health aún responda 503
+                    self.segundos_primera_respuesta = time.perf_counter() - inicio
+                if respuesta.ok:
+                    self.segundos_arranque = time.perf_counter() - inicio
+                    self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+                    self._hilo.start()
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        self.proceso.kill()
+        raise RuntimeError('gunicorn no arrancó')
+
+    def detener(self):
+        self._parar.set()
+        if self.proceso is not None:
+            self.proceso.terminate()
+            self.proceso.wait(10)
+
+    def sesion(self):
+        """Sesión de requests con el usuario de pruebas ya autenticado"""
+        s = requests.Session()
+        s.post(f'{self.url}/login', data={'username': USUARIO, 'password': CLAVE}, timeout=self.timeout)
+        return s
+
+    def memoria(self):
+        """Memoria residente del maestro y sus workers en bytes (None fuera de Linux)"""
+        pid = self.proceso.pid
+        valores = [_rss(p) for p in (pid, *_hijos(pid))]
+        valores = [v for v in valores if v is not None]
+        return sum(valores) if valores else None
+
+    def pico_memoria(self, reiniciar=False):
+        """Máximo de memoria() desde el arranque o desde el último reinicio"""
+        pico = self._pico
+        if reiniciar:
+            self._pico = self.memoria()
+        return pico
+
+    def _muestrear(self):
+        while not self._parar.wait(self.muestreo):
+            actual = self.memoria()
+            if actual is not None and (self._pico is None or actual > self._pico):
+                self._pico = actual
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
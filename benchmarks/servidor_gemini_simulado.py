@@ -0,0 +1,264 @@
+"""
+Servidor HTTP que imita la API REST de Gemini (generateContent y countTokens).
+
+Permite probar de forma determinista el comportamiento ante latencias de
+cola, errores de cuota y respuestas lentas sin consumir cuota real. La
+aplicación se apunta a él con:
+
+    GEMINI_API_KEY=simulada GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+
+Perfil de latencia (determinista, o reproducible con semilla):
+  - latencia base para todas las peticiones, con una variación uniforme
+    (por defecto) o una distribución lognormal de mediana la latencia base
+  - cada N peticiones, una con latencia de cola
+  - cada M peticiones, o con una probabilidad dada, un error HTTP (429 por
+    defecto)
+  - opcionalmente, una cuota de peticiones por segundo: las que la superan
+    reciben 429 con Retry-After, como la API real
+  - opcionalmente, un retardo en la primera petición de cada conexión, que
+    imita el establecimiento de la conexión TLS con la API real
+
+Uso: python benchmarks/servidor_gemini_simulado.py --puerto 8765 --base-ms 200 --cola-ms 8000 --cada-cola 10
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class PerfilLatencia:
+    """Latencias y errores deterministas en función del número de petición"""
+
+    def __init__(self, base_ms=200, cola_ms=0, cada_cola=0, cada_error=0, codigo_error=429,
+                 jitter_ms=0, distribucion='uniforme', sigma=0.5, prob_error=0.0, semilla=0):
+        """
+        Args:
+            distribucion: 'uniforme' (base + variación determinista de hasta
+                          jitter_ms) o 'lognormal' (mediana base_ms y
+                          desviación sigma del logaritmo)
+            prob_error: Probabilidad de responder con codigo_error, además
+                        de los errores cada M peticiones
+            semilla: Semilla de la parte aleatoria (lognormal y prob_error)
+        """
+        if distribucion not in ('uniforme', 'lognormal'):
+            raise ValueError(f"Distribución desconocida: {distribucion}")
+        self.base_ms = base_ms
+        self.cola_ms = cola_ms
+        self.cada_cola = cada_cola
+        self.cada_error = cada_error
+        self.codigo_error = codigo_error
+        self.jitter_ms = jitter_ms
+        self.distribucion = distribucion
+        self.sigma = sigma
+        self.prob_error = prob_error
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def para(self, numero):
+        """Devuelve (segundos de espera, código HTTP de error o None) para la petición n (desde 1)"""
+        with self._lock:
+            azar_error = self._azar.random()
+            azar_latencia = self._azar.lognormvariate(0.0, self.sigma) if self.distribucion == 'lognormal' else 1.0
+        if (self.cada_error and numero % self.cada_error == 0) or azar_error < self.prob_error:
+            return self.base_ms / 1000.0, self.codigo_error
+        if self.cada_cola and numero % self.cada_cola == 0:
+            return self.cola_ms / 1000.0, None
+        if self.distribucion == 'lognormal':
+            return self.base_ms * azar_latencia / 1000.0, None
+        # Variación determinista pequeña para que los percentiles no sean planos
+        variacion = (numero * 7919 % 101) / 100.0 * self.jitter_ms
+        return (self.base_ms + variacion) / 1000.0, None
+
+
+def _respuesta_texto(texto):
+    return {
+        'candidates': [{
+            'content': {'parts': [{'text': texto}], 'role': 'model'},
+            'finishReason': 1,
+            'index': 0,
+        }],
+        'usageMetadata': {'promptTokenCount': 300, 'candidatesTokenCount': 5, 'totalTokenCount': 305},
+    }
+
+
+class ServidorGeminiSimulado:
+    """Servidor generateContent simulado en un hilo de fondo"""
+
+    def __init__(self, puerto=0, perfil=None, matricula='1234ABC', kilometros='123456', cuota_rps=0,
+                 conexion_ms=0):
+        self.perfil = perfil or PerfilLatencia()
+        self.matricula = matricula
+        self.kilometros = kilometros
+        self.cuota_rps = cuota_rps
+        self.conexion_ms = conexion_ms
+        self.conexiones = 0
+        self.peticiones = 0
+        self.rechazadas_cuota = 0
+        self.recuentos = 0
+        self.errores = 0
+        self.bytes_recibidos = 0
+        self.esperas = []
+        self._admitidas = deque()
+        self._lock = threading.Lock()
+
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                longitud = int(self.headers.get('Content-Length', 0))
+                cuerpo = self.rfile.read(longitud)
+                # Una instancia por conexión: la primera petición paga el "handshake"
+                if not getattr(self, 'conectado', False):
+                    self.conectado = True
+                    with servidor._lock:
+                        servidor.conexiones += 1
+                    time.sleep(servidor.conexion_ms / 1000)
+                if re.search(r':countTokens', self.path):
+                    # Recuento de tokens del precalentamiento: inmediato y sin contar como petición
+                    with servidor._lock:
+                        servidor.recuentos += 1
+                    self._enviar(200, {'totalTokens': max(1, longitud // 4)})
+                    return
+                with servidor._lock:
+                    servidor.peticiones += 1
+                    servidor.bytes_recibidos += longitud
+                    numero = servidor.peticiones
+
+                if not re.search(r':generateContent', self.path):
+                    self._enviar(404, {'error': {'code': 404, 'message': 'Not found'}})
+                    return
+
+                reintentar = servidor._consumir_cuota()
+                if reintentar is not None:
+                    self._enviar(429, {'error': {
+                        'code': 429,
+                        'message': f'Quota exceeded. Please retry in {reintentar}s.',
+                        'status': 'RESOURCE_EXHAUSTED',
+                    }}, reintentar)
+                    return
+
+                espera, error = servidor.perfil.para(numero)
+                time.sleep(espera)
+                with servidor._lock:
+                    servidor.esperas.append(espera)
+                    if error:
+                        servidor.errores += 1
+                if error:
+                    self._enviar(error, {'error': {
+                        'code': error,
+                        'message': 'Resource has been exhausted (e.g. check quota).',
+                        'status': 'RESOURCE_EXHAUSTED' if error == 429 else 'UNAVAILABLE',
+                    }})
+                    return
+
+                self._enviar(200, _respuesta_texto(servidor.responder(cuerpo)))
+
+            def _enviar(self, codigo, datos, reintentar=1):
+                cuerpo = json.dumps(datos).encode('utf-8')
+                try:
+                    self.send_response(codigo)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    if codigo == 429:
+                        self.send_header('Retry-After', str(reintentar))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente abandonó la petición (plazo agotado o cobertura ganadora)
+                    pass
+
+        class Servidor(ThreadingHTTPServer):
+            # Cola de conexiones amplia para las pruebas de carga con cientos de clientes
+            request_queue_size = 1024
+            daemon_threads = True
+
+        self.httpd = Servidor(('127.0.0.1', puerto), Manejador)
+        self.puerto = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.puerto}"
+        self._hilo = None
+
+    def _consumir_cuota(self):
+        """Ventana deslizante de 1s. Devuelve None si se admite o los segundos de Retry-After"""
+        if not self.cuota_rps:
+            return None
+        with self._lock:
+            ahora = time.monotonic()
+            while self._admitidas and ahora - self._admitidas[0] >= 1.0:
+                self._admitidas.popleft()
+            if len(self._admitidas) < self.cuota_rps:
+                self._admitidas.append(ahora)
+                return None
+            self.rechazadas_cuota += 1
+            return max(1, math.ceil(1.0 - (ahora - self._admitidas[0])))
+
+    def responder(self, cuerpo):
+        """Texto de respuesta según el prompt recibido"""
+        try:
+            peticion = json.loads(cuerpo or b'{}')
+            partes = peticion['contents'][0]['parts']
+            prompt = next((p['text'] for p in partes if 'text' in p), '')
+        except (ValueError, KeyError, IndexError):
+            prompt = ''
+        if '"matricula"' in prompt:
+            return json.dumps({'matricula': self.matricula, 'kilometros': self.kilometros})
+        if 'matrícula' in prompt:
+            return self.matricula
+        return self.kilometros
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--base-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--distribucion', choices=('uniforme', 'lognormal'), default='uniforme')
+    parser.add_argument('--sigma', type=float, default=0.5, help='Desviación del logaritmo (lognormal)')
+    parser.add_argument('--cola-ms', type=float, default=0)
+    parser.add_argument('--cada-cola', type=int, default=0)
+    parser.add_argument('--cada-error', type=int, default=0)
+    parser.add_argument('--codigo-error', type=int, default=429)
+    parser.add_argument('--prob-error', type=float, default=0.0)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--cuota-rps', type=int, default=0, help='Peticiones por segundo admitidas (0 = sin cuota)')
+    parser.add_argument('--conexion-ms', type=float, default=0, help='Retardo de la primera petición de cada conexión')
+    args = parser.parse_args()
+
+    perfil = PerfilLatencia(args.base_ms, args.cola_ms, args.cada_cola, args.cada_error,
+                            args.codigo_error, args.jitter_ms, args.distribucion, args.sigma,
+                            args.prob_error, args.semilla)
+    servidor = ServidorGeminiSimulado(args.puerto, perfil, cuota_rps=args.cuota_rps, conexion_ms=args.conexion_ms)
+    print(f"Gemini simulado escuchando en {servidor.url}")
+    try:
+        servidor.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
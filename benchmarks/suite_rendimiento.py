@@ -0,0 +1,290 @@
+"""
+Suite de rendimiento de extremo a extremo con un Gemini simulado.
+
+Arranca el servidor Gemini simulado con la distribución de latencias y
+errores indicada, sirve la aplicación con gunicorn apuntando a él (modo
+hilos como en el Dockerfile o worker gevent) y reproduce las fotos de
+ejemplo del repositorio contra los endpoints OCR con la concurrencia
+indicada. Escenarios:
+  - matricula: Matricula*.jpeg a /ocr/matricula (cuerpo binario)
+  - cuentakilometros: kilometros*.* a /ocr/cuentakilometros con ?matricula=
+  - vehiculo: pares matrícula + cuentakilómetros a /ocr/vehiculo (multipart)
+
+La caché, la lectura local y la cobertura están desactivadas para que
+cada lectura llegue a Gemini. Para cada escenario
+muestra:
+  - lecturas correctas por segundo y errores
+  - latencia de extremo a extremo p50/p95/p99/máxima
+  - etapas: tiempo medio por lectura en Gemini (medido en el servidor
+    simulado, incluidos los reintentos) y en la aplicación (el resto:
+    espera de un hilo libre de gunicorn, subida, preprocesado, cliente de
+    Gemini y respuesta)
+  - llamadas a Gemini por lectura y KB enviados por llamada
+  - pico de memoria residente de gunicorn (maestro y workers)
+  - tiempo medio por lectura de cada etapa del OCR, a partir de los
+    histogramas de /metrics (diferencia antes y después del escenario)
+
+Como control de regresiones: --guardar escribe los resultados en JSON y
+--comparar los contrasta con un fichero guardado antes; el programa
+termina con código 1 si el rendimiento, la latencia p95/p99 o la memoria
+empeoran más de la tolerancia.
+
+Uso: python benchmarks/suite_rendimiento.py [--escenarios matricula,cuentakilometros,vehiculo]
+         [--concurrencia 8] [--lecturas 200] [--modo hilos|gevent]
+         [--gemini-ms 300] [--jitter-ms 100] [--distribucion uniforme|lognormal] [--prob-error 0]
+         [--guardar base.json] [--comparar base.json] [--tolerancia 0.2]
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor_app import RAIZ, ServidorApp  # noqa: E402
+from servidor_gemini_simulado import PerfilLatencia, ServidorGeminiSimulado  # noqa: E402
+
+ESCENARIOS = ('matricula', 'cuentakilometros', 'vehiculo')
+ETAPAS = ('lectura', 'lectura_local', 'calidad', 'preprocesado', 'prompt', 'gemini', 'limpieza')
+
+# Métricas que se comparan con la referencia: True si más es mejor
+METRICAS_REGRESION = {
+    'lecturas_s': True,
+    'p95_ms': False,
+    'p99_ms': False,
+    'memoria_mb': False,
+}
+
+
+def cargar_fotos():
+    """Bytes de las fotos de ejemplo: (matrículas, cuentakilómetros)"""
+    def leer(patron):
+        rutas = sorted(glob.glob(os.path.join(RAIZ, patron)))
+        if not rutas:
+            raise RuntimeError(f"No hay fotos {patron} en {RAIZ}")
+        fotos = []
+        for ruta in rutas:
+            with open(ruta, 'rb') as f:
+                fotos.append(f.read())
+        return fotos
+    return leer('Matricula*.jpeg'), leer('kilometros*.*')
+
+
+def peticiones(escenario, matriculas, cuentakilometros):
+    """Iterador infinito de argumentos de requests.post para el escenario, rotando las fotos"""
+    binario = {'Content-Type': 'image/jpeg'}
+    if escenario == 'matricula':
+        return ({'url': '/ocr/matricula', 'data': foto, 'headers': binario}
+                for foto in itertools.cycle(matriculas))
+    if escenario == 'cuentakilometros':
+        return ({'url': '/ocr/cuentakilometros?matricula=1234ABC', 'data': foto, 'headers': binario}
+                for foto in itertools.cycle(cuentakilometros))
+    if escenario == 'vehiculo':
+        pares = zip(itertools.cycle(matriculas), itertools.cycle(cuentakilometros))
+        return ({'url': '/ocr/vehiculo', 'files': {'matricula': ('matricula.jpg', m, 'image/jpeg'),
+                                                   'cuentakilometros': ('cuentakilometros.jpg', k, 'image/jpeg')}}
+                for m, k in pares)
+    raise ValueError(f"Escenario desconocido: {escenario}")
+
+
+def segundos_etapas(app):
+    """Segundos acumulados por etapa del OCR (todos los tipos) según /metrics"""
+    segundos = dict.fromkeys(ETAPAS, 0.0)
+    texto = requests.get(f'{app.url}/metrics', timeout=30).text
+    for familia in text_string_to_metric_families(texto):
+        if familia.name != 'ocr_etapa_segundos':
+            continue
+        for muestra in familia.samples:
+            if muestra.name.endswith('_sum') and muestra.labels['etapa'] in segundos:
+                segundos[muestra.labels['etapa']] += muestra.value
+    return segundos
+
+
+def cliente(app, generador, lock, restantes, latencias, errores):
+    """Envía lecturas del generador compartido hasta agotar las restantes"""
+    s = app.sesion()
+    while True:
+        with lock:
+            if restantes[0] <= 0:
+                return
+            restantes[0] -= 1
+            peticion = dict(next(generador))
+        url = app.url + peticion.pop('url')
+        inicio = time.perf_counter()
+        try:
+            r = s.post(url, timeout=app.timeout, **peticion)
+            correcta = r.ok and r.json().get('exito')
+        except (requests.RequestException, ValueError):
+            correcta = False
+        if correcta:
+            latencias.append(time.perf_counter() - inicio)
+        else:
+            errores.append(1)
+
+
+def ejecutar_escenario(app, gemini, escenario, fotos, args):
+    """Mide un escenario y devuelve sus resultados"""
+    generador = peticiones(escenario, *fotos)
+    # Calentar: inicializar el OCR en todos los workers antes de medir
+    calentar = app.sesion()
+    for _ in range(4):
+        peticion = dict(next(generador))
+        calentar.post(app.url + peticion.pop('url'), timeout=app.timeout, **peticion)
+
+    latencias, errores = [], []
+    restantes = [args.lecturas]
+    lock = threading.Lock()
+    hilos = [threading.Thread(target=cliente, args=(app, generador, lock, restantes, latencias, errores))
+             for _ in range(args.concurrencia)]
+
+    esperas_antes = len(gemini.esperas)
+    bytes_antes = gemini.bytes_recibidos
+    app.pico_memoria(reiniciar=True)
+    etapas_antes = segundos_etapas(app)
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    pico = app.pico_memoria()
+    etapas_despues = segundos_etapas(app)
+
+    esperas = gemini.esperas[esperas_antes:]
+    llamadas = len(esperas)
+    lecturas = len(latencias) + len(errores)
+    ms = np.array(latencias) * 1000 if latencias else np.array([np.nan])
+    gemini_ms = sum(esperas) * 1000 / lecturas if lecturas else 0.0
+    return {
+        'lecturas': len(latencias),
+        'errores': len(errores),
+        'segundos': round(total, 2),
+        'lecturas_s': round(len(latencias) / total, 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 1),
+        'p95_ms': round(float(np.percentile(ms, 95)), 1),
+        'p99_ms': round(float(np.percentile(ms, 99)), 1),
+        'max_ms': round(float(np.max(ms)), 1),
+        'gemini_ms': round(gemini_ms, 1),
+        'app_ms': round(float(np.nanmean(ms)) - gemini_ms, 1),
+        'llamadas_lectura': round(llamadas / lecturas, 2) if lecturas else 0.0,
+        'kb_llamada': round((gemini.bytes_recibidos - bytes_antes) / 1024 / llamadas, 1) if llamadas else 0.0,
+        'memoria_mb': round(pico / 2**20, 1) if pico is not None else None,
+        'etapas_ms': {nombre: round((etapas_despues[nombre] - etapas_antes[nombre]) * 1000 / lecturas, 2)
+                      if lecturas else 0.0 for nombre in ETAPAS},
+    }
+
+
+def comparar(resultados, referencia, tolerancia):
+    """Lista de regresiones respecto a la referencia (vacía si no hay)"""
+    regresiones = []
+    for escenario, actual in resultados['escenarios'].items():
+        base = referencia.get('escenarios', {}).get(escenario)
+        if base is None:
+            continue
+        for metrica, mas_es_mejor in METRICAS_REGRESION.items():
+            antes, ahora = base.get(metrica), actual.get(metrica)
+            if not antes or ahora is None:
+                continue
+            cambio = (ahora - antes) / antes
+            if (-cambio if mas_es_mejor else cambio) > tolerancia:
+                regresiones.append(f"{escenario}: {metrica} {antes} -> {ahora} ({cambio:+.0%})")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--concurrencia', type=int, default=8, help='Clientes simultáneos')
+    parser.add_argument('--lecturas', type=int, default=200, help='Lecturas por escenario')
+    parser.add_argument('--modo', choices=('hilos', 'gevent'), default='hilos', help='Worker de gunicorn')
+    parser.add_argument('--gemini-ms', type=float, default=300, help='Latencia base (mediana con lognormal)')
+    parser.add_argument('--jitter-ms', type=float, default=100, help='Variación máxima (uniforme)')
+    parser.add_argument('--distribucion', choices=('uniforme', 'lognormal'), default='uniforme')
+    parser.add_argument('--sigma', type=float, default=0.5, help='Desviación del logaritmo (lognormal)')
+    parser.add_argument('--cola-ms', type=float, default=0, help='Latencia de las peticiones lentas')
+    parser.add_argument('--cada-cola', type=int, default=0, help='Una petición lenta cada N')
+    parser.add_argument('--prob-error', type=float, default=0.0, help='Probabilidad de 429/503 en Gemini')
+    parser.add_argument('--codigo-error', type=int, default=429)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--guardar', help='Fichero JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='Resultados de referencia (JSON) para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento relativo admitido')
+    args = parser.parse_args()
+
+    escenarios = [e.strip() for e in args.escenarios.split(',') if e.strip()]
+    for escenario in escenarios:
+        if escenario not in ESCENARIOS:
+            parser.error(f"Escenario desconocido: {escenario}")
+
+    fotos = cargar_fotos()
+    perfil = PerfilLatencia(base_ms=args.gemini_ms, cola_ms=args.cola_ms, cada_cola=args.cada_cola,
+                            codigo_error=args.codigo_error, jitter_ms=args.jitter_ms,
+                            distribucion=args.distribucion, sigma=args.sigma,
+                            prob_error=args.prob_error, semilla=args.semilla)
+    configuracion = {k: v for k, v in vars(args).items() if k not in ('guardar', 'comparar', 'tolerancia')}
+
+    print(f"{args.lecturas} lecturas por escenario, {args.concurrencia} clientes, gunicorn en modo {args.modo}")
+    print(f"Gemini simulado: {args.distribucion} {args.gemini_ms:.0f} ms, errores {args.prob_error:.0%}\n")
+    print(f"{'escenario':<18}{'lect./s':>8}{'err':>5}{'p50':>8}{'p95':>8}{'p99':>8}{'máx':>8}"
+          f"{'Gemini':>8}{'app':>7}{'llam.':>6}{'KB':>6}{'memoria':>10}")
+    print('-' * 100)
+
+    resultados = {'configuracion': configuracion, 'escenarios': {}}
+    entorno_base = {
+        'OCR_MOTORES': 'gemini',
+        'GEMINI_API_KEY': 'simulada',
+        'OCR_GEMINI_COBERTURA': '0',
+        'OCR_CACHE_MEMORIA': '0',
+        'OCR_LECTURA_LOCAL': '0',
+    }
+    with ServidorGeminiSimulado(perfil=perfil) as gemini:
+        with ServidorApp(args.modo, {**entorno_base, 'GEMINI_API_ENDPOINT': gemini.url}) as app:
+            for escenario in escenarios:
+                r = ejecutar_escenario(app, gemini, escenario, fotos, args)
+                resultados['escenarios'][escenario] = r
+                memoria = f"{r['memoria_mb']:.0f} MB" if r['memoria_mb'] is not None else '-'
+                print(f"{escenario:<18}{r['lecturas_s']:>8.1f}{r['errores']:>5}"
+                      f"{r['p50_ms']:>6.0f}ms{r['p95_ms']:>6.0f}ms{r['p99_ms']:>6.0f}ms{r['max_ms']:>6.0f}ms"
+                      f"{r['gemini_ms']:>6.0f}ms{r['app_ms']:>5.0f}ms{r['llamadas_lectura']:>6.2f}"
+                      f"{r['kb_llamada']:>6.0f}{memoria:>10}")
+
+    print(f"\n{'ms por lectura':<18}" + ''.join(f"{nombre:>14}" for nombre in ETAPAS))
+    print('-' * (18 + 14 * len(ETAPAS)))
+    for escenario, r in resultados['escenarios'].items():
+        print(f"{escenario:<18}" + ''.join(f"{r['etapas_ms'][nombre]:>14.2f}" for nombre in ETAPAS))
+
+    print()
+    print("Gemini: tiempo medio por lectura en el servidor simulado; app: resto de la latencia media")
+    print("(incluida la espera de un hilo libre de gunicorn).")
+    print("llam.: llamadas a Gemini por lectura (reintentos incluidos); KB: enviados por llamada.")
+    print("Etapas: tiempo medio por lectura de cada etapa del OCR según /metrics ('gemini' incluye")
+    print("el cliente de Gemini, las esperas del limitador y los reintentos).")
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        regresiones = comparar(resultados, referencia, args.tolerancia)
+        if regresiones:
+            print(f"\nREGRESIONES respecto a {args.comparar} (tolerancia {args.tolerancia:.0%}):")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            sys.exit(1)
+        print(f"\nSin regresiones respecto a {args.comparar} (tolerancia {args.tolerancia:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Control de calidad local de las imágenes antes de enviarlas al motor OCR.
+
+Las fotos borrosas, oscuras, quemadas, con reflejos o diminutas llegan a
+Gemini y vuelven como NO_DETECTADO tras varios segundos. Aquí se miden con
+OpenCV en unos milisegundos y se rechazan con un mensaje que dice al
+operario qué corregir al repetir la foto:
+  - resolución: lado mayor leído de la cabecera, sin decodificar
+  - exposición: histograma de la escala de grises; subexpuesta si ni el 1%
+    más claro de la imagen llega al umbral (un display LCD sobre fondo
+    negro es oscuro pero tiene dígitos claros) y sobreexpuesta si una
+    fracción grande de los píxeles está saturada
+  - reflejos: mayor región conexa de píxeles saturados
+  - nitidez: varianza del laplaciano (no se evalúa si la imagen está
+    subexpuesta, porque sin contraste siempre parece borrosa)
+
+Las medidas se toman sobre la escala de grises reducida a un lado de
+lado_analisis píxeles; con JPEG grandes la reducción la hace el propio
+decodificador (ImagenOCR.reducida_gris), así que los umbrales no dependen
+de la resolución de la cámara. Los valores por defecto son conservadores:
+solo rechazan imágenes claramente ilegibles.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from ocr_imagen import como_imagen
+
+MENSAJES = {
+    'resolucion': "Imagen demasiado pequeña ({ancho}x{alto} px): acerca la cámara o aumenta la resolución",
+    'subexpuesta': "Imagen demasiado oscura: busca más luz o activa el flash",
+    'sobreexpuesta': "Imagen sobreexpuesta: evita la luz directa o desactiva el flash",
+    'reflejo': "Hay un reflejo sobre la imagen: cambia el ángulo de la cámara para evitarlo",
+    'borrosa': "Imagen borrosa: mantén el móvil quieto y enfoca antes de disparar",
+}
+
+
+class ControlCalidad:
+    """Comprobaciones rápidas de resolución, exposición, reflejos y nitidez"""
+
+    def __init__(self, activo=True, lado_min=200, nitidez_min=10.0, brillo_min=50,
+                 saturados_max=0.4, reflejo_max=0.05, lado_analisis=640):
+        """
+        Inicializa el control
+
+        Args:
+            activo: Si es False no se rechaza ninguna imagen
+            lado_min: Lado mayor mínimo en píxeles
+            nitidez_min: Varianza mínima del laplaciano a lado_analisis píxeles
+            brillo_min: Nivel de gris mínimo (0-255) del 1% más claro de la imagen
+            saturados_max: Fracción máxima de píxeles saturados (>= 250)
+            reflejo_max: Fracción máxima de la imagen ocupada por la mayor
+                         región saturada
+            lado_analisis: Lado mayor de la imagen sobre la que se mide
+        """
+        self.activo = activo
+        self.lado_min = lado_min
+        self.nitidez_min = nitidez_min
+        self.brillo_min = brillo_min
+        self.saturados_max = saturados_max
+        self.reflejo_max = reflejo_max
+        self.lado_analisis = lado_analisis
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea el control a partir de las variables de entorno OCR_CALIDAD_*"""
+        return cls(
+            activo=os.getenv('OCR_CALIDAD', '1') == '1',
+            lado_min=int(os.getenv('OCR_CALIDAD_LADO_MIN', '200')),
+            nitidez_min=float(os.getenv('OCR_CALIDAD_NITIDEZ_MIN', '10')),
+            brillo_min=int(os.getenv('OCR_CALIDAD_BRILLO_MIN', '50')),
+            saturados_max=float(os.getenv('OCR_CALIDAD_SATURADOS_MAX', '0.4')),
+            reflejo_max=float(os.getenv('OCR_CALIDAD_REFLEJO_MAX', '0.05')),
+        )
+
+    def _gris_analisis(self, imagen):
+        """Escala de grises con el lado mayor reducido a lado_analisis"""
+        lado = max(imagen.tamano)
+        factor = next((f for f in (8, 4, 2) if lado / f >= self.lado_analisis), None)
+        gris = imagen.reducida_gris(factor) if factor else imagen.gris
+        alto, ancho = gris.shape[:2]
+        escala = self.lado_analisis / max(alto, ancho)
+        if escala < 1:
+            gris = cv2.resize(gris, (max(1, round(ancho * escala)), max(1, round(alto * escala))),
+                              interpolation=cv2.INTER_AREA)
+        return gris
+
+    def medir(self, imagen):
+        """
+        Medidas de calidad de la imagen
+
+        Args:
+            imagen: ImagenOCR, ruta, bytes o array numpy (BGR)
+
+        Returns:
+            dict: ancho, alto, brillo (nivel del 1% más claro), saturados
+                  (fracción), reflejo (fracción de la mayor región
+                  saturada) y nitidez (varianza del laplaciano)
+        """
+        imagen = como_imagen(imagen)
+        ancho, alto = imagen.tamano
+        medidas = {'ancho': ancho, 'alto': alto}
+        if max(ancho, alto) < self.lado_min:
+            return medidas
+
+        gris = self._gris_analisis(imagen)
+        histograma = cv2.calcHist([gris], [0], None, [256], [0, 256]).ravel() / gris.size
+        medidas['brillo'] = int(np.searchsorted(np.cumsum(histograma), 0.99))
+        medidas['saturados'] = float(histograma[250:].sum())
+
+        reflejo = 0.0
+        if medidas['saturados'] > 0:
+            saturados = (gris >= 250).astype(np.uint8)
+            n, _, estadisticas, _ = cv2.connectedComponentsWithStats(saturados, connectivity=8)
+            if n > 1:
+                reflejo = float(estadisticas[1:, cv2.CC_STAT_AREA].max()) / gris.size
+        medidas['reflejo'] = reflejo
+        medidas['nitidez'] = float(cv2.Laplacian(gris, cv2.CV_64F).var())
+        return medidas
+
+    def evaluar(self, imagen):
+        """
+        Comprueba si la imagen se puede leer
+
+        Args:
+            imagen: ImagenOCR, ruta, bytes o array numpy (BGR)
+
+        Returns:
+            tuple: (problemas, medidas); problemas es una lista de
+                   {'codigo', 'mensaje'}, vacía si la imagen es válida
+        """
+        medidas = self.medir(imagen)
+        codigos = []
+        if max(medidas['ancho'], medidas['alto']) < self.lado_min:
+            codigos.append('resolucion')
+        else:
+            if medidas['brillo'] < self.brillo_min:
+                codigos.append('subexpuesta')
+            elif medidas['saturados'] > self.saturados_max:
+                codigos.append('sobreexpuesta')
+            elif medidas['reflejo'] > self.reflejo_max:
+                codigos.append('reflejo')
+            if 'subexpuesta' not in codigos and medidas['nitidez'] < self.nitidez_min:
+                codigos.append('borrosa')
+
+        problemas = [{'codigo': codigo, 'mensaje': MENSAJES[codigo].format(**medidas)} for codigo in codigos]
+        return problemas, medidas
@@ -0,0 +1,338 @@
+"""
+Cola de trabajos OCR en segundo plano.
+
+Con la cola activa, los endpoints OCR guardan las imágenes como un trabajo
+y responden enseguida con su identificador; unos hilos de cada proceso
+toman los trabajos pendientes, llaman al OCR y guardan el resultado, que el
+cliente consulta (sondeo o server-sent events). Así los hilos de gunicorn
+no quedan ocupados durante la llamada a Gemini y /health y el resto de la
+aplicación siguen respondiendo aunque haya varias lecturas lentas en curso.
+
+Los trabajos se guardan en un fichero SQLite (sin broker externo) que
+comparten los workers de gunicorn del mismo equipo: cualquier proceso puede
+atender un trabajo encolado por otro y devolver su resultado. Un trabajo
+que lleva 'procesando' más del plazo (p. ej. porque su proceso murió) se
+vuelve a intentar una vez; si vuelve a agotar el plazo queda en error.
+Las imágenes se borran al terminar el trabajo y los resultados tras el TTL.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from datos import ruta_datos
+from registro import id_peticion
+
+log = logging.getLogger(__name__)
+
+PENDIENTE = 'pendiente'
+PROCESANDO = 'procesando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+ESTADOS_FINALES = (COMPLETADO, ERROR)
+
+MAX_INTENTOS = 2
+
+
+class ColaOCR:
+    """Cola de trabajos OCR persistente en SQLite, atendida por un pool de hilos"""
+
+    def __init__(self, ejecutor, ruta, hilos=2, ttl=3600, plazo=300, espera=0.5):
+        """
+        Inicializa la cola (los hilos se arrancan con iniciar())
+
+        Args:
+            ejecutor: Función (tipo, imagenes, usuario, parametros) -> dict
+                      que hace la lectura; imagenes es {campo: bytes}
+            ruta: Fichero SQLite de la cola
+            hilos: Trabajos que atiende a la vez este proceso
+            ttl: Segundos que se conservan los trabajos terminados
+            plazo: Segundos tras los que un trabajo en proceso se da por
+                   abandonado y se vuelve a encolar
+            espera: Segundos entre consultas de la cola cuando está vacía
+                    (los trabajos del propio proceso despiertan a los hilos
+                    al momento; los de otros procesos, en como mucho 'espera')
+        """
+        self.ejecutor = ejecutor
+        self.ruta = ruta
+        self.hilos = hilos
+        self.ttl = ttl
+        self.plazo = plazo
+        self.espera = espera
+        self._local = threading.local()
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        self._hilos = []
+        self._lock = threading.Lock()
+        self._ultima_limpieza = 0.0
+
+        self.procesados = 0
+        self.fallidos = 0
+
+        self._inicializar()
+
+    @classmethod
+    def desde_entorno(cls, ejecutor):
+        """Crea la cola a partir de las variables de entorno OCR_COLA_*"""
+        return cls(
+            ejecutor,
+            ruta=os.getenv('OCR_COLA_RUTA') or ruta_datos('ocr_cola.sqlite3'),
+            hilos=int(os.getenv('OCR_COLA_HILOS', '2')),
+            ttl=int(os.getenv('OCR_COLA_TTL', '3600')),
+            plazo=int(os.getenv('OCR_COLA_PLAZO', '300')),
+        )
+
+    def _conexion(self):
+        """Una conexión SQLite por hilo, en modo autocommit"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _inicializar(self):
+        conn = self._conexion()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                usuario TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                parametros TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                resultado TEXT,
+                error TEXT,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                creado REAL NOT NULL,
+                iniciado REAL,
+                terminado REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS imagenes_trabajo (
+                trabajo TEXT NOT NULL,
+                campo TEXT NOT NULL,
+                datos BLOB NOT NULL,
+                PRIMARY KEY (trabajo, campo)
+            )
+        """)
+
+    def iniciar(self):
+        """Arranca los hilos de este proceso (solo la primera vez)"""
+        with self._lock:
+            if self._hilos:
+                return
+            for i in range(self.hilos):
+                hilo = threading.Thread(target=self._bucle, name=f'ocr-cola-{i}', daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+        log.info("Cola OCR en %s con %d hilos", self.ruta, self.hilos)
+
+    def detener(self, espera=None):
+        """Pide a los hilos que terminen tras el trabajo en curso"""
+        self._parar.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join(espera)
+
+    def encolar(self, usuario, tipo, imagenes, parametros=None):
+        """
+        Guarda un trabajo pendiente
+
+        Args:
+            usuario: Propietario del trabajo (solo él puede consultarlo)
+            tipo: Tipo de lectura ('matricula', 'cuentakilometros' o 'vehiculo')
+            imagenes: {campo: bytes} con las imágenes codificadas
+            parametros: Datos adicionales de la lectura (p. ej. la matrícula)
+
+        Returns:
+            str: Identificador del trabajo
+        """
+        id_trabajo = uuid.uuid4().hex
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO trabajos (id, usuario, tipo, parametros, estado, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                (id_trabajo, usuario, tipo, json.dumps(parametros or {}), PENDIENTE, time.time())
+            )
+            conn.executemany(
+                "INSERT INTO imagenes_trabajo (trabajo, campo, datos) VALUES (?, ?, ?)",
+                [(id_trabajo, campo, sqlite3.Binary(datos)) for campo, datos in imagenes.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._aviso.set()
+        return id_trabajo
+
+    def consultar(self, id_trabajo, usuario):
+        """
+        Estado de un trabajo
+
+        Returns:
+            dict o None: {'trabajo', 'tipo', 'estado', 'resultado', 'error'}
+            (sin 'resultado' ni 'error' mientras no ha terminado; 'posicion'
+            en la cola si está pendiente); None si no existe o es de otro usuario
+        """
+        conn = self._conexion()
+        fila = conn.execute(
+            "SELECT tipo, estado, resultado, error, creado FROM trabajos WHERE id = ? AND usuario = ?",
+            (id_trabajo, usuario)
+        ).fetchone()
+        if fila is None:
+            return None
+
+        tipo, estado, resultado, error, creado = fila
+        trabajo = {'trabajo': id_trabajo, 'tipo': tipo, 'estado': estado}
+        if estado == PENDIENTE:
+            trabajo['posicion'] = conn.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado = ? AND creado < ?", (PENDIENTE, creado)
+            ).fetchone()[0] + 1
+        elif estado == COMPLETADO:
+            trabajo['resultado'] = json.loads(resultado)
+        elif estado == ERROR:
+            trabajo['error'] = error
+        return trabajo
+
+    def _reclamar(self):
+        """Marca como 'procesando' el trabajo más antiguo disponible y lo devuelve"""
+        conn = self._conexion()
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Los abandonados que ya agotaron sus intentos se dan por fallidos
+            # para que la limpieza los borre tras el TTL
+            agotados = [id_trabajo for id_trabajo, in conn.execute(
+                "SELECT id FROM trabajos WHERE estado = ? AND iniciado < ? AND intentos >= ?",
+                (PROCESANDO, ahora - self.plazo, MAX_INTENTOS)
+            ).fetchall()]
+            for id_trabajo in agotados:
+                conn.execute(
+                    "UPDATE trabajos SET estado = ?, error = ?, terminado = ? WHERE id = ?",
+                    (ERROR, 'El trabajo superó el plazo de procesamiento en todos sus intentos',
+                     ahora, id_trabajo)
+                )
+                conn.execute("DELETE FROM imagenes_trabajo WHERE trabajo = ?", (id_trabajo,))
+
+            fila = conn.execute("""
+                SELECT id, usuario, tipo, parametros FROM trabajos
+                WHERE estado = ? OR (estado = ? AND iniciado < ? AND intentos < ?)
+                ORDER BY creado LIMIT 1
+            """, (PENDIENTE, PROCESANDO, ahora - self.plazo, MAX_INTENTOS)).fetchone()
+            if fila is not None:
+                conn.execute(
+                    "UPDATE trabajos SET estado = ?, iniciado = ?, intentos = intentos + 1 WHERE id = ?",
+                    (PROCESANDO, ahora, fila[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for id_trabajo in agotados:
+            log.warning("Trabajo OCR %s abandonado tras %d intentos: se marca como error",
+                        id_trabajo, MAX_INTENTOS)
+        if fila is None:
+            return None
+
+        imagenes = dict(conn.execute(
+            "SELECT campo, datos FROM imagenes_trabajo WHERE trabajo = ?", (fila[0],)
+        ).fetchall())
+        return {'id': fila[0], 'usuario': fila[1], 'tipo': fila[2],
+                'parametros': json.loads(fila[3]), 'imagenes': imagenes}
+
+    def _terminar(self, id_trabajo, resultado=None, error=None):
+        """Guarda el resultado (o el error) y libera las imágenes del trabajo"""
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, resultado = ?, error = ?, terminado = ? WHERE id = ?",
+                (ERROR if error is not None else COMPLETADO,
+                 json.dumps(resultado, ensure_ascii=False) if resultado is not None else None,
+                 error, time.time(), id_trabajo)
+            )
+            conn.execute("DELETE FROM imagenes_trabajo WHERE trabajo = ?", (id_trabajo,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _limpiar(self):
+        """Borra los trabajos terminados hace más de ttl segundos (como mucho una vez por minuto)"""
+        ahora = time.time()
+        if ahora - self._ultima_limpieza < 60:
+            return
+        self._ultima_limpieza = ahora
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                DELETE FROM imagenes_trabajo WHERE trabajo IN
+                    (SELECT id FROM trabajos WHERE estado IN (?, ?) AND terminado < ?)
+            """, (*ESTADOS_FINALES, ahora - self.ttl))
+            conn.execute("DELETE FROM trabajos WHERE estado IN (?, ?) AND terminado < ?",
+                         (*ESTADOS_FINALES, ahora - self.ttl))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _bucle(self):
+        """Hilo de trabajo: toma trabajos pendientes hasta que se detiene la cola"""
+        while not self._parar.is_set():
+            try:
+                self._limpiar()
+                trabajo = self._reclamar()
+            except sqlite3.Error as e:
+                log.error("Cola OCR: %s", e)
+                trabajo = None
+
+            if trabajo is None:
+                self._aviso.wait(self.espera)
+                self._aviso.clear()
+                continue
+
+            # Los registros del trabajo llevan su identificador
+            id_peticion.set(trabajo['id'])
+            resultado, error = None, None
+            try:
+                resultado = self.ejecutor(trabajo['tipo'], trabajo['imagenes'],
+                                          trabajo['usuario'], trabajo['parametros'])
+            except Exception as e:
+                log.exception("Error en el trabajo OCR %s (%s): %s", trabajo['id'], trabajo['tipo'], e)
+                error = f'Error al procesar la imagen: {e}'
+
+            try:
+                self._terminar(trabajo['id'], resultado=resultado, error=error)
+            except sqlite3.Error as e:
+                # El trabajo sigue 'procesando' y se reintentará tras el plazo
+                log.error("No se pudo guardar el trabajo OCR %s: %s", trabajo['id'], e)
+            with self._lock:
+                if error is None:
+                    self.procesados += 1
+                else:
+                    self.fallidos += 1
+
+    def estadisticas(self):
+        """Trabajos por estado (todos los procesos) y contadores de este proceso"""
+        estados = dict(self._conexion().execute(
+            "SELECT estado, COUNT(*) FROM trabajos GROUP BY estado"
+        ).fetchall())
+        with self._lock:
+            return {
+                'pendientes': estados.get(PENDIENTE, 0),
+                'procesando': estados.get(PROCESANDO, 0),
+                'completados': estados.get(COMPLETADO, 0),
+                'errores': estados.get(ERROR, 0),
+                'hilos_proceso': len(self._hilos),
+                'procesados_proceso': self.procesados,
+                'fallidos_proceso': self.fallidos,
+            }
@@ -0,0 +1,23 @@
+"""
+Directorio de los ficheros persistentes de la aplicación.
+
+Los ficheros SQLite (vehículos, cola OCR y, si se activan, caché en disco y
+limitador de Gemini compartido) van por defecto a DATOS_DIR: 'data' dentro
+del directorio de trabajo, que en el contenedor es /app/data, declarado
+como volumen en el Dockerfile y montado en docker-compose.yml. Así los
+datos sobreviven a la reconstrucción del contenedor.
+"""
+
+import os
+
+
+def directorio_datos():
+    """Directorio de datos (DATOS_DIR), creado si no existe"""
+    directorio = os.getenv('DATOS_DIR', 'data')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def ruta_datos(nombre):
+    """Ruta de un fichero dentro del directorio de datos"""
+    return os.path.join(directorio_datos(), nombre)
@@ -0,0 +1,239 @@
+"""
+Lectura local de cuentakilómetros digitales (display de siete segmentos).
+
+Localiza la tira del display LCD (región clara y alargada dentro del cuadro
+de instrumentos), separa los dígitos y decodifica cada uno muestreando las
+siete zonas de segmento. Devuelve la lectura y una confianza entre 0 y 1;
+el llamador solo debe usarla si supera su umbral y, en otro caso, recurrir
+a Gemini.
+"""
+
+import cv2
+import numpy as np
+
+# Segmentos en orden: a (arriba), b (arriba dcha), c (abajo dcha), d (abajo),
+# e (abajo izda), f (arriba izda), g (centro)
+DIGITOS_SEGMENTOS = {
+    (1, 1, 1, 1, 1, 1, 0): '0',
+    (0, 1, 1, 0, 0, 0, 0): '1',
+    (1, 1, 0, 1, 1, 0, 1): '2',
+    (1, 1, 1, 1, 0, 0, 1): '3',
+    (0, 1, 1, 0, 0, 1, 1): '4',
+    (1, 0, 1, 1, 0, 1, 1): '5',
+    (1, 0, 1, 1, 1, 1, 1): '6',
+    (0, 0, 1, 1, 1, 1, 1): '6',
+    (1, 1, 1, 0, 0, 0, 0): '7',
+    (1, 1, 1, 0, 0, 1, 0): '7',
+    (1, 1, 1, 1, 1, 1, 1): '8',
+    (1, 1, 1, 1, 0, 1, 1): '9',
+    (1, 1, 1, 0, 0, 1, 1): '9',
+}
+
+# Zonas de cada segmento (x0, x1, y0, y1) relativas a la caja del dígito
+ZONAS_SEGMENTOS = (
+    (0.2, 0.8, 0.0, 0.15),
+    (0.75, 1.0, 0.08, 0.45),
+    (0.75, 1.0, 0.55, 0.92),
+    (0.2, 0.8, 0.85, 1.0),
+    (0.0, 0.25, 0.55, 0.92),
+    (0.0, 0.25, 0.08, 0.45),
+    (0.2, 0.8, 0.42, 0.58),
+)
+
+# Huecos interiores de las mitades superior e inferior: ningún dígito tiene
+# ahí un segmento, así que un bloque macizo no se confunde con un '8'
+ZONAS_HUECOS = (
+    (0.35, 0.65, 0.2, 0.33),
+    (0.35, 0.65, 0.67, 0.8),
+)
+
+UMBRAL_SEGMENTO = 0.35
+
+# Altura a la que se normaliza la tira antes de leerla
+ALTO_TIRA = 60
+
+# Inclinaciones probadas para los displays en cursiva
+INCLINACIONES = (0.0, 0.12, 0.24)
+
+ANCHO_TRABAJO = 640
+KERNEL_CIERRE = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 5))
+
+
+def _leer_digito(binaria, ancho_digito=None):
+    """
+    Decodifica un dígito binarizado (trazos en blanco). Devuelve (dígito, confianza)
+
+    Un '1' solo tiene los segmentos verticales derechos y su caja es más
+    estrecha que la de los demás dígitos: se coloca en una caja de
+    ancho_digito píxeles (por defecto, la mitad del alto) alineada a la
+    derecha y se muestrean las mismas zonas, así que solo se lee como '1'
+    si b y c están encendidos y el resto apagados.
+    """
+    alto, ancho = binaria.shape
+    estrecho = ancho < 0.35 * alto
+    if estrecho:
+        ancho_caja = max(ancho, int(round(ancho_digito or 0.5 * alto)))
+        caja = np.zeros((alto, ancho_caja), dtype=binaria.dtype)
+        caja[:, ancho_caja - ancho:] = binaria
+        binaria, ancho = caja, ancho_caja
+
+    estados = []
+    decision = []
+    for x0, x1, y0, y1 in ZONAS_SEGMENTOS + ZONAS_HUECOS:
+        zona = binaria[int(y0 * alto):max(int(y1 * alto), int(y0 * alto) + 1),
+                       int(x0 * ancho):max(int(x1 * ancho), int(x0 * ancho) + 1)]
+        relleno = np.count_nonzero(zona) / zona.size
+        estados.append(1 if relleno > UMBRAL_SEGMENTO else 0)
+        # Distancia al umbral: cuanto más lejos, más clara es la decisión
+        decision.append(min(1.0, abs(relleno - UMBRAL_SEGMENTO) / 0.25))
+
+    huecos = estados[len(ZONAS_SEGMENTOS):]
+    digito = None if any(huecos) else DIGITOS_SEGMENTOS.get(tuple(estados[:len(ZONAS_SEGMENTOS)]))
+    if estrecho and digito != '1':
+        digito = None
+    return digito, (min(decision) if digito else 0.0)
+
+
+def _binarizar_tira(gris):
+    """Normaliza la altura, binariza con los trazos en blanco y elimina el marco"""
+    escala = ALTO_TIRA / gris.shape[0]
+    gris = cv2.resize(gris, (max(1, round(gris.shape[1] * escala)), ALTO_TIRA),
+                      interpolation=cv2.INTER_CUBIC)
+    _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Los dígitos ocupan menos superficie que el fondo del display
+    if np.count_nonzero(binaria) > binaria.size / 2:
+        binaria = 255 - binaria
+
+    # Quitar líneas largas del marco del display
+    ancho = binaria.shape[1]
+    horizontales = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(3, int(ancho * 0.35)), 1)))
+    verticales = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, cv2.getStructuringElement(
+        cv2.MORPH_RECT, (1, int(ALTO_TIRA * 0.85))))
+    binaria = cv2.subtract(binaria, cv2.bitwise_or(horizontales, verticales))
+
+    # Quitar restos pequeños
+    n, etiquetas, stats, _ = cv2.connectedComponentsWithStats(binaria)
+    for i in range(1, n):
+        if stats[i][cv2.CC_STAT_AREA] < 0.012 * ALTO_TIRA * ALTO_TIRA:
+            binaria[etiquetas == i] = 0
+    return binaria
+
+
+def leer_tira(gris):
+    """
+    Lee los dígitos de siete segmentos de una tira de display
+
+    Args:
+        gris: Array numpy en escala de grises recortado al display
+
+    Returns:
+        tuple: (texto, confianza). El texto vacío indica que no se pudo leer
+    """
+    if gris.shape[0] < 8 or gris.shape[1] < 16:
+        return '', 0.0
+
+    binaria = _binarizar_tira(gris)
+    mejor_texto, mejor_confianza = '', 0.0
+    for inclinacion in INCLINACIONES:
+        matriz = np.float32([[1, inclinacion, -inclinacion * ALTO_TIRA / 2], [0, 1, 0]])
+        recta = cv2.warpAffine(binaria, matriz, (binaria.shape[1], ALTO_TIRA))
+        # Unir los segmentos separados de un mismo dígito
+        unida = cv2.morphologyEx(recta, cv2.MORPH_CLOSE,
+                                 cv2.getStructuringElement(cv2.MORPH_RECT, (3, 9)))
+
+        n, _, stats, _ = cv2.connectedComponentsWithStats(unida)
+        cajas = []
+        for i in range(1, n):
+            x, y, w, h = stats[i][:4]
+            if h < 0.4 * ALTO_TIRA or w > h:
+                continue
+            cajas.append((x, y, w, h))
+        if not cajas:
+            continue
+
+        # Los dígitos del odómetro tienen todos la misma altura
+        alto_medio = np.median([c[3] for c in cajas])
+        cajas = sorted(c for c in cajas if abs(c[3] - alto_medio) < 0.2 * alto_medio)
+        if not 1 <= len(cajas) <= 7:
+            continue
+
+        # Ancho de referencia para los '1', tomado de los dígitos anchos
+        anchos = [w for _, _, w, h in cajas if w >= 0.35 * h]
+        ancho_digito = np.median(anchos) if anchos else None
+
+        texto = ''
+        confianzas = []
+        for x, y, w, h in cajas:
+            digito, confianza = _leer_digito(recta[y:y + h, x:x + w], ancho_digito)
+            if digito is None:
+                texto, confianzas = '', [0.0]
+                break
+            texto += digito
+            confianzas.append(confianza)
+
+        confianza = min(confianzas)
+        if texto and confianza > mejor_confianza:
+            mejor_texto, mejor_confianza = texto, confianza
+
+    return mejor_texto, round(float(mejor_confianza), 3)
+
+
+def localizar_display(imagen):
+    """
+    Busca las regiones candidatas a display digital del cuentakilómetros
+
+    Args:
+        imagen: Array numpy (BGR o escala de grises)
+
+    Returns:
+        list: Rectángulos (x, y, ancho, alto) en coordenadas de la imagen original
+    """
+    gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+    alto_orig, ancho_orig = gris.shape[:2]
+    escala = ANCHO_TRABAJO / ancho_orig
+    interpolacion = cv2.INTER_AREA if escala < 1 else cv2.INTER_LINEAR
+    reducida = cv2.resize(gris, (ANCHO_TRABAJO, max(1, round(alto_orig * escala))),
+                          interpolation=interpolacion)
+    area_total = float(reducida.size)
+
+    # El display retroiluminado es más claro que el cuadro que lo rodea
+    candidatos = set()
+    for percentil in (75, 85, 92, 97):
+        umbral = np.percentile(reducida, percentil)
+        _, mascara = cv2.threshold(reducida, umbral, 255, cv2.THRESH_BINARY)
+        mascara = cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, KERNEL_CIERRE)
+        contornos, _ = cv2.findContours(mascara, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        for contorno in contornos:
+            x, y, w, h = cv2.boundingRect(contorno)
+            if h == 0 or not 1.8 <= w / float(h) <= 8.0:
+                continue
+            if not 0.001 <= (w * h) / area_total <= 0.2:
+                continue
+            if cv2.contourArea(contorno) / float(w * h) < 0.6:
+                continue
+            candidatos.add((int(x / escala), int(y / escala),
+                            max(1, int(w / escala)), max(1, int(h / escala))))
+    return sorted(candidatos)
+
+
+def leer_cuentakilometros(imagen):
+    """
+    Intenta leer localmente un cuentakilómetros digital
+
+    Args:
+        imagen: Array numpy (BGR)
+
+    Returns:
+        tuple: (texto, confianza). Texto vacío y confianza 0 si no hay lectura
+    """
+    gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+    mejor_texto, mejor_confianza = '', 0.0
+    for x, y, w, h in localizar_display(gris):
+        texto, confianza = leer_tira(gris[y:y + h, x:x + w])
+        # Un odómetro tiene al menos 4 dígitos visibles
+        if len(texto) < 4:
+            continue
+        if confianza > mejor_confianza:
+            mejor_texto, mejor_confianza = texto, confianza
+    return mejor_texto, mejor_confianza
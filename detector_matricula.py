@@ -0,0 +1,141 @@
+"""
+Localización local de la matrícula con OpenCV.
+
+Busca regiones claras y rectangulares (el fondo blanco de la matrícula)
+con varios umbrales de brillo, filtra los contornos por relación de aspecto
+del rectángulo mínimo y comprueba que en su interior haya una fila de
+caracteres oscuros. Devuelve la región más probable y una confianza entre
+0 y 1 para que el llamador decida si recortar o enviar el fotograma completo.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+# Relación de aspecto de una matrícula europea (520 x 110 mm)
+ASPECTO_MATRICULA = 4.7
+ASPECTO_MIN = 2.0
+ASPECTO_MAX = 7.0
+
+# La detección se hace sobre una versión de este ancho
+ANCHO_TRABAJO = 640
+
+# Núcleo de cierre para tapar los caracteres dentro del fondo claro
+KERNEL_CIERRE = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 9))
+
+
+def _contar_caracteres(gris, rect_rotado):
+    """Cuenta los componentes oscuros con forma de carácter dentro de la región"""
+    (cx, cy), (rw, rh), angulo = rect_rotado
+    if rw < rh:
+        rw, rh = rh, rw
+        angulo += 90
+
+    # Enderezar la región antes de analizarla
+    matriz = cv2.getRotationMatrix2D((cx, cy), angulo, 1.0)
+    rotada = cv2.warpAffine(gris, matriz, (gris.shape[1], gris.shape[0]),
+                            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    x0, y0 = int(cx - rw / 2), int(cy - rh / 2)
+    region = rotada[max(0, y0):y0 + int(rh), max(0, x0):x0 + int(rw)]
+    if region.size == 0 or region.shape[0] < 8:
+        return 0
+
+    _, binaria = cv2.threshold(region, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(binaria)
+    alto = region.shape[0]
+    caracteres = 0
+    for i in range(1, n):
+        _, _, w, h, _ = stats[i]
+        if 0.35 * alto <= h <= 0.95 * alto and 0.1 * h <= w <= 0.8 * h:
+            caracteres += 1
+    return caracteres
+
+
+def localizar_matricula(imagen):
+    """
+    Localiza la matrícula en una imagen
+
+    Args:
+        imagen: Array numpy (BGR o escala de grises)
+
+    Returns:
+        tuple: ((x, y, ancho, alto), confianza) en coordenadas de la imagen
+               original, o (None, 0.0) si no hay candidatas
+    """
+    gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+    alto_orig, ancho_orig = gris.shape[:2]
+
+    # Trabajar siempre al mismo ancho para que el núcleo morfológico
+    # tenga un tamaño coherente con el de los caracteres
+    escala = ANCHO_TRABAJO / ancho_orig
+    interpolacion = cv2.INTER_AREA if escala < 1 else cv2.INTER_LINEAR
+    gris = cv2.resize(gris, (ANCHO_TRABAJO, max(1, round(alto_orig * escala))),
+                      interpolation=interpolacion)
+    gris = cv2.GaussianBlur(gris, (3, 3), 0)
+    area_total = float(gris.size)
+
+    umbral_otsu, _ = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    umbrales = [umbral_otsu] + list(np.percentile(gris, [60, 75, 90]))
+
+    mejor, mejor_confianza = None, 0.0
+    for umbral in umbrales:
+        _, mascara = cv2.threshold(gris, umbral, 255, cv2.THRESH_BINARY)
+        mascara = cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, KERNEL_CIERRE)
+        contornos, _ = cv2.findContours(mascara, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        for contorno in contornos:
+            area = cv2.contourArea(contorno)
+            if not 0.002 * area_total <= area <= 0.9 * area_total:
+                continue
+
+            rect_rotado = cv2.minAreaRect(contorno)
+            rw, rh = rect_rotado[1]
+            if min(rw, rh) == 0:
+                continue
+            aspecto = max(rw, rh) / min(rw, rh)
+            if not ASPECTO_MIN <= aspecto <= ASPECTO_MAX:
+                continue
+            relleno = area / (rw * rh)
+            if relleno < 0.6:
+                continue
+
+            # Cercanía a la relación de aspecto ideal (escala logarítmica)
+            p_aspecto = max(0.0, 1.0 - abs(math.log(aspecto / ASPECTO_MATRICULA)) / math.log(3))
+            # Las matrículas españolas tienen 7 caracteres (4 números + 3 letras)
+            caracteres = _contar_caracteres(gris, rect_rotado)
+            p_caracteres = min(1.0, caracteres / 6) if caracteres <= 10 else 0.3
+
+            confianza = 0.3 * p_aspecto + 0.2 * min(1.0, relleno) + 0.5 * p_caracteres
+            if confianza > mejor_confianza:
+                mejor, mejor_confianza = cv2.boundingRect(contorno), confianza
+
+    if mejor is None:
+        return None, 0.0
+
+    x, y, w, h = mejor
+    return (int(x / escala), int(y / escala), int(w / escala), int(h / escala)), round(mejor_confianza, 3)
+
+
+def recortar_matricula(imagen, umbral=0.6, margen=0.1):
+    """
+    Recorta la matrícula si se localiza con suficiente confianza
+
+    Args:
+        imagen: Array numpy (BGR)
+        umbral: Confianza mínima para recortar
+        margen: Margen relativo añadido alrededor de la región
+
+    Returns:
+        tuple: (imagen recortada o la original, confianza)
+    """
+    rect, confianza = localizar_matricula(imagen)
+    if rect is None or confianza < umbral:
+        return imagen, confianza
+
+    x, y, w, h = rect
+    mx, my = int(w * margen), int(h * margen)
+    alto, ancho = imagen.shape[:2]
+    x0, y0 = max(0, x - mx), max(0, y - my)
+    x1, y1 = min(ancho, x + w + mx), min(alto, y + h + my)
+    return imagen[y0:y1, x0:x1], confianza
@@ -0,0 +1,176 @@
+"""
+Exportación de vehículos a Excel (XLSX) y CSV en streaming.
+
+Los generadores reciben un iterable de vehículos (p. ej. el cursor por
+lotes de AlmacenVehiculos.iterar) y producen el fichero en bloques de
+bytes a medida que leen filas, de modo que la memoria usada no depende del
+número de vehículos y el navegador empieza a recibir la descarga enseguida.
+
+El XLSX se escribe directamente como ZIP con la hoja en XML (cadenas en
+línea, sin tabla de cadenas compartidas). zipfile admite escribir en un
+flujo no posicionable usando descriptores de datos, que Excel y
+LibreOffice leen sin problema.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+COLUMNAS = (
+    ('matricula', 'Matrícula', 15),
+    ('kilometros', 'Kilometraje', 15),
+    ('fecha', 'Fecha de Registro', 20),
+)
+
+FILAS_POR_BLOQUE = 1000
+
+# Caracteres de control no permitidos en XML 1.0
+_CONTROL_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_TIPOS_CONTENIDO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+_RELACIONES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_LIBRO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Vehículos" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_RELACIONES_LIBRO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Estilo 0: normal. Estilo 1: negrita (encabezados)
+_ESTILOS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+_LETRAS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class _SalidaEnBloques:
+    """Destino de escritura no posicionable que acumula bytes hasta vaciarse"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _celda(columna, fila, valor, estilo=0):
+    texto = escape(_CONTROL_XML.sub('', str(valor if valor is not None else '')))
+    atributo_estilo = f' s="{estilo}"' if estilo else ''
+    return f'<c r="{_LETRAS[columna]}{fila}" t="inlineStr"{atributo_estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila(numero, valores, estilo=0):
+    celdas = ''.join(_celda(i, numero, valor, estilo) for i, valor in enumerate(valores))
+    return f'<row r="{numero}">{celdas}</row>'.encode('utf-8')
+
+
+def generar_xlsx(vehiculos, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera un XLSX con los vehículos en bloques de bytes
+
+    Args:
+        vehiculos: Iterable de dicts con matricula, kilometros y fecha
+        filas_por_bloque: Filas escritas entre cada entrega de bytes
+
+    Yields:
+        bytes: Fragmentos consecutivos del fichero
+    """
+    salida = _SalidaEnBloques()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _TIPOS_CONTENIDO)
+        libro.writestr('_rels/.rels', _RELACIONES)
+        libro.writestr('xl/workbook.xml', _LIBRO)
+        libro.writestr('xl/_rels/workbook.xml.rels', _RELACIONES_LIBRO)
+        libro.writestr('xl/styles.xml', _ESTILOS)
+        yield salida.vaciar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w') as hoja:
+            anchos = ''.join(
+                f'<col min="{i}" max="{i}" width="{ancho}" customWidth="1"/>'
+                for i, (_, _, ancho) in enumerate(COLUMNAS, start=1)
+            )
+            hoja.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<cols>{anchos}</cols><sheetData>'.encode('utf-8')
+            )
+            hoja.write(_fila(1, [titulo for _, titulo, _ in COLUMNAS], estilo=1))
+
+            for numero, vehiculo in enumerate(vehiculos, start=2):
+                hoja.write(_fila(numero, [vehiculo.get(campo, '') for campo, _, _ in COLUMNAS]))
+                if numero % filas_por_bloque == 0:
+                    datos = salida.vaciar()
+                    if datos:
+                        yield datos
+
+            hoja.write(b'</sheetData></worksheet>')
+
+    yield salida.vaciar()
+
+
+def _valor_csv(valor):
+    """Neutraliza valores que una hoja de cálculo interpretaría como fórmula"""
+    texto = str(valor if valor is not None else '')
+    if texto[:1] in ('=', '+', '-', '@'):
+        return "'" + texto
+    return texto
+
+
+def generar_csv(vehiculos, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera un CSV (UTF-8 con BOM, separador ';' como espera Excel en
+    español) con los vehículos en bloques de bytes
+
+    Yields:
+        bytes: Fragmentos consecutivos del fichero
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    escritor.writerow([titulo for _, titulo, _ in COLUMNAS])
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    buffer.seek(0)
+    buffer.truncate()
+    for numero, vehiculo in enumerate(vehiculos, start=1):
+        escritor.writerow([_valor_csv(vehiculo.get(campo, '')) for campo, _, _ in COLUMNAS])
+        if numero % filas_por_bloque == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,51 @@
+"""
+Configuración de gunicorn. gunicorn la carga automáticamente desde el
+directorio de trabajo; las opciones de la línea de órdenes (Dockerfile,
+Procfile) tienen prioridad sobre las de este fichero.
+
+Métricas con varios workers: prometheus_client guarda los valores de cada
+proceso en ficheros de PROMETHEUS_MULTIPROC_DIR y /metrics los suma. La
+variable se define aquí, antes de que ningún proceso importe la
+aplicación, y el directorio se vacía al arrancar para no arrastrar valores
+de una ejecución anterior.
+
+Precalentamiento: cada worker crea su procesador OCR (y su conexión con
+Gemini) nada más cargar la aplicación, en post_worker_init, ya después del
+fork y del parcheo de gevent; nada de eso se comparte entre procesos
+aunque se use --preload. /health responde 503 hasta que termina. Los
+módulos del OCR se importan en ese mismo hilo (app.py no los importa), así
+que el worker empieza a aceptar conexiones sin esperarlos.
+"""
+
+import os
+import shutil
+import tempfile
+
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), f'metricas_gunicorn_{os.getpid()}')
+
+# Tras definir la variable; child_exit se ejecuta en el manejador de SIGCHLD,
+# donde importar el módulo por primera vez puede reentrar a medias
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # La aplicación ya está importada en el worker
+    from app import iniciar_precalentamiento
+    iniciar_precalentamiento()
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    if os.path.basename(directorio).startswith('metricas_gunicorn_'):
+        shutil.rmtree(directorio, ignore_errors=True)
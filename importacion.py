@@ -0,0 +1,476 @@
+"""
+Importación masiva de registros de vehículos (matrícula, kilometraje y
+fecha) desde CSV o XLSX.
+
+El fichero se lee en streaming: el CSV línea a línea y el XLSX
+descomprimiendo la hoja por bloques y extrayendo las filas del XML, sin
+construir el libro en memoria (openpyxl, incluso en modo solo lectura, es
+varias veces más lento). Cada fila se valida con las mismas reglas
+que el OCR (validacion.py) y las válidas se insertan en lotes, un lote
+por transacción.
+
+Columnas reconocidas en la cabecera (sin distinguir mayúsculas ni
+acentos): Matrícula, Kilometraje/Kilómetros/Km y Fecha/Fecha de Registro.
+Si la primera fila no es una cabecera se asume el orden matrícula,
+kilometraje, fecha, que es el de las exportaciones de la aplicación.
+
+Uso desde la línea de comandos:
+    python importacion.py historico.xlsx --usuario admin
+"""
+
+import argparse
+import codecs
+import csv
+import html
+import io
+import logging
+import os
+import re
+import time
+import unicodedata
+import zipfile
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from xml.parsers import expat
+
+from validacion import limpiar_cuentakilometros, limpiar_matricula
+
+log = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'xlsx')
+
+# Vehículos por transacción: con lotes grandes cada página de los índices
+# se escribe menos veces en el WAL
+TAMANO_LOTE = 50000
+
+# Errores de fila que se devuelven en el resumen (el resto solo se cuentan)
+MAX_ERRORES = 50
+
+_ALIAS_COLUMNAS = {
+    'matricula': ('matricula', 'placa', 'plate'),
+    'kilometros': ('kilometraje', 'kilometros', 'km', 'kms', 'odometro', 'cuentakilometros'),
+    'fecha': ('fecha', 'fecha de registro', 'fecha registro', 'fecha de inspeccion', 'fecha inspeccion', 'date'),
+}
+
+_FECHA_CANONICA = re.compile(r'\d{4}-\d{2}-\d{2} [0-2]\d:[0-5]\d:[0-5]\d')
+_FECHA_ISO = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?')
+_FECHA_ES = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})(?: (\d{1,2}):(\d{2})(?::(\d{2}))?)?')
+
+# Origen de las fechas numéricas de Excel (sistema 1900)
+_ORIGEN_EXCEL = datetime(1899, 12, 30)
+
+_BLOQUE_LECTURA = 256 * 1024
+
+_INICIO_HOJA = re.compile(r'<(\w+:)?sheetData\b')
+_TEXTO_ENRIQUECIDO = re.compile(r'<(?:\w+:)?t\b[^>]*>([^<]*)</(?:\w+:)?t>')
+
+
+def _normalizar_cabecera(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(texto.lower().replace('_', ' ').split())
+
+
+def mapear_columnas(cabecera):
+    """
+    Posición de cada campo según la fila de cabecera
+
+    Returns:
+        dict: {'matricula', 'kilometros', 'fecha'} -> índice de columna (o
+        None si la fila no parece una cabecera)
+
+    Raises:
+        ValueError: si la cabecera no incluye matrícula y kilometraje
+    """
+    posiciones = {}
+    for indice, titulo in enumerate(cabecera):
+        nombre = _normalizar_cabecera(titulo)
+        for campo, alias in _ALIAS_COLUMNAS.items():
+            if nombre in alias and campo not in posiciones:
+                posiciones[campo] = indice
+    if not posiciones:
+        return None
+    for campo, titulo in (('matricula', 'Matrícula'), ('kilometros', 'Kilometraje')):
+        if campo not in posiciones:
+            raise ValueError(f"El fichero no tiene columna de {titulo}")
+    return posiciones
+
+
+@lru_cache(maxsize=8192)
+def _dia_valido(dia):
+    try:
+        datetime.strptime(dia, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return True
+
+
+def normalizar_fecha(valor):
+    """
+    Convierte una fecha de hoja de cálculo al formato del almacén
+    ('AAAA-MM-DD HH:MM:SS')
+
+    Acepta AAAA-MM-DD[ HH:MM[:SS]], DD/MM/AAAA[ HH:MM[:SS]], fechas
+    numéricas de Excel y objetos datetime.
+
+    Returns:
+        str: Fecha normalizada ('' si no es válida)
+    """
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, float):
+        try:
+            return (_ORIGEN_EXCEL + timedelta(days=valor)).strftime('%Y-%m-%d %H:%M:%S')
+        except (OverflowError, ValueError):
+            return ''
+
+    texto = valor.strip()
+    # Camino rápido para el formato del almacén: las fechas de un histórico
+    # se repiten mucho por día, así que se valida solo el día y con caché
+    if _FECHA_CANONICA.fullmatch(texto) and texto[11:13] < '24':
+        return texto if _dia_valido(texto[:10]) else ''
+
+    coincidencia = _FECHA_ISO.fullmatch(texto)
+    if coincidencia:
+        anio, mes, dia, hora, minuto, segundo = coincidencia.groups()
+    else:
+        coincidencia = _FECHA_ES.fullmatch(texto)
+        if not coincidencia:
+            return ''
+        dia, mes, anio, hora, minuto, segundo = coincidencia.groups()
+    try:
+        fecha = datetime(int(anio), int(mes), int(dia), int(hora or 0), int(minuto or 0), int(segundo or 0))
+    except ValueError:
+        return ''
+    return (f"{fecha.year:04d}-{fecha.month:02d}-{fecha.day:02d} "
+            f"{fecha.hour:02d}:{fecha.minute:02d}:{fecha.second:02d}")
+
+
+def leer_csv(flujo):
+    """
+    Recorre las filas de un CSV binario (UTF-8, con o sin BOM)
+
+    El separador (';', ',' o tabulador) se deduce de la primera línea.
+
+    Yields:
+        list: Valores de cada fila como texto
+    """
+    texto = io.TextIOWrapper(flujo, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        primera = texto.readline()
+        separador = max((';', ',', '\t'), key=primera.count)
+        yield from csv.reader(_encadenar(primera, texto), delimiter=separador)
+    finally:
+        # No cerrar el flujo del llamador al liberar el envoltorio
+        texto.detach()
+
+
+def _encadenar(primera, resto):
+    if primera:
+        yield primera
+    yield from resto
+
+
+def _indice_columna(referencia):
+    """'C12' -> 2"""
+    indice = 0
+    for caracter in referencia:
+        if caracter.isdigit():
+            break
+        indice = indice * 26 + ord(caracter) - 64
+    return indice - 1
+
+
+def _nombre_local(etiqueta):
+    return etiqueta.rpartition(':')[2]
+
+
+def _ruta_primera_hoja(libro):
+    """Ruta dentro del ZIP de la primera hoja del libro"""
+    relaciones = {}
+    hojas = []
+
+    def inicio_relaciones(etiqueta, atributos):
+        if _nombre_local(etiqueta) == 'Relationship':
+            relaciones[atributos.get('Id')] = atributos.get('Target', '')
+
+    def inicio_libro(etiqueta, atributos):
+        if _nombre_local(etiqueta) == 'sheet':
+            hojas.append(next((v for k, v in atributos.items() if _nombre_local(k) == 'id'), None))
+
+    try:
+        for ruta, manejador in (('xl/_rels/workbook.xml.rels', inicio_relaciones),
+                                ('xl/workbook.xml', inicio_libro)):
+            analizador = expat.ParserCreate()
+            analizador.StartElementHandler = manejador
+            analizador.Parse(libro.read(ruta), True)
+        destino = relaciones[hojas[0]]
+    except (KeyError, IndexError, expat.ExpatError):
+        return 'xl/worksheets/sheet1.xml'
+    if destino.startswith('/'):
+        return destino.lstrip('/')
+    return 'xl/' + destino
+
+
+def _cadenas_compartidas(libro):
+    """Tabla de cadenas compartidas del libro (vacía si no tiene)"""
+    cadenas = []
+    partes = []
+    estado = {'dentro': False}
+
+    def inicio(etiqueta, atributos):
+        nombre = _nombre_local(etiqueta)
+        if nombre == 'si':
+            partes.clear()
+        elif nombre == 't':
+            estado['dentro'] = True
+
+    def fin(etiqueta):
+        nombre = _nombre_local(etiqueta)
+        if nombre == 't':
+            estado['dentro'] = False
+        elif nombre == 'si':
+            cadenas.append(''.join(partes))
+
+    def texto(datos):
+        if estado['dentro']:
+            partes.append(datos)
+
+    try:
+        flujo = libro.open('xl/sharedStrings.xml')
+    except KeyError:
+        return cadenas
+    analizador = expat.ParserCreate()
+    analizador.StartElementHandler = inicio
+    analizador.EndElementHandler = fin
+    analizador.CharacterDataHandler = texto
+    with flujo:
+        analizador.ParseFile(flujo)
+    return cadenas
+
+
+def _celdas(contenido, prefijo, cadenas):
+    """Valores de las celdas de una fila a partir del XML de su contenido"""
+    fila = []
+    apertura = f'<{prefijo}c '
+    valor_v = f'<{prefijo}v>'
+    cierre_t = f'</{prefijo}t>'
+    for celda in contenido.split(f'</{prefijo}c>'):
+        # Las celdas vacías (<c .../>) quedan delante de la siguiente
+        inicio = celda.rfind(apertura)
+        if inicio < 0:
+            continue
+        cierre = celda.find('>', inicio)
+        atributos = celda[inicio:cierre]
+        interior = celda[cierre + 1:]
+        if not interior:
+            continue
+
+        posicion = interior.find(valor_v)
+        if posicion >= 0:
+            posicion += len(valor_v)
+            valor = interior[posicion:interior.find('<', posicion)]
+        elif interior.count(cierre_t) == 1:
+            posicion = interior.find('>', interior.find(f'<{prefijo}t')) + 1
+            valor = interior[posicion:interior.find('<', posicion)]
+        else:
+            # Texto enriquecido: varios fragmentos <t>
+            valor = ''.join(_TEXTO_ENRIQUECIDO.findall(interior))
+        if '&' in valor:
+            valor = html.unescape(valor)
+
+        posicion = atributos.find(' t="')
+        tipo = atributos[posicion + 4:atributos.find('"', posicion + 4)] if posicion >= 0 else 'n'
+        if tipo == 's':
+            valor = cadenas[int(valor)] if valor else ''
+        elif tipo == 'n' and valor:
+            try:
+                valor = float(valor)
+            except ValueError:
+                pass
+
+        posicion = atributos.find(' r="')
+        columna = _indice_columna(atributos[posicion + 4:posicion + 8]) if posicion >= 0 else len(fila)
+        if columna >= len(fila):
+            fila.extend([''] * (columna + 1 - len(fila)))
+        fila[columna] = valor
+    return fila
+
+
+def leer_xlsx(fichero):
+    """
+    Recorre las filas de la primera hoja de un XLSX
+
+    La hoja se descomprime por bloques y las filas se extraen del XML
+    partiendo el texto por las etiquetas de cierre (sheetData tiene una
+    estructura fija), bastante más rápido que un analizador con un evento
+    por elemento.
+
+    Args:
+        fichero: Ruta o fichero binario posicionable
+
+    Yields:
+        list: Valores de cada fila; las celdas numéricas se devuelven como
+        float y el resto como texto
+    """
+    with zipfile.ZipFile(fichero) as libro:
+        cadenas = _cadenas_compartidas(libro)
+        decodificador = codecs.getincrementaldecoder('utf-8')()
+        prefijo = None
+        pendiente = ''
+        with libro.open(_ruta_primera_hoja(libro)) as hoja:
+            while True:
+                bloque = hoja.read(_BLOQUE_LECTURA)
+                pendiente += decodificador.decode(bloque, not bloque)
+                if prefijo is None:
+                    # Prefijo del espacio de nombres, si lo hay (p. ej. 'x:')
+                    inicio = _INICIO_HOJA.search(pendiente)
+                    if inicio is None and bloque:
+                        continue
+                    prefijo = (inicio.group(1) or '') if inicio else ''
+                    apertura_fila = f'<{prefijo}row'
+
+                piezas = pendiente.split(f'</{prefijo}row>')
+                # La última pieza es una fila cortada entre bloques (o el final)
+                pendiente = piezas.pop()
+                for pieza in piezas:
+                    inicio = pieza.rfind(apertura_fila)
+                    if inicio >= 0:
+                        yield _celdas(pieza[pieza.find('>', inicio) + 1:], prefijo, cadenas)
+                if not bloque:
+                    break
+
+
+def detectar_formato(nombre, flujo):
+    """
+    Formato del fichero ('csv' o 'xlsx') por su extensión o, si no la
+    tiene, por su firma (los XLSX son ZIP)
+    """
+    extension = os.path.splitext(nombre or '')[1].lower().lstrip('.')
+    if extension in FORMATOS:
+        return extension
+    posicion = flujo.tell()
+    firma = flujo.read(4)
+    flujo.seek(posicion)
+    return 'xlsx' if firma == b'PK\x03\x04' else 'csv'
+
+
+def _texto(valor):
+    if isinstance(valor, float):
+        return str(int(valor)) if valor.is_integer() else str(valor)
+    return valor or ''
+
+
+def validar_filas(filas, fecha_defecto, errores, max_errores=MAX_ERRORES):
+    """
+    Valida y normaliza las filas leídas del fichero
+
+    Las filas vacías se ignoran; las no válidas se cuentan en
+    errores['total'] y las primeras max_errores se anotan en
+    errores['filas'] con su número de fila y el motivo.
+
+    Yields:
+        dict: Vehículo con matricula, kilometros y fecha
+    """
+    posiciones = None
+    for numero, fila in enumerate(filas, start=1):
+        if numero == 1:
+            posiciones = mapear_columnas(fila)
+            if posiciones is not None:
+                continue
+            posiciones = {'matricula': 0, 'kilometros': 1, 'fecha': 2}
+        indice_matricula = posiciones['matricula']
+        indice_kilometros = posiciones['kilometros']
+        indice_fecha = posiciones.get('fecha')
+
+        if not any(fila):
+            continue
+        largo = len(fila)
+        matricula = limpiar_matricula(_texto(fila[indice_matricula]) if indice_matricula < largo else '')
+        kilometros = limpiar_cuentakilometros(_texto(fila[indice_kilometros]) if indice_kilometros < largo else '')
+        fecha = fila[indice_fecha] if indice_fecha is not None and indice_fecha < largo else ''
+        fecha = normalizar_fecha(fecha) if fecha else fecha_defecto
+
+        if matricula and kilometros and fecha:
+            yield {'matricula': matricula, 'kilometros': kilometros, 'fecha': fecha}
+            continue
+
+        errores['total'] += 1
+        if len(errores['filas']) < max_errores:
+            motivo = ('Matrícula no válida' if not matricula else
+                      'Kilometraje no válido' if not kilometros else 'Fecha no válida')
+            errores['filas'].append({'fila': numero, 'motivo': motivo})
+
+
+def importar_vehiculos(almacen, usuario, flujo, nombre=None, formato=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa en el almacén los vehículos de un fichero CSV o XLSX
+
+    Args:
+        almacen: AlmacenVehiculos de destino
+        usuario: Propietario de los vehículos importados
+        flujo: Fichero binario posicionable (o ruta)
+        nombre: Nombre original del fichero, para deducir el formato
+        formato: 'csv' o 'xlsx' (por defecto se deduce)
+        tamano_lote: Vehículos insertados por transacción
+
+    Returns:
+        dict: Resumen con importados, rechazados, errores (primeras filas
+        rechazadas con su motivo) y segundos
+
+    Raises:
+        ValueError: si el formato no es válido o falta alguna columna
+    """
+    if isinstance(flujo, str):
+        with open(flujo, 'rb') as fichero:
+            return importar_vehiculos(almacen, usuario, fichero, nombre or flujo, formato, tamano_lote)
+
+    formato = formato or detectar_formato(nombre, flujo)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de importación no válido: {formato}")
+
+    inicio = time.perf_counter()
+    # Los registros sin fecha se fechan en el momento de la importación
+    fecha_defecto = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    errores = {'total': 0, 'filas': []}
+    try:
+        filas = leer_xlsx(flujo) if formato == 'xlsx' else leer_csv(flujo)
+        vehiculos = validar_filas(filas, fecha_defecto, errores)
+        importados = almacen.agregar_lotes(usuario, iter(lambda: list(islice(vehiculos, tamano_lote)), []))
+    except (zipfile.BadZipFile, expat.ExpatError, csv.Error) as e:
+        raise ValueError(f"No se pudo leer el fichero {formato.upper()}: {e}")
+
+    segundos = time.perf_counter() - inicio
+    log.info("Importados %d vehículos de %s (%d filas rechazadas) en %.1fs",
+             importados, usuario, errores['total'], segundos)
+    return {
+        'importados': importados,
+        'rechazados': errores['total'],
+        'errores': errores['filas'],
+        'segundos': round(segundos, 2),
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+    from almacen_vehiculos import AlmacenVehiculos
+
+    parser = argparse.ArgumentParser(description="Importa vehículos desde un fichero CSV o XLSX")
+    parser.add_argument('fichero', help="Fichero CSV o XLSX con matrícula, kilometraje y fecha")
+    parser.add_argument('--usuario', required=True, help="Usuario al que se asignan los vehículos")
+    parser.add_argument('--formato', choices=FORMATOS, help="Formato (por defecto, según la extensión)")
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Vehículos por transacción")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    load_dotenv()
+    resumen = importar_vehiculos(AlmacenVehiculos.desde_entorno(), args.usuario, args.fichero,
+                                 formato=args.formato, tamano_lote=args.lote)
+    for error in resumen['errores']:
+        print(f"  fila {error['fila']}: {error['motivo']}")
+    if resumen['rechazados'] > len(resumen['errores']):
+        print(f"  ... y {resumen['rechazados'] - len(resumen['errores'])} filas rechazadas más")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Limitador de peticiones a Gemini (cubo de tokens).
+
+Implementado como GCRA: cada petición reserva el siguiente hueco libre y
+espera hasta él, de modo que las peticiones se atienden en orden de llegada
+a la tasa configurada con ráfagas de hasta 'capacidad' peticiones. Un 429 o
+503 de la API pausa el cubo durante el Retry-After (o el backoff calculado),
+y todas las peticiones en cola esperan en lugar de fallar.
+
+CuboTokens limita un proceso. CuboTokensCompartido guarda el estado en un
+fichero SQLite para repartir la misma cuota entre varios workers de gunicorn.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class CuboTokens:
+    """Cubo de tokens en memoria, compartido por los hilos del proceso"""
+
+    def __init__(self, tasa=0.0, capacidad=1):
+        """
+        Inicializa el cubo
+
+        Args:
+            tasa: Peticiones por segundo permitidas (0 = sin límite, solo se
+                  respetan las pausas por errores de cuota)
+            capacidad: Peticiones que pueden salir en ráfaga
+        """
+        self.tasa = tasa
+        self.capacidad = max(1, capacidad)
+        self.intervalo = 1.0 / tasa if tasa > 0 else 0.0
+        self.tolerancia = (self.capacidad - 1) * self.intervalo
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+        self.adquisiciones = 0
+        self.rechazos = 0
+        self.pausas = 0
+        self.segundos_espera = 0.0
+
+    @classmethod
+    def desde_entorno(cls):
+        """
+        Crea el cubo a partir de OCR_GEMINI_RPM, OCR_GEMINI_RAFAGA y
+        OCR_GEMINI_LIMITE_RUTA (si se indica, el cubo se comparte entre workers)
+        """
+        tasa = float(os.getenv('OCR_GEMINI_RPM', '0')) / 60.0
+        capacidad = int(os.getenv('OCR_GEMINI_RAFAGA', '1'))
+        ruta = os.getenv('OCR_GEMINI_LIMITE_RUTA')
+        if ruta:
+            return CuboTokensCompartido(ruta, tasa, capacidad)
+        return cls(tasa, capacidad)
+
+    def _programar(self, tat, ahora, espera_max):
+        """
+        Calcula el hueco de una petición a partir del instante teórico (TAT)
+
+        Returns:
+            tuple: (instante de salida o None si supera espera_max, nuevo TAT)
+        """
+        salida = max(ahora, tat - self.tolerancia)
+        if espera_max is not None and salida - ahora > espera_max:
+            return None, tat
+        return salida, max(tat, salida) + self.intervalo
+
+    def _reservar(self, espera_max):
+        with self._lock:
+            salida, self._tat = self._programar(self._tat, time.time(), espera_max)
+            return salida
+
+    def adquirir(self, espera_max=None):
+        """
+        Espera hasta que la petición pueda enviarse
+
+        Args:
+            espera_max: Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            bool: False si el hueco disponible queda más allá de espera_max
+                  (en ese caso no se consume ningún token)
+        """
+        salida = self._reservar(espera_max)
+        if salida is None:
+            with self._lock:
+                self.rechazos += 1
+            return False
+
+        espera = salida - time.time()
+        if espera > 0:
+            time.sleep(espera)
+        with self._lock:
+            self.adquisiciones += 1
+            self.segundos_espera += max(0.0, espera)
+        return True
+
+    def _aplazar(self, hasta):
+        with self._lock:
+            self._tat = max(self._tat, hasta + self.tolerancia)
+
+    def pausar(self, segundos):
+        """Detiene la salida de peticiones durante 'segundos' (Retry-After o backoff)"""
+        self._aplazar(time.time() + segundos)
+        with self._lock:
+            self.pausas += 1
+
+    def _tat_actual(self):
+        with self._lock:
+            return self._tat
+
+    def espera_estimada(self):
+        """Segundos que esperaría ahora una petición nueva"""
+        return max(0.0, self._tat_actual() - self.tolerancia - time.time())
+
+    def estadisticas(self):
+        """Contadores del limitador"""
+        espera = self.espera_estimada()
+        with self._lock:
+            return {
+                'peticiones_por_minuto': round(self.tasa * 60, 2),
+                'rafaga': self.capacidad,
+                'compartido': isinstance(self, CuboTokensCompartido),
+                'adquisiciones': self.adquisiciones,
+                'rechazos': self.rechazos,
+                'pausas': self.pausas,
+                'espera_media_ms': round(1000 * self.segundos_espera / self.adquisiciones, 1)
+                if self.adquisiciones else 0.0,
+                'espera_actual_ms': round(espera * 1000, 1),
+            }
+
+
+class CuboTokensCompartido(CuboTokens):
+    """Cubo de tokens con el estado en SQLite, compartido entre procesos"""
+
+    def __init__(self, ruta, tasa=0.0, capacidad=1, nombre='gemini'):
+        super().__init__(tasa, capacidad)
+        self.ruta = ruta
+        self.nombre = nombre
+        self._local = threading.local()
+        conn = self._conexion()
+        conn.execute("CREATE TABLE IF NOT EXISTS cubos (nombre TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO cubos (nombre, tat) VALUES (?, 0)", (nombre,))
+        log.info("Limitador de Gemini compartido en %s", ruta)
+
+    def _conexion(self):
+        """Una conexión SQLite por hilo, en modo autocommit"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaccion(self, funcion):
+        """Lee y actualiza el TAT dentro de una transacción exclusiva"""
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tat = conn.execute("SELECT tat FROM cubos WHERE nombre = ?", (self.nombre,)).fetchone()[0]
+            resultado, nuevo = funcion(tat)
+            if nuevo != tat:
+                conn.execute("UPDATE cubos SET tat = ? WHERE nombre = ?", (nuevo, self.nombre))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return resultado
+
+    def _reservar(self, espera_max):
+        return self._transaccion(lambda tat: self._programar(tat, time.time(), espera_max))
+
+    def _aplazar(self, hasta):
+        self._transaccion(lambda tat: (None, max(tat, hasta + self.tolerancia)))
+
+    def _tat_actual(self):
+        return self._conexion().execute(
+            "SELECT tat FROM cubos WHERE nombre = ?", (self.nombre,)
+        ).fetchone()[0]
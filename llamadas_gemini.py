@@ -0,0 +1,290 @@
+"""
+Llamadas a Gemini con plazo máximo, cobertura (hedging) y control de cuota.
+
+Cada petición tiene un plazo total: la llamada HTTP recibe como timeout el
+tiempo que queda, de modo que ningún hilo de gunicorn queda bloqueado más
+allá del plazo. Si la petición tarda más que el p95 reciente, se lanza una
+segunda petición idéntica y se usa la primera que responda; la perdedora se
+cancela si aún no había empezado o se abandona (su timeout HTTP es el mismo
+plazo, así que libera su hilo como muy tarde al vencer éste).
+
+Antes de cada envío se pide turno al limitador (limitador_gemini). Los
+errores de cuota (429) y de servicio no disponible (503) se reintentan con
+backoff exponencial o el Retry-After indicado por la API, pausando el
+limitador para que el resto de peticiones no insista mientras tanto.
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from limitador_gemini import CuboTokens
+from registro import copiar_contexto
+
+log = logging.getLogger(__name__)
+
+# Códigos HTTP que indican saturación temporal y merecen reintento
+CODIGOS_REINTENTABLES = (429, 503)
+
+
+class PlazoAgotado(TimeoutError):
+    """La petición a Gemini no terminó dentro del plazo configurado"""
+
+
+def socket_cooperativo():
+    """
+    Indica si gevent ha parcheado los sockets del proceso (worker gevent de
+    gunicorn): las esperas de red ceden el control a otras peticiones en
+    lugar de bloquear un hilo
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def es_error_cuota(error):
+    """Indica si la excepción es un 429/503 de la API de Gemini"""
+    return getattr(error, 'code', None) in CODIGOS_REINTENTABLES
+
+
+def retraso_sugerido(error):
+    """
+    Segundos de espera que indica la API en un error de cuota
+
+    Se busca, por este orden, la cabecera Retry-After, el detalle RetryInfo
+    y el texto "retry in Ns" del mensaje. Devuelve None si no hay indicación.
+    """
+    respuesta = getattr(error, 'response', None)
+    cabeceras = getattr(respuesta, 'headers', None)
+    if cabeceras is not None and cabeceras.get('Retry-After'):
+        try:
+            return float(cabeceras.get('Retry-After'))
+        except ValueError:
+            pass
+
+    for detalle in getattr(error, 'details', None) or ():
+        if isinstance(detalle, dict) and detalle.get('retryDelay'):
+            try:
+                return float(str(detalle['retryDelay']).rstrip('s'))
+            except ValueError:
+                pass
+        retraso = getattr(detalle, 'retry_delay', None)
+        if retraso is not None and hasattr(retraso, 'seconds'):
+            return retraso.seconds + retraso.nanos / 1e9
+
+    coincidencia = re.search(r'retry in ([\d.]+)\s*s', str(error), re.IGNORECASE)
+    if coincidencia:
+        return float(coincidencia.group(1))
+    return None
+
+
+class LlamadorGemini:
+    """Ejecuta generate_content con plazo y cobertura"""
+
+    def __init__(self, model, plazo=30.0, cobertura=True, retardo_cobertura=None,
+                 retardo_inicial=3.0, muestras_min=10, ventana=200, max_fraccion_cobertura=0.2,
+                 max_hilos=32, limitador=None, reintentos=3, backoff_base=1.0, backoff_max=20.0):
+        """
+        Inicializa el llamador
+
+        Args:
+            model: Modelo de Gemini (genai.GenerativeModel)
+            plazo: Segundos máximos por petición, incluida la cobertura
+            cobertura: Lanzar una segunda petición si la primera se retrasa
+            retardo_cobertura: Segundos antes de cubrir; si es None se usa el
+                               p95 de las latencias recientes
+            retardo_inicial: Retardo de cobertura mientras no hay muestras suficientes
+            muestras_min: Latencias necesarias para usar el p95
+            ventana: Número de latencias recientes consideradas
+            max_fraccion_cobertura: Fracción máxima de peticiones cubiertas, para
+                                    no duplicar la carga si la API va lenta en general
+            max_hilos: Hilos para las peticiones en curso (con gevent son
+                       greenlets y limitan las llamadas simultáneas del proceso)
+            limitador: Cubo de tokens que regula el envío (CuboTokens). Si es
+                       None solo se respetan las pausas por errores de cuota
+            reintentos: Reintentos ante 429/503 dentro del plazo
+            backoff_base: Espera del primer reintento sin Retry-After (segundos)
+            backoff_max: Espera máxima entre reintentos (segundos)
+        """
+        self.model = model
+        self.plazo = plazo
+        self.cobertura = cobertura
+        self.retardo_cobertura = retardo_cobertura
+        self.retardo_inicial = retardo_inicial
+        self.muestras_min = muestras_min
+        self.max_fraccion_cobertura = max_fraccion_cobertura
+        self.limitador = limitador if limitador is not None else CuboTokens()
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._latencias = deque(maxlen=ventana)
+        self._cubiertas = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='gemini')
+
+        self.peticiones = 0
+        self.coberturas = 0
+        self.coberturas_ganadoras = 0
+        self.plazos_agotados = 0
+        self.errores_cuota = 0
+        self.reintentos_hechos = 0
+
+    @classmethod
+    def desde_entorno(cls, model):
+        """Crea el llamador a partir de las variables de entorno OCR_GEMINI_*"""
+        retardo = os.getenv('OCR_GEMINI_COBERTURA_MS')
+        return cls(
+            model,
+            plazo=float(os.getenv('OCR_GEMINI_PLAZO', '30')),
+            cobertura=os.getenv('OCR_GEMINI_COBERTURA', '1') == '1',
+            retardo_cobertura=float(retardo) / 1000.0 if retardo else None,
+            limitador=CuboTokens.desde_entorno(),
+            reintentos=int(os.getenv('OCR_GEMINI_REINTENTOS', '3')),
+            max_hilos=int(os.getenv('OCR_GEMINI_HILOS', '1000' if socket_cooperativo() else '32')),
+        )
+
+    def retardo(self):
+        """Segundos a esperar antes de lanzar la petición de cobertura"""
+        if self.retardo_cobertura is not None:
+            return self.retardo_cobertura
+        with self._lock:
+            if len(self._latencias) < self.muestras_min:
+                return self.retardo_inicial
+            return float(np.percentile(self._latencias, 95))
+
+    def _puede_cubrir(self):
+        # Con cola en el limitador la cobertura solo gastaría cuota
+        if self.limitador.espera_estimada() > 0:
+            return False
+        with self._lock:
+            if not self._cubiertas:
+                return True
+            return sum(self._cubiertas) / len(self._cubiertas) < self.max_fraccion_cobertura
+
+    def _backoff(self, intento):
+        """Espera exponencial con jitter para el reintento n (desde 0)"""
+        return min(self.backoff_max, self.backoff_base * 2 ** intento) * random.uniform(0.5, 1.0)
+
+    def _llamar(self, partes, limite, kwargs):
+        """
+        Una petición a Gemini con el tiempo restante como timeout, esperando
+        turno en el limitador y reintentando los errores de cuota
+        """
+        intento = 0
+        while True:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise PlazoAgotado("Plazo agotado antes de enviar la petición a Gemini")
+            if not self.limitador.adquirir(espera_max=restante):
+                raise PlazoAgotado("Plazo agotado esperando turno en el limitador de Gemini")
+
+            inicio = time.monotonic()
+            try:
+                respuesta = self.model.generate_content(
+                    partes, request_options={'timeout': max(0.1, limite - inicio)}, **kwargs
+                )
+            except Exception as e:
+                if not es_error_cuota(e):
+                    raise
+                with self._lock:
+                    self.errores_cuota += 1
+
+                sugerido = retraso_sugerido(e)
+                espera = sugerido if sugerido is not None else self._backoff(intento)
+                # La cuota es común: se pausa el limitador para todas las peticiones
+                self.limitador.pausar(espera)
+                if intento >= self.reintentos or time.monotonic() + espera >= limite:
+                    raise
+                log.warning("Gemini respondió %s, reintento %d en %.1fs", e.code, intento + 1, espera)
+                intento += 1
+                with self._lock:
+                    self.reintentos_hechos += 1
+                continue
+
+            with self._lock:
+                self._latencias.append(time.monotonic() - inicio)
+            return respuesta
+
+    def generar(self, partes, **kwargs):
+        """
+        Equivalente a model.generate_content con plazo y cobertura
+
+        Raises:
+            PlazoAgotado: si ninguna petición termina dentro del plazo
+            Exception: el error de la última petición si todas fallan
+        """
+        limite = time.monotonic() + self.plazo
+        with self._lock:
+            self.peticiones += 1
+
+        # Un contexto copiado por petición: el mismo no puede ejecutarse en
+        # dos hilos a la vez
+        principal = self._executor.submit(copiar_contexto(self._llamar), partes, limite, kwargs)
+        pendientes = {principal}
+        cubierta = False
+
+        if self.cobertura and self._puede_cubrir():
+            espera = min(self.retardo(), max(0.0, limite - time.monotonic()))
+            hechos, _ = wait(pendientes, timeout=espera)
+            if not hechos and time.monotonic() < limite:
+                log.info("Gemini supera %.2fs, lanzando petición de cobertura", espera)
+                pendientes.add(self._executor.submit(copiar_contexto(self._llamar), partes, limite, kwargs))
+                cubierta = True
+                with self._lock:
+                    self.coberturas += 1
+
+        with self._lock:
+            self._cubiertas.append(1 if cubierta else 0)
+
+        ultimo_error = None
+        try:
+            while pendientes:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                hechos, pendientes = wait(pendientes, timeout=restante, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    try:
+                        respuesta = futuro.result()
+                    except Exception as e:
+                        ultimo_error = e
+                        continue
+                    if futuro is not principal:
+                        with self._lock:
+                            self.coberturas_ganadoras += 1
+                    return respuesta
+        finally:
+            # Cancelar o abandonar la petición perdedora
+            for futuro in pendientes:
+                futuro.cancel()
+
+        if ultimo_error is not None and not pendientes:
+            raise ultimo_error
+
+        with self._lock:
+            self.plazos_agotados += 1
+        raise PlazoAgotado(f"Gemini no respondió en {self.plazo:.1f}s")
+
+    def estadisticas(self):
+        """Contadores de peticiones, coberturas, plazos agotados y cuota"""
+        with self._lock:
+            p95 = float(np.percentile(self._latencias, 95)) if self._latencias else 0.0
+            return {
+                'peticiones': self.peticiones,
+                'coberturas': self.coberturas,
+                'coberturas_ganadoras': self.coberturas_ganadoras,
+                'plazos_agotados': self.plazos_agotados,
+                'errores_cuota': self.errores_cuota,
+                'reintentos': self.reintentos_hechos,
+                'plazo_s': self.plazo,
+                'latencia_p95_ms': round(p95 * 1000, 1),
+                'limitador': self.limitador.estadisticas(),
+            }
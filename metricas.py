@@ -0,0 +1,104 @@
+"""
+Métricas Prometheus de las peticiones HTTP y de cada etapa del OCR.
+
+Cada etapa (lectura de la imagen de la petición, lectura local, control
+de calidad, preprocesado, construcción del prompt, llamada a Gemini y
+limpieza del texto) registra su duración y el tamaño de los datos que
+produce en dos histogramas con las etiquetas etapa y tipo, y cada petición
+HTTP su duración por endpoint. /metrics los expone en el formato de texto
+de Prometheus.
+
+Con gunicorn, gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR antes de
+arrancar los workers: cada proceso escribe sus valores en ficheros de ese
+directorio (memoria mapeada, sin bloqueos entre procesos) y /metrics suma
+los de todos. Sin esa variable (servidor de desarrollo) se exportan las
+métricas del propio proceso.
+"""
+
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram,
+                               generate_latest, multiprocess)
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# De 1 KB a 16 MB en potencias de 4
+BUCKETS_BYTES = tuple(1024 * 4 ** i for i in range(8))
+
+ETAPA_SEGUNDOS = Histogram(
+    'ocr_etapa_segundos', 'Duración de cada etapa del OCR',
+    ['etapa', 'tipo'], buckets=BUCKETS_SEGUNDOS
+)
+ETAPA_BYTES = Histogram(
+    'ocr_etapa_bytes', 'Tamaño de los datos que produce cada etapa del OCR',
+    ['etapa', 'tipo'], buckets=BUCKETS_BYTES
+)
+PETICION_SEGUNDOS = Histogram(
+    'http_peticion_segundos', 'Duración de las peticiones HTTP hasta la respuesta',
+    ['endpoint', 'metodo', 'estado'], buckets=BUCKETS_SEGUNDOS
+)
+
+
+# Series ya etiquetadas, para no pasar por labels() (bloqueo y validación) en cada medida
+_series_segundos = {}
+_series_bytes = {}
+
+
+def _serie(series, histograma, etiquetas):
+    serie = series.get(etiquetas)
+    if serie is None:
+        serie = series.setdefault(etiquetas, histograma.labels(*etiquetas))
+    return serie
+
+
+class MedidaEtapa:
+    """Duración (y opcionalmente tamaño) de una etapa del OCR, como gestor de contexto"""
+
+    __slots__ = ('nombre', 'tipo', 'bytes', '_inicio')
+
+    def __init__(self, nombre, tipo):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.bytes = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        etiquetas = (self.nombre, self.tipo)
+        _serie(_series_segundos, ETAPA_SEGUNDOS, etiquetas).observe(time.perf_counter() - self._inicio)
+        if self.bytes is not None:
+            _serie(_series_bytes, ETAPA_BYTES, etiquetas).observe(self.bytes)
+
+
+def etapa(nombre, tipo):
+    """
+    Mide la duración de un bloque como una etapa del OCR; si se asigna
+    'bytes' dentro del bloque se registra también el tamaño:
+
+        with etapa('preprocesado', 'matricula') as medida:
+            blob = preparar(...)
+            medida.bytes = len(blob['data'])
+    """
+    return MedidaEtapa(nombre, tipo)
+
+
+def observar_peticion(endpoint, metodo, codigo, segundos):
+    """Registra la duración de una petición HTTP (estado agrupado: 2xx, 4xx...)"""
+    PETICION_SEGUNDOS.labels(endpoint or 'desconocido', metodo, f'{codigo // 100}xx').observe(segundos)
+
+
+def exportar():
+    """
+    Métricas en el formato de texto de Prometheus
+
+    Returns:
+        tuple: (cuerpo en bytes, Content-Type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
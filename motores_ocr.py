@@ -0,0 +1,326 @@
+"""
+Motores OCR intercambiables y enrutador entre ellos.
+
+Cada motor expone extraer(imagen, tipo_ocr) y devuelve el mismo diccionario
+que OCRProcessor._extraer_texto_gemini: {'texto', 'confianza', 'metodo'} y
+'error' cuando falla. El enrutador elige el motor de cada petición según la
+latencia, la tasa de errores y la confianza recientes de cada uno, y lanza
+el siguiente motor como respaldo si el elegido falla, devuelve una lectura
+poco fiable o tarda más de lo habitual.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from ocr_imagen import ImagenOCR
+from registro import copiar_contexto
+
+log = logging.getLogger(__name__)
+
+
+class MotorOCR:
+    """Interfaz común de los motores OCR"""
+
+    nombre = 'base'
+
+    def extraer(self, imagen, tipo_ocr):
+        """
+        Extrae el texto de una imagen
+
+        Args:
+            imagen: ImagenOCR, ruta a la imagen o array numpy (BGR)
+            tipo_ocr: Tipo de OCR ('matricula' o 'cuentakilometros')
+
+        Returns:
+            dict: {'texto', 'confianza', 'metodo'} y 'error' si falla
+        """
+        raise NotImplementedError
+
+
+class MotorGemini(MotorOCR):
+    """Motor remoto Gemini Vision (usa el modelo del OCRProcessor)"""
+
+    nombre = 'gemini'
+
+    def __init__(self, procesador):
+        self.procesador = procesador
+
+    def extraer(self, imagen, tipo_ocr):
+        return self.procesador._extraer_texto_gemini(imagen, tipo_ocr)
+
+
+class MotorTesseract(MotorOCR):
+    """Motor local Tesseract (requiere pytesseract y el binario tesseract)"""
+
+    nombre = 'tesseract'
+
+    LISTAS_BLANCAS = {
+        'matricula': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+        'cuentakilometros': '0123456789',
+    }
+
+    def __init__(self, procesador):
+        try:
+            import pytesseract
+        except ImportError:
+            raise ValueError("pytesseract no está instalado (pip install pytesseract)")
+
+        self.pytesseract = pytesseract
+        self.procesador = procesador
+        # Falla aquí si el binario no está disponible
+        pytesseract.get_tesseract_version()
+
+    def extraer(self, imagen, tipo_ocr):
+        try:
+            if isinstance(imagen, ImagenOCR):
+                imagen = imagen.bgr
+            elif isinstance(imagen, str):
+                imagen = cv2.imread(imagen, cv2.IMREAD_COLOR)
+                if imagen is None:
+                    raise ValueError("No se pudo leer la imagen")
+
+            imagen = self.procesador.preprocesador.recortar(imagen, tipo_ocr)
+            gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+            _, binaria = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+            config = f"--psm 7 -c tessedit_char_whitelist={self.LISTAS_BLANCAS.get(tipo_ocr, '')}"
+            datos = self.pytesseract.image_to_data(
+                binaria, config=config, output_type=self.pytesseract.Output.DICT
+            )
+            palabras = [t for t in datos['text'] if t.strip()]
+            confianzas = [float(c) for c, t in zip(datos['conf'], datos['text']) if t.strip() and float(c) >= 0]
+            confianza = (sum(confianzas) / len(confianzas) / 100.0) if confianzas else 0.0
+
+            return self.procesador._resultado_desde_texto(''.join(palabras), tipo_ocr, self.nombre, confianza)
+
+        except Exception as e:
+            log.error("Error en motor tesseract: %s", e)
+            return {'texto': '', 'confianza': 0.0, 'metodo': self.nombre, 'error': str(e)}
+
+
+class MotorSimulado(MotorOCR):
+    """
+    Motor local determinista para pruebas.
+
+    Devuelve siempre la misma lectura por tipo de OCR (configurable con
+    OCR_SIMULADO_MATRICULA / OCR_SIMULADO_CUENTAKILOMETROS) tras una
+    latencia fija opcional (OCR_SIMULADO_LATENCIA_MS).
+    """
+
+    nombre = 'simulado'
+
+    def __init__(self, procesador, respuestas=None, latencia=None, confianza=0.9):
+        self.procesador = procesador
+        self.respuestas = respuestas or {
+            'matricula': os.getenv('OCR_SIMULADO_MATRICULA', '1234ABC'),
+            'cuentakilometros': os.getenv('OCR_SIMULADO_CUENTAKILOMETROS', '123456'),
+        }
+        if latencia is None:
+            latencia = float(os.getenv('OCR_SIMULADO_LATENCIA_MS', '0')) / 1000.0
+        self.latencia = latencia
+        self.confianza = confianza
+
+    def extraer(self, imagen, tipo_ocr):
+        if self.latencia:
+            time.sleep(self.latencia)
+        texto = self.respuestas.get(tipo_ocr, 'NO_DETECTADO')
+        return self.procesador._resultado_desde_texto(texto, tipo_ocr, self.nombre, self.confianza)
+
+
+MOTORES_DISPONIBLES = {
+    'gemini': MotorGemini,
+    'tesseract': MotorTesseract,
+    'simulado': MotorSimulado,
+}
+
+
+class EstadisticasMotor:
+    """Ventana deslizante de latencia, errores y confianza de un motor"""
+
+    def __init__(self, ventana=50):
+        self.muestras = deque(maxlen=ventana)
+        self.llamadas = 0
+        self.errores = 0
+
+    def registrar(self, latencia, valido, confianza):
+        self.muestras.append((latencia, valido, confianza))
+        self.llamadas += 1
+        if not valido:
+            self.errores += 1
+
+    def latencia_media(self):
+        return sum(m[0] for m in self.muestras) / len(self.muestras) if self.muestras else 0.0
+
+    def latencia_percentil(self, percentil):
+        if not self.muestras:
+            return None
+        return float(np.percentile([m[0] for m in self.muestras], percentil))
+
+    def tasa_error(self):
+        return sum(1 for m in self.muestras if not m[1]) / len(self.muestras) if self.muestras else 0.0
+
+    def confianza_media(self):
+        validas = [m[2] for m in self.muestras if m[1]]
+        return sum(validas) / len(validas) if validas else 0.0
+
+
+class EnrutadorOCR:
+    """Elige el motor de cada petición y cubre sus fallos con los demás"""
+
+    def __init__(self, motores, confianza_min=0.5, cobertura=None, ventana=50, muestras_min=5,
+                 exploracion=20):
+        """
+        Inicializa el enrutador
+
+        Args:
+            motores: Lista de MotorOCR en orden de preferencia inicial
+            confianza_min: Confianza mínima para aceptar una lectura sin respaldo
+            cobertura: Segundos de espera antes de lanzar el motor de respaldo.
+                       Si es None se usa el p95 de latencia del motor elegido
+            ventana: Número de peticiones recientes consideradas por motor
+            muestras_min: Peticiones necesarias antes de reordenar los motores
+            exploracion: Cada cuántas peticiones se prueba primero el segundo
+                         motor, para que sus estadísticas no se queden obsoletas
+        """
+        self.motores = list(motores)
+        self.confianza_min = confianza_min
+        self.cobertura = cobertura
+        self.muestras_min = muestras_min
+        self.exploracion = exploracion
+        self._peticiones = 0
+        self.estadisticas = {m.nombre: EstadisticasMotor(ventana) for m in self.motores}
+        self._lock = threading.Lock()
+        self._executor = None
+        if len(self.motores) > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=16 * len(self.motores), thread_name_prefix='ocr-motor'
+            )
+
+    def _coste(self, motor):
+        """Coste estimado de usar un motor: latencia penalizada por errores y baja confianza"""
+        est = self.estadisticas[motor.nombre]
+        if len(est.muestras) < self.muestras_min:
+            return None
+        return est.latencia_media() * (1 + 5 * est.tasa_error()) / max(est.confianza_media(), 0.05)
+
+    def ordenar(self):
+        """Devuelve los motores ordenados del más al menos conveniente"""
+        with self._lock:
+            costes = [(self._coste(m), i, m) for i, m in enumerate(self.motores)]
+        # Los motores sin datos suficientes conservan su prioridad configurada
+        # y van primero, para que acumulen muestras
+        sin_datos = [m for c, _, m in costes if c is None]
+        con_datos = [m for c, _, m in sorted((c for c in costes if c[0] is not None), key=lambda x: (x[0], x[1]))]
+        return sin_datos + con_datos
+
+    def _orden_peticion(self):
+        """Orden para una petición concreta, con exploración periódica"""
+        orden = self.ordenar()
+        with self._lock:
+            self._peticiones += 1
+            explorar = self.exploracion and self._peticiones % self.exploracion == 0
+        if explorar and len(orden) > 1:
+            orden[0], orden[1] = orden[1], orden[0]
+        return orden
+
+    def es_valido(self, resultado):
+        """Lectura con texto y al menos la confianza mínima"""
+        return bool(resultado.get('texto')) and resultado.get('confianza', 0.0) >= self.confianza_min
+
+    def _ejecutar(self, motor, imagen, tipo_ocr):
+        """Ejecuta un motor registrando su latencia y resultado"""
+        inicio = time.perf_counter()
+        try:
+            resultado = motor.extraer(imagen, tipo_ocr)
+        except Exception as e:
+            resultado = {'texto': '', 'confianza': 0.0, 'metodo': motor.nombre, 'error': str(e)}
+        latencia = time.perf_counter() - inicio
+        with self._lock:
+            self.estadisticas[motor.nombre].registrar(
+                latencia, bool(resultado.get('texto')), resultado.get('confianza', 0.0)
+            )
+        return resultado
+
+    def _espera_cobertura(self, motor):
+        """Segundos a esperar al motor antes de lanzar el de respaldo"""
+        if self.cobertura is not None:
+            return self.cobertura
+        with self._lock:
+            est = self.estadisticas[motor.nombre]
+            p95 = est.latencia_percentil(95) if len(est.muestras) >= self.muestras_min else None
+        return max(0.5, p95) if p95 is not None else 5.0
+
+    def extraer(self, imagen, tipo_ocr):
+        """
+        Extrae el texto con el motor más conveniente y respaldo en los demás
+
+        Returns:
+            dict: Resultado del primer motor con lectura válida, o el mejor
+                  resultado obtenido si ninguno supera la confianza mínima
+        """
+        orden = self._orden_peticion()
+        if self._executor is None:
+            return self._ejecutar(orden[0], imagen, tipo_ocr)
+
+        pendientes = {}
+        resultados = []
+        siguiente = 0
+
+        def lanzar():
+            nonlocal siguiente
+            motor = orden[siguiente]
+            siguiente += 1
+            futuro = self._executor.submit(copiar_contexto(self._ejecutar), motor, imagen, tipo_ocr)
+            pendientes[futuro] = motor
+
+        lanzar()
+        while pendientes:
+            # El motor lanzado en último lugar marca el plazo de cobertura
+            ultimo = list(pendientes.values())[-1]
+            espera = self._espera_cobertura(ultimo) if siguiente < len(orden) else None
+            hechos, _ = wait(list(pendientes), timeout=espera, return_when=FIRST_COMPLETED)
+
+            if not hechos:
+                # El motor tarda más de lo habitual: lanzar el de respaldo en paralelo
+                log.info("%s supera el plazo, lanzando respaldo %s", ultimo.nombre, orden[siguiente].nombre)
+                lanzar()
+                continue
+
+            for futuro in hechos:
+                pendientes.pop(futuro)
+                resultado = futuro.result()
+                if self.es_valido(resultado):
+                    return resultado
+                resultados.append(resultado)
+
+            # Lectura fallida o poco fiable: pasar al siguiente motor
+            if not pendientes and siguiente < len(orden):
+                lanzar()
+
+        # Ningún motor superó la confianza mínima: devolver la mejor lectura
+        con_texto = [r for r in resultados if r.get('texto')]
+        if con_texto:
+            return max(con_texto, key=lambda r: r.get('confianza', 0.0))
+        return resultados[-1]
+
+    def resumen(self):
+        """Estadísticas por motor para diagnóstico"""
+        with self._lock:
+            return {
+                nombre: {
+                    'llamadas': est.llamadas,
+                    'errores': est.errores,
+                    'latencia_media_ms': round(est.latencia_media() * 1000, 1),
+                    'latencia_p95_ms': round((est.latencia_percentil(95) or 0.0) * 1000, 1),
+                    'tasa_error': round(est.tasa_error(), 4),
+                    'confianza_media': round(est.confianza_media(), 4),
+                }
+                for nombre, est in self.estadisticas.items()
+            }
@@ -0,0 +1,232 @@
+"""
+Caché de resultados OCR direccionada por contenido.
+
+La clave se calcula a partir del hash de la imagen tal como llegó (los
+bytes originales del fichero, ImagenOCR.contenido(), sin decodificarla; el
+array solo si no hay bytes), el tipo de OCR y la versión del prompt. Tiene
+dos niveles:
+  - Memoria: LRU en proceso.
+  - Disco (opcional): SQLite compartido entre workers de gunicorn,
+    con caducidad (TTL) y expulsión por número de entradas. La purga de
+    las caducadas y las sobrantes se hace en la primera escritura de cada
+    proceso y después cada purga_cada escrituras, no en todas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def calcular_clave(imagen, tipo_ocr, version_prompt):
+    """
+    Calcula la clave de caché de una imagen
+
+    Args:
+        imagen: Bytes originales del fichero (ImagenOCR.contenido()),
+                ruta a la imagen o array numpy
+        tipo_ocr: Tipo de OCR ('matricula' o 'cuentakilometros')
+        version_prompt: Versión del prompt usado con el modelo
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    h = hashlib.sha256()
+    h.update(f"{tipo_ocr}|{version_prompt}|".encode('utf-8'))
+
+    if isinstance(imagen, np.ndarray):
+        h.update(str(imagen.shape).encode('utf-8'))
+        h.update(str(imagen.dtype).encode('utf-8'))
+        h.update(np.ascontiguousarray(imagen).data)
+    elif isinstance(imagen, (bytes, bytearray, memoryview)):
+        h.update(imagen)
+    elif isinstance(imagen, str):
+        with open(imagen, 'rb') as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloque)
+    else:
+        raise ValueError("imagen debe ser una ruta de archivo, bytes o array numpy")
+
+    return h.hexdigest()
+
+
+class CacheOCR:
+    """Caché de dos niveles (memoria LRU + SQLite opcional) para resultados OCR"""
+
+    def __init__(self, max_memoria=256, ruta_disco=None, ttl=7 * 24 * 3600,
+                 max_disco=10000, purga_cada=100):
+        """
+        Inicializa la caché
+
+        Args:
+            max_memoria: Número máximo de entradas en memoria (0 desactiva el nivel)
+            ruta_disco: Ruta del fichero SQLite (None desactiva el nivel de disco)
+            ttl: Segundos de validez de una entrada en disco
+            max_disco: Número máximo de entradas en disco (entre dos purgas
+                       se puede superar en hasta purga_cada por proceso)
+            purga_cada: Escrituras en disco entre dos purgas de entradas
+                        caducadas y sobrantes
+        """
+        self.max_memoria = max_memoria
+        self.ruta_disco = ruta_disco
+        self.ttl = ttl
+        self.max_disco = max_disco
+        self.purga_cada = max(1, purga_cada)
+        self._escrituras = 0
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.segundos_ahorrados = 0.0
+
+        if self.ruta_disco:
+            self._inicializar_disco()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea la caché a partir de las variables de entorno OCR_CACHE_*"""
+        return cls(
+            max_memoria=int(os.getenv('OCR_CACHE_MEMORIA', '256')),
+            ruta_disco=os.getenv('OCR_CACHE_RUTA') or None,
+            ttl=int(os.getenv('OCR_CACHE_TTL', str(7 * 24 * 3600))),
+            max_disco=int(os.getenv('OCR_CACHE_MAX_DISCO', '10000')),
+        )
+
+    def _conexion(self):
+        """Devuelve una conexión SQLite propia del hilo actual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta_disco, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _inicializar_disco(self):
+        """Crea la tabla de caché si no existe"""
+        conn = self._conexion()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_ocr (
+                    clave TEXT PRIMARY KEY,
+                    resultado TEXT NOT NULL,
+                    latencia REAL NOT NULL DEFAULT 0,
+                    creado REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_ocr_creado ON cache_ocr (creado)")
+
+    def _guardar_memoria(self, clave, entrada):
+        """Inserta una entrada en el LRU de memoria (requiere el lock)"""
+        if self.max_memoria <= 0:
+            return
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, clave):
+        """
+        Busca un resultado en la caché
+
+        Args:
+            clave: Clave calculada con calcular_clave
+
+        Returns:
+            dict o None: Copia del resultado almacenado
+        """
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                self.segundos_ahorrados += entrada[1]
+                return dict(entrada[0])
+
+        if self.ruta_disco:
+            try:
+                fila = self._conexion().execute(
+                    "SELECT resultado, latencia FROM cache_ocr WHERE clave = ? AND creado >= ?",
+                    (clave, time.time() - self.ttl)
+                ).fetchone()
+            except sqlite3.Error as e:
+                log.error("Error leyendo caché OCR en disco: %s", e)
+                fila = None
+
+            if fila is not None:
+                resultado = json.loads(fila[0])
+                with self._lock:
+                    self._guardar_memoria(clave, (resultado, fila[1]))
+                    self.hits_disco += 1
+                    self.segundos_ahorrados += fila[1]
+                return dict(resultado)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def guardar(self, clave, resultado, latencia=0.0):
+        """
+        Almacena un resultado en la caché
+
+        Args:
+            clave: Clave calculada con calcular_clave
+            resultado: Diccionario devuelto por el motor OCR
+            latencia: Segundos que tardó la llamada original
+        """
+        with self._lock:
+            self._guardar_memoria(clave, (dict(resultado), latencia))
+
+        if not self.ruta_disco:
+            return
+
+        # La purga recorre la tabla: solo en algunas escrituras
+        with self._lock:
+            purgar = self._escrituras % self.purga_cada == 0
+            self._escrituras += 1
+
+        try:
+            conn = self._conexion()
+            ahora = time.time()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_ocr (clave, resultado, latencia, creado) VALUES (?, ?, ?, ?)",
+                    (clave, json.dumps(resultado), latencia, ahora)
+                )
+                if purgar:
+                    conn.execute("DELETE FROM cache_ocr WHERE creado < ?", (ahora - self.ttl,))
+                    conn.execute("""
+                        DELETE FROM cache_ocr WHERE clave IN (
+                            SELECT clave FROM cache_ocr ORDER BY creado DESC LIMIT -1 OFFSET ?
+                        )
+                    """, (self.max_disco,))
+        except sqlite3.Error as e:
+            log.error("Error escribiendo caché OCR en disco: %s", e)
+
+    def estadisticas(self):
+        """Devuelve los contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            hits = self.hits_memoria + self.hits_disco
+            total = hits + self.misses
+            return {
+                'hits_memoria': self.hits_memoria,
+                'hits_disco': self.hits_disco,
+                'misses': self.misses,
+                'ratio_aciertos': round(hits / total, 4) if total else 0.0,
+                'llamadas_api_evitadas': hits,
+                'segundos_ahorrados': round(self.segundos_ahorrados, 3),
+                'entradas_memoria': len(self._memoria),
+                'disco_activo': bool(self.ruta_disco),
+            }
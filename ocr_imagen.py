@@ -0,0 +1,169 @@
+"""
+Imagen de una petición OCR con decodificación perezosa.
+
+Conserva los bytes codificados tal y como llegan (JPEG del navegador,
+fichero del lote...) y solo decodifica la representación que pide cada
+etapa, una vez por petición:
+  - datos: bytes originales (clave de caché y reenvío a Gemini sin tocar)
+  - gris: escala de grises, decodificada directamente por OpenCV sin pasar
+    por BGR (lectura local del cuentakilómetros)
+  - reducida_gris: escala de grises reducida con el escalado DCT de libjpeg
+    (control de calidad)
+  - bgr: array BGR completo (recorte de la matrícula, Tesseract)
+  - bgr_reducida: BGR decodificada ya a 1/2, 1/4 u 1/8 cuando solo hay que
+    reducir la imagen antes de enviarla
+  - tamano: ancho y alto leídos de la cabecera, sin decodificar
+
+Así un JPEG que no hay que recortar ni reducir se envía al modelo sin
+decodificarlo, y ninguna etapa convierte BGR↔RGB ni pasa por PIL.
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Formatos que se pueden enviar al modelo sin recodificar
+MIME_REENVIABLES = ('image/jpeg', 'image/png', 'image/webp')
+
+_REDUCIDAS = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+              8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+_REDUCIDAS_COLOR = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                    8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def detectar_mime(datos):
+    """Tipo MIME según la firma del fichero (None si no es un formato conocido)"""
+    cabecera = bytes(datos[:12])
+    if cabecera.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if cabecera.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'image/webp'
+    if cabecera[:2] == b'BM':
+        return 'image/bmp'
+    return None
+
+
+class ImagenOCR:
+    """Imagen codificada y/o decodificada; cada representación se obtiene una vez"""
+
+    def __init__(self, datos=None, mime_type=None, bgr=None):
+        """
+        Args:
+            datos: Bytes de la imagen codificada (o None si solo hay array)
+            mime_type: Tipo MIME de los datos (se detecta si es None)
+            bgr: Array BGR ya decodificado (o None)
+        """
+        if datos is None and bgr is None:
+            raise ValueError("Se requieren los datos codificados o el array de la imagen")
+        self.datos = datos
+        self.mime_type = mime_type or (detectar_mime(datos) if datos is not None else None)
+        self._bgr = bgr
+        self._gris = None
+        self._tamano = None
+
+    @classmethod
+    def desde_bytes(cls, datos, mime_type=None):
+        """Crea la imagen a partir del fichero codificado, sin decodificarlo"""
+        return cls(datos=datos, mime_type=mime_type)
+
+    @classmethod
+    def desde_ruta(cls, ruta):
+        """Crea la imagen a partir de un fichero en disco"""
+        with open(ruta, 'rb') as f:
+            return cls(datos=f.read())
+
+    @property
+    def bgr(self):
+        """Array BGR de la imagen completa"""
+        if self._bgr is None:
+            self._bgr = self._decodificar(cv2.IMREAD_COLOR)
+        return self._bgr
+
+    @property
+    def gris(self):
+        """Imagen en escala de grises (sin decodificar en color si no hace falta)"""
+        if self._gris is None:
+            if self._bgr is not None:
+                self._gris = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2GRAY)
+            else:
+                self._gris = self._decodificar(cv2.IMREAD_GRAYSCALE)
+        return self._gris
+
+    def reducida_gris(self, factor=8):
+        """
+        Escala de grises reducida por factor (2, 4 u 8); con JPEG la
+        reducción la hace el propio decodificador y no llega a existir la
+        imagen completa en memoria. No se guarda.
+        """
+        if self._gris is None and self._bgr is None:
+            return self._decodificar(_REDUCIDAS[factor])
+        gris = self.gris
+        alto, ancho = gris.shape[:2]
+        return cv2.resize(gris, (max(1, ancho // factor), max(1, alto // factor)),
+                          interpolation=cv2.INTER_AREA)
+
+    def bgr_reducida(self, lado_min):
+        """
+        BGR con el lado mayor de al menos lado_min píxeles. Si el JPEG es el
+        doble de grande o más se decodifica directamente a 1/2, 1/4 u 1/8
+        (escalado DCT de libjpeg) en lugar de decodificarlo entero para
+        reducirlo después. No se guarda.
+        """
+        if self._bgr is not None or not lado_min or self.mime_type != 'image/jpeg':
+            return self.bgr
+        lado = max(self.tamano)
+        for factor in (8, 4, 2):
+            if lado / factor >= lado_min:
+                return self._decodificar(_REDUCIDAS_COLOR[factor])
+        return self.bgr
+
+    @property
+    def tamano(self):
+        """(ancho, alto) en píxeles; con bytes se lee solo la cabecera"""
+        if self._tamano is None:
+            if self._bgr is not None:
+                self._tamano = (self._bgr.shape[1], self._bgr.shape[0])
+            else:
+                try:
+                    with Image.open(io.BytesIO(self.datos)) as imagen:
+                        self._tamano = imagen.size
+                except Exception:
+                    raise ValueError("No se reconoce el formato de la imagen")
+        return self._tamano
+
+    @property
+    def reenviable(self):
+        """Si los bytes originales se pueden enviar al modelo tal cual"""
+        return self.datos is not None and self.mime_type in MIME_REENVIABLES
+
+    def contenido(self):
+        """Bytes originales o, si no los hay, el array (para la clave de caché)"""
+        return self.datos if self.datos is not None else self._bgr
+
+    def _decodificar(self, flags):
+        imagen = cv2.imdecode(np.frombuffer(self.datos, np.uint8), flags)
+        if imagen is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        return imagen
+
+
+def como_imagen(imagen):
+    """
+    Convierte la entrada de OCRProcessor en ImagenOCR
+
+    Args:
+        imagen: ImagenOCR, ruta a la imagen, bytes codificados o array numpy (BGR)
+    """
+    if isinstance(imagen, ImagenOCR):
+        return imagen
+    if isinstance(imagen, np.ndarray):
+        return ImagenOCR(bgr=imagen)
+    if isinstance(imagen, (bytes, bytearray, memoryview)):
+        return ImagenOCR.desde_bytes(imagen)
+    if isinstance(imagen, str):
+        return ImagenOCR.desde_ruta(imagen)
+    raise ValueError("imagen debe ser una ruta de archivo, bytes, array numpy o ImagenOCR")
@@ -1,136 +1,273 @@
-import google.generativeai as genai
 import os
-from PIL import Image
-import cv2
+import json
+import logging
+import time
 import numpy as np
-import re
 from dotenv import load_dotenv
+from calidad_imagen import ControlCalidad
+from ocr_cache import CacheOCR, calcular_clave
+from ocr_imagen import ImagenOCR, como_imagen
+from preprocesado import Preprocesador
+from detector_cuentakilometros import leer_cuentakilometros
+from motores_ocr import MOTORES_DISPONIBLES, EnrutadorOCR
+from llamadas_gemini import LlamadorGemini, PlazoAgotado, es_error_cuota, socket_cooperativo
+from validacion import limpiar_cuentakilometros, limpiar_matricula
+from metricas import etapa
 
 # Cargar variables de entorno
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+# Prompts por tipo de OCR. Incrementar PROMPT_VERSION al modificarlos
+# invalida automáticamente las entradas de la caché de resultados.
+PROMPT_VERSION = 1
+
+PROMPTS = {
+    'matricula': """Analiza esta imagen de una matrícula de vehículo europea.
+                Extrae ÚNICAMENTE los caracteres de la matrícula (letras y números).
+                Responde solo con los caracteres encontrados, sin espacios ni guiones.
+                Si no detectas una matrícula clara, responde 'NO_DETECTADO'.""",
+    'cuentakilometros': """Analiza esta imagen del cuentakilómetros de un vehículo.
+                Extrae ÚNICAMENTE los números del odómetro principal (los kilómetros totales).
+                Ignora cualquier otro número (velocidad, rpm, combustible, etc.).
+                Responde solo con los dígitos encontrados, sin espacios, puntos ni comas.
+                Si no detectas números claros del odómetro, responde 'NO_DETECTADO'.""",
+}
+
+# Valor por defecto de rechazo_calidad en procesar_*: la imagen aún no ha
+# pasado el control de calidad
+CALIDAD_PENDIENTE = object()
+
+PROMPT_COMBINADO = """Recibes dos imágenes de un mismo vehículo.
+                La PRIMERA es su matrícula europea y la SEGUNDA su cuentakilómetros.
+                De la matrícula extrae ÚNICAMENTE sus caracteres (letras y números), sin espacios ni guiones.
+                Del cuentakilómetros extrae ÚNICAMENTE los dígitos del odómetro principal (kilómetros totales),
+                ignorando velocidad, rpm, combustible, etc., sin espacios, puntos ni comas.
+                Responde solo con un objeto JSON con este formato:
+                {"matricula": "1234ABC", "kilometros": "123456"}
+                Usa "NO_DETECTADO" en el campo que no puedas leer con claridad."""
+
 # Configuración de Gemini
 def get_gemini_model():
     """Obtiene el modelo de Gemini configurado"""
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         error_msg = "No se encontró GEMINI_API_KEY en las variables de entorno"
-        print(f"ERROR: {error_msg}")
-        print(f"Variables de entorno disponibles: {list(os.environ.keys())}")
+        log.error(error_msg)
         raise ValueError(error_msg)
     
-    print(f"INFO: Configurando Gemini con API Key: {api_key[:10]}...")
+    log.info("Configurando Gemini")
     try:
-        genai.configure(api_key=api_key)
+        # Importación diferida: el cliente tarda alrededor de un segundo en
+        # importarse y los motores locales no lo necesitan
+        import google.generativeai as genai
+        
+        endpoint = os.getenv('GEMINI_API_ENDPOINT')
+        if endpoint:
+            # Endpoint alternativo (p. ej. el servidor simulado de benchmarks/)
+            log.info("Usando endpoint de Gemini: %s", endpoint)
+            genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+        elif socket_cooperativo():
+            # gevent no puede ceder el control durante las llamadas gRPC; por
+            # REST las esperas de red pasan por los sockets parcheados
+            log.info("Worker gevent detectado, usando Gemini por REST")
+            genai.configure(api_key=api_key, transport='rest')
+        else:
+            genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-2.5-flash')
-        print("INFO: Modelo Gemini configurado correctamente")
+        log.info("Modelo Gemini configurado correctamente")
         return model
     except Exception as e:
-        print(f"ERROR al configurar Gemini: {str(e)}")
+        log.error("Error al configurar Gemini: %s", e)
         raise
 
 class OCRProcessor:
-    def __init__(self, motor='gemini'):
+    def __init__(self, motor='gemini', cache=None, preprocesador=None,
+                 umbral_lectura_local=None, model=None, llamador=None, calidad=None):
         """
-        Inicializa el procesador OCR con Gemini
+        Inicializa el procesador OCR
         
         Args:
-            motor: Motor OCR a usar (solo 'gemini' soportado)
+            motor: Motor OCR a usar ('gemini', 'tesseract', 'simulado') o lista
+                   separada por comas en orden de preferencia; con varios
+                   motores se enruta cada petición según su rendimiento
+            cache: Caché de resultados (CacheOCR). Si es None se crea
+                   a partir de las variables de entorno OCR_CACHE_*
+            preprocesador: Etapa de redimensionado/recorte/recodificación
+                           (Preprocesador). Si es None se crea a partir de
+                           OCR_PREPROCESADO_* y OCR_ROI_*
+            umbral_lectura_local: Confianza mínima de la lectura local de
+                                  displays de siete segmentos para no llamar
+                                  a Gemini. Si es None se toma de
+                                  OCR_LECTURA_LOCAL / OCR_LECTURA_LOCAL_UMBRAL
+            model: Modelo de Gemini ya configurado (si es None se crea con
+                   get_gemini_model cuando se usa el motor 'gemini')
+            llamador: Envoltorio de las llamadas a Gemini con plazo y cobertura
+                      (LlamadorGemini). Si es None se crea a partir de OCR_GEMINI_*
+            calidad: Control de calidad de las imágenes antes del motor OCR
+                     (ControlCalidad). Si es None se crea a partir de OCR_CALIDAD_*
         """
         self.motor = motor
-        self.model = None
+        self.model = model
+        self.cache = cache if cache is not None else CacheOCR.desde_entorno()
+        self.preprocesador = preprocesador if preprocesador is not None else Preprocesador.desde_entorno()
+        self.calidad = calidad if calidad is not None else ControlCalidad.desde_entorno()
+        if umbral_lectura_local is None and os.getenv('OCR_LECTURA_LOCAL', '1') == '1':
+            umbral_lectura_local = float(os.getenv('OCR_LECTURA_LOCAL_UMBRAL', '0.8'))
+        self.umbral_lectura_local = umbral_lectura_local
+        
+        log.info("Inicializando OCRProcessor con motor: %s", motor)
+        nombres = [n.strip() for n in motor.split(',') if n.strip()]
+        motores = []
+        for nombre in nombres:
+            if nombre not in MOTORES_DISPONIBLES:
+                raise ValueError(f"Motor OCR desconocido: {nombre}")
+            try:
+                if nombre == 'gemini' and self.model is None:
+                    self.model = get_gemini_model()
+                motores.append(MOTORES_DISPONIBLES[nombre](self))
+            except Exception as e:
+                error_msg = f"No se pudo inicializar {nombre}: {e}"
+                log.error(error_msg)
+                # Con un único motor el error es fatal; con varios se descarta ese motor
+                if len(nombres) == 1:
+                    raise ValueError(error_msg)
+        
+        if not motores:
+            raise ValueError(f"No se pudo inicializar ningún motor OCR de: {motor}")
         
-        print(f"INFO: Inicializando OCRProcessor con motor: {motor}")
-        if motor == 'gemini':
+        if llamador is None and self.model is not None:
+            llamador = LlamadorGemini.desde_entorno(self.model)
+        self.llamador = llamador
+        
+        self.enrutador = EnrutadorOCR(
+            motores,
+            confianza_min=float(os.getenv('OCR_CONFIANZA_MIN', '0.5')),
+            cobertura=float(os.environ['OCR_COBERTURA_MS']) / 1000 if os.getenv('OCR_COBERTURA_MS') else None,
+        )
+        log.info("OCRProcessor inicializado correctamente con: %s", [m.nombre for m in motores])
+    
+    def precalentar(self):
+        """
+        Pasa una imagen sintética por las etapas locales (OpenCV, codificación
+        y decodificación JPEG, control de calidad, lectura local) y abre el
+        cliente y la conexión de Gemini con un recuento de tokens, que no
+        consume cuota de generación. Así la primera lectura real no paga la
+        inicialización. No usa la caché ni las métricas; un fallo de red solo
+        se registra.
+        """
+        inicio = time.perf_counter()
+        # Degradado con bloques: el preprocesado y el lector local tienen algo que analizar
+        sintetica = np.tile(np.linspace(0, 255, 2000, dtype=np.uint8), (1500, 1))
+        sintetica[500:1000, 400:1600] = 255
+        sintetica = np.dstack([sintetica] * 3)
+        for tipo in PROMPTS:
+            blob = self.preprocesador.preparar(sintetica, tipo)
+        imagen = ImagenOCR.desde_bytes(blob['data'])
+        self.calidad.medir(imagen)
+        if self.umbral_lectura_local is not None:
+            leer_cuentakilometros(imagen.gris)
+
+        if self.model is not None:
             try:
-                self.model = get_gemini_model()
-                print("INFO: OCRProcessor inicializado correctamente")
+                self.model.count_tokens([PROMPTS['matricula'], blob], request_options={'timeout': 10})
             except Exception as e:
-                error_msg = f"No se pudo inicializar Gemini: {e}"
-                print(f"ERROR: {error_msg}")
-                raise ValueError(error_msg)
+                log.warning("No se pudo conectar con Gemini al precalentar: %s", e)
+        log.info("Procesador OCR precalentado en %.2fs", time.perf_counter() - inicio)
     
-    def extraer_texto_ocr(self, imagen_path, tipo_ocr):
+    def extraer_texto_ocr(self, imagen_path, tipo_ocr, usar_cache=True):
         """
-        Extrae texto de una imagen usando Gemini Vision
+        Extrae texto de una imagen con el motor elegido por el enrutador
         
         Args:
-            imagen_path: Ruta a la imagen o array numpy
+            imagen_path: ImagenOCR, ruta a la imagen, bytes o array numpy
             tipo_ocr: Tipo de OCR ('matricula' o 'cuentakilometros')
+            usar_cache: Si es False se lee de nuevo aunque haya un resultado
+                        en caché (que se sustituye por la nueva lectura)
             
         Returns:
             dict: Resultado del OCR con texto y confianza
         """
-        return self._extraer_texto_gemini(imagen_path, tipo_ocr)
+        imagen_path = como_imagen(imagen_path)
+        clave = self._clave(imagen_path, tipo_ocr)
+        resultado = self.cache.obtener(clave) if usar_cache else None
+        if resultado is not None:
+            resultado['cache'] = True
+            return resultado
+        
+        inicio = time.perf_counter()
+        resultado = self.enrutador.extraer(imagen_path, tipo_ocr)
+        
+        # Solo se cachean lecturas que alcanzan la confianza mínima del
+        # enrutador: los errores (cuota, red...) y el mejor intento por debajo
+        # de ella se vuelven a leer en el siguiente envío
+        if self.enrutador.es_valido(resultado):
+            self.cache.guardar(clave, resultado, time.perf_counter() - inicio)
+        
+        return resultado
+    
+    def _clave(self, imagen_path, tipo_ocr):
+        """Clave de caché: imagen (bytes originales si los hay) + tipo + versión del prompt y del preprocesado"""
+        version = f"{PROMPT_VERSION}:{self.preprocesador.firma()}"
+        return calcular_clave(como_imagen(imagen_path).contenido(), tipo_ocr, version)
+    
+    def _preparar_imagen(self, imagen_path, tipo_ocr):
+        """Redimensiona, recorta y recodifica la imagen para enviarla a Gemini"""
+        with etapa('preprocesado', tipo_ocr) as medida:
+            blob = self.preprocesador.preparar(imagen_path, tipo_ocr)
+            medida.bytes = len(blob['data'])
+        log.debug("Imagen preparada para Gemini - %d bytes", len(blob['data']))
+        return blob
+    
+    def _construir_contenido(self, tipo, prompt, *imagenes):
+        """Partes de la petición a Gemini (etapa 'prompt', con el tamaño de la petición)"""
+        with etapa('prompt', tipo) as medida:
+            contenido = [prompt, *imagenes]
+            medida.bytes = len(prompt.encode('utf-8')) + sum(len(img['data']) for img in imagenes)
+        return contenido
+    
+    def _llamar_gemini(self, tipo, contenido, **kwargs):
+        """Texto de la respuesta de Gemini (etapa 'gemini', con el tamaño de la respuesta)"""
+        with etapa('gemini', tipo) as medida:
+            texto = self.llamador.generar(contenido, **kwargs).text.strip()
+            medida.bytes = len(texto.encode('utf-8'))
+        return texto
     
     def _extraer_texto_gemini(self, imagen_path, tipo_ocr):
         """Extrae texto usando Gemini Vision API"""
         try:
-            print(f"INFO: Procesando imagen con Gemini - Tipo: {tipo_ocr}")
+            img = self._preparar_imagen(imagen_path, tipo_ocr)
             
-            # Cargar imagen (puede ser ruta o array numpy)
-            if isinstance(imagen_path, str):
-                # Es una ruta de archivo
-                img = Image.open(imagen_path)
-                print(f"INFO: Imagen cargada desde archivo: {imagen_path}")
-            elif isinstance(imagen_path, np.ndarray):
-                # Es un array de OpenCV (BGR)
-                # Convertir de BGR a RGB
-                img_rgb = cv2.cvtColor(imagen_path, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(img_rgb)
-                print(f"INFO: Imagen convertida desde numpy array - Shape: {imagen_path.shape}")
-            else:
-                raise ValueError("imagen_path debe ser una ruta de archivo o array numpy")
-            
-            # Definir prompts específicos según el tipo
-            if tipo_ocr == 'matricula':
-                prompt = """Analiza esta imagen de una matrícula de vehículo europea.
-                Extrae ÚNICAMENTE los caracteres de la matrícula (letras y números).
-                Responde solo con los caracteres encontrados, sin espacios ni guiones.
-                Si no detectas una matrícula clara, responde 'NO_DETECTADO'."""
-            else:  # cuentakilometros
-                prompt = """Analiza esta imagen del cuentakilómetros de un vehículo.
-                Extrae ÚNICAMENTE los números del odómetro principal (los kilómetros totales).
-                Ignora cualquier otro número (velocidad, rpm, combustible, etc.).
-                Responde solo con los dígitos encontrados, sin espacios, puntos ni comas.
-                Si no detectas números claros del odómetro, responde 'NO_DETECTADO'."""
+            # Prompt específico según el tipo
+            prompt = PROMPTS['matricula' if tipo_ocr == 'matricula' else 'cuentakilometros']
+            contenido = self._construir_contenido(tipo_ocr, prompt, img)
             
             # Generar contenido con Gemini
-            print(f"INFO: Enviando petición a Gemini API...")
-            response = self.model.generate_content([prompt, img])
-            print(f"INFO: Respuesta recibida de Gemini")
+            texto = self._llamar_gemini(tipo_ocr, contenido)
+            log.info("Texto extraído por Gemini: '%s'", texto, extra={'tipo': tipo_ocr})
             
-            # Procesar respuesta
-            texto = response.text.strip()
-            print(f"INFO: Texto extraído: '{texto}'")
+            return self._resultado_desde_texto(texto, tipo_ocr, 'gemini', 0.95)  # Gemini es muy confiable
             
-            # Validar respuesta
-            if not texto or texto == 'NO_DETECTADO':
+        except PlazoAgotado as e:
+            log.error("Gemini no respondió a tiempo: %s", e, extra={'tipo': tipo_ocr})
+            return {
+                'texto': '',
+                'confianza': 0.0,
+                'metodo': 'gemini',
+                'error': 'Gemini no respondió a tiempo, inténtalo de nuevo'
+            }
+        except Exception as e:
+            if es_error_cuota(e):
+                log.error("Cuota de Gemini agotada tras reintentos: %s", e, extra={'tipo': tipo_ocr})
                 return {
                     'texto': '',
                     'confianza': 0.0,
                     'metodo': 'gemini',
-                    'error': 'No se detectó texto válido'
+                    'error': 'Cuota de Gemini agotada, inténtalo de nuevo en unos segundos'
                 }
-            
-            # Limpiar texto según el tipo
-            if tipo_ocr == 'matricula':
-                texto = self.limpiar_matricula(texto)
-            else:
-                texto = self.limpiar_cuentakilometros(texto)
-            
-            return {
-                'texto': texto,
-                'confianza': 0.95,  # Gemini es muy confiable
-                'metodo': 'gemini'
-            }
-            
-        except Exception as e:
             error_msg = str(e)
-            print(f"ERROR en _extraer_texto_gemini: {error_msg}")
-            print(f"Tipo de error: {type(e).__name__}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error en la llamada a Gemini: %s", error_msg, extra={'tipo': tipo_ocr})
             return {
                 'texto': '',
                 'confianza': 0.0,
@@ -138,42 +275,137 @@ class OCRProcessor:
                 'error': error_msg
             }
     
-    def limpiar_matricula(self, texto):
-        """Limpia y valida el formato de matrícula"""
-        # Eliminar espacios, guiones y caracteres no alfanuméricos
-        texto = re.sub(r'[^A-Z0-9]', '', texto.upper())
+    def _resultado_desde_texto(self, texto, tipo_ocr, metodo, confianza):
+        """Valida y limpia el texto devuelto por un motor OCR"""
+        with etapa('limpieza', tipo_ocr) as medida:
+            resultado = self._validar_texto(texto, tipo_ocr, metodo, confianza)
+            medida.bytes = len(resultado['texto'])
+        return resultado
+    
+    def _validar_texto(self, texto, tipo_ocr, metodo, confianza):
+        """Resultado con el texto limpiado, o con error si no es válido"""
+        texto = (texto or '').strip()
         
-        # Validar formato europeo típico (4 números + 3 letras o similar)
-        if len(texto) < 4 or len(texto) > 10:
-            return ''
+        # Validar respuesta
+        if not texto or texto == 'NO_DETECTADO':
+            return {
+                'texto': '',
+                'confianza': 0.0,
+                'metodo': metodo,
+                'error': 'No se detectó texto válido'
+            }
         
-        return texto
+        # Limpiar texto según el tipo
+        if tipo_ocr == 'matricula':
+            texto = self.limpiar_matricula(texto)
+        else:
+            texto = self.limpiar_cuentakilometros(texto)
+        
+        return {
+            'texto': texto,
+            'confianza': confianza,
+            'metodo': metodo
+        }
     
-    def limpiar_cuentakilometros(self, texto):
-        """Limpia y valida los números del cuentakilómetros"""
-        # Extraer solo dígitos
-        texto = re.sub(r'[^0-9]', '', texto)
+    def _leer_cuentakilometros_local(self, imagen_path):
+        """
+        Intenta leer el cuentakilómetros localmente (display de siete segmentos)
+        
+        Returns:
+            dict o None: Resultado con el mismo formato que Gemini si la
+                         confianza supera el umbral; None para escalar a Gemini
+        """
+        if self.umbral_lectura_local is None:
+            return None
         
-        # Validar rango razonable (entre 0 y 999999 km)
-        if not texto or len(texto) > 6:
-            return ''
+        # El lector trabaja en escala de grises: no hace falta decodificar en color
+        with etapa('lectura_local', 'cuentakilometros'):
+            try:
+                gris = como_imagen(imagen_path).gris
+            except (OSError, ValueError):
+                return None
+            
+            texto, confianza = leer_cuentakilometros(gris)
+            texto = self.limpiar_cuentakilometros(texto)
+        if not texto or confianza < self.umbral_lectura_local:
+            return None
         
-        # Eliminar ceros a la izquierda pero mantener al menos un dígito
-        texto = texto.lstrip('0') or '0'
+        log.info("Cuentakilómetros leído localmente: '%s' (confianza %.2f)", texto, confianza)
+        return {
+            'texto': texto,
+            'confianza': confianza,
+            'metodo': 'local_7seg'
+        }
+    
+    def _revisar_calidad(self, imagen_path, tipo_ocr):
+        """
+        Control de calidad local antes de leer la imagen con el motor OCR
         
-        return texto
+        Returns:
+            dict o None: Resultado con el error y los problemas encontrados
+                         si la imagen no se puede leer; None si es válida
+        """
+        if not self.calidad.activo:
+            return None
+        
+        with etapa('calidad', tipo_ocr):
+            try:
+                problemas, medidas = self.calidad.evaluar(imagen_path)
+            except (OSError, ValueError):
+                return None  # Sin decodificar: el motor OCR devuelve el error
+        if not problemas:
+            return None
+        
+        codigos = [p['codigo'] for p in problemas]
+        log.info("Imagen rechazada por calidad: %s", ', '.join(codigos), extra={'tipo': tipo_ocr, 'medidas': medidas})
+        return {
+            'texto': '',
+            'confianza': 0.0,
+            'metodo': 'calidad',
+            'error': '; '.join(p['mensaje'] for p in problemas),
+            'calidad': {'problemas': codigos, 'medidas': medidas}
+        }
+    
+    def _resultado_fallido(self, resultado, error):
+        """Respuesta sin lectura, con los problemas de calidad si la imagen se rechazó"""
+        respuesta = {
+            'exito': False,
+            'error': resultado.get('error', error),
+            'metodo': resultado.get('metodo', 'gemini')
+        }
+        if 'calidad' in resultado:
+            respuesta['calidad'] = resultado['calidad']
+        return respuesta
+    
+    def limpiar_matricula(self, texto):
+        """Limpia y valida el formato de matrícula"""
+        return limpiar_matricula(texto)
     
-    def procesar_matricula(self, imagen_path):
+    def limpiar_cuentakilometros(self, texto):
+        """Limpia y valida los números del cuentakilómetros"""
+        return limpiar_cuentakilometros(texto)
+    
+    def procesar_matricula(self, imagen_path, rechazo_calidad=CALIDAD_PENDIENTE):
         """
         Procesa una imagen de matrícula
         
         Args:
-            imagen_path: Ruta a la imagen
+            imagen_path: ImagenOCR, ruta a la imagen, bytes o array numpy
+            rechazo_calidad: Resultado de _revisar_calidad si la imagen ya
+                             se ha evaluado (None si lo pasó); por defecto
+                             se evalúa aquí
             
         Returns:
             dict: Resultado del procesamiento
         """
-        resultado = self.extraer_texto_ocr(imagen_path, 'matricula')
+        imagen_path = como_imagen(imagen_path)
+        
+        resultado = rechazo_calidad
+        if resultado is CALIDAD_PENDIENTE:
+            resultado = self._revisar_calidad(imagen_path, 'matricula')
+        if resultado is None:
+            resultado = self.extraer_texto_ocr(imagen_path, 'matricula')
+        
         texto = resultado.get('texto', '')
         
         if texto:
@@ -184,23 +416,33 @@ class OCRProcessor:
                 'metodo': resultado.get('metodo', 'gemini')
             }
         else:
-            return {
-                'exito': False,
-                'error': resultado.get('error', 'No se pudo detectar la matrícula'),
-                'metodo': resultado.get('metodo', 'gemini')
-            }
+            return self._resultado_fallido(resultado, 'No se pudo detectar la matrícula')
     
-    def procesar_cuentakilometros(self, imagen_path):
+    def procesar_cuentakilometros(self, imagen_path, releer=False, rechazo_calidad=CALIDAD_PENDIENTE):
         """
         Procesa una imagen de cuentakilómetros
         
         Args:
-            imagen_path: Ruta a la imagen
+            imagen_path: ImagenOCR, ruta a la imagen, bytes o array numpy
+            releer: Volver a leer con el motor OCR, sin lectura local ni
+                    caché (p. ej. si la lectura anterior no era plausible)
+            rechazo_calidad: Resultado de _revisar_calidad si la imagen ya
+                             se ha evaluado (None si lo pasó); por defecto
+                             se evalúa aquí
             
         Returns:
             dict: Resultado del procesamiento
         """
-        resultado = self.extraer_texto_ocr(imagen_path, 'cuentakilometros')
+        imagen_path = como_imagen(imagen_path)
+        
+        # Vía rápida local para displays digitales; si no es fiable, Gemini
+        resultado = None if releer else self._leer_cuentakilometros_local(imagen_path)
+        if resultado is None:
+            resultado = rechazo_calidad
+            if resultado is CALIDAD_PENDIENTE:
+                resultado = self._revisar_calidad(imagen_path, 'cuentakilometros')
+        if resultado is None:
+            resultado = self.extraer_texto_ocr(imagen_path, 'cuentakilometros', usar_cache=not releer)
         texto = resultado.get('texto', '')
         
         if texto:
@@ -211,8 +453,184 @@ class OCRProcessor:
                 'metodo': resultado.get('metodo', 'gemini')
             }
         else:
+            return self._resultado_fallido(resultado, 'No se pudieron detectar los kilómetros')
+    
+    def _extraer_vehiculo_gemini(self, imagen_matricula, imagen_cuentakilometros):
+        """
+        Extrae matrícula y kilómetros en una única petición multimodal a Gemini
+        
+        Returns:
+            dict: {'matricula': str, 'kilometros': str} con los valores ya
+                  limpiados (cadena vacía si el campo no es válido)
+        """
+        img_matricula = self._preparar_imagen(imagen_matricula, 'matricula')
+        img_cuentakilometros = self._preparar_imagen(imagen_cuentakilometros, 'cuentakilometros')
+        
+        contenido = self._construir_contenido('vehiculo', PROMPT_COMBINADO, img_matricula, img_cuentakilometros)
+        texto = self._llamar_gemini('vehiculo', contenido,
+                                    generation_config={'response_mime_type': 'application/json'})
+        log.info("Respuesta combinada de Gemini: '%s'", texto, extra={'tipo': 'vehiculo'})
+        
+        with etapa('limpieza', 'vehiculo') as medida:
+            # Tolerar respuestas envueltas en bloque de código markdown
+            if texto.startswith('```'):
+                texto = texto.strip('`')
+                if texto.lower().startswith('json'):
+                    texto = texto[4:]
+            
+            datos = json.loads(texto)
+            if not isinstance(datos, dict):
+                raise ValueError("La respuesta combinada no es un objeto JSON")
+            
+            matricula = str(datos.get('matricula') or '')
+            kilometros = str(datos.get('kilometros') or '')
+            resultado = {
+                'matricula': '' if matricula == 'NO_DETECTADO' else self.limpiar_matricula(matricula),
+                'kilometros': '' if kilometros == 'NO_DETECTADO' else self.limpiar_cuentakilometros(kilometros)
+            }
+            medida.bytes = len(resultado['matricula']) + len(resultado['kilometros'])
+        return resultado
+    
+    @staticmethod
+    def resumir_campos(campos):
+        """
+        Método y confianza de una lectura de vehículo a partir de los de sus campos
+        
+        Args:
+            campos: {campo: {'metodo', 'confianza'}}
+            
+        Returns:
+            dict: 'metodo' con los métodos de los campos unidos por '+' (uno
+                  solo si coinciden) y 'confianza', la del menos fiable
+        """
+        return {
+            'metodo': '+'.join(dict.fromkeys(campo['metodo'] for campo in campos.values())),
+            'confianza': min((campo['confianza'] for campo in campos.values()), default=0.0)
+        }
+    
+    def procesar_vehiculo(self, imagen_matricula, imagen_cuentakilometros):
+        """
+        Procesa matrícula y cuentakilómetros de un vehículo con una sola
+        llamada a Gemini. Los campos que no superen la validación se
+        vuelven a leer por separado con procesar_matricula / procesar_cuentakilometros.
+        
+        Args:
+            imagen_matricula: ImagenOCR, ruta, bytes o array numpy con la matrícula
+            imagen_cuentakilometros: ImagenOCR, ruta, bytes o array numpy con el cuentakilómetros
+            
+        Returns:
+            dict: Resultado del procesamiento de ambos campos; 'campos' tiene
+                  el método y la confianza de cada uno, 'metodo' los une
+                  (p. ej. 'cache+local_7seg') y 'confianza' es la menor
+        """
+        imagen_matricula = como_imagen(imagen_matricula)
+        imagen_cuentakilometros = como_imagen(imagen_cuentakilometros)
+        clave_matricula = self._clave(imagen_matricula, 'matricula')
+        clave_km = self._clave(imagen_cuentakilometros, 'cuentakilometros')
+        cache_matricula = self.cache.obtener(clave_matricula)
+        cache_km = self.cache.obtener(clave_km)
+        
+        matricula = cache_matricula.get('texto', '') if cache_matricula else ''
+        kilometros = cache_km.get('texto', '') if cache_km else ''
+        # Método y confianza de la lectura de cada campo
+        campos = {}
+        if matricula:
+            campos['matricula'] = {'metodo': 'cache', 'confianza': cache_matricula.get('confianza', 0.0)}
+        if kilometros:
+            campos['kilometros'] = {'metodo': 'cache', 'confianza': cache_km.get('confianza', 0.0)}
+        
+        # Si el cuentakilómetros se lee localmente basta con pedir la matrícula
+        if not kilometros:
+            local = self._leer_cuentakilometros_local(imagen_cuentakilometros)
+            if local is not None:
+                kilometros = local['texto']
+                campos['kilometros'] = {'metodo': local['metodo'], 'confianza': local['confianza']}
+        
+        # Una sola petición cuando ninguno de los dos campos está en caché
+        # (requiere el motor Gemini; con otros motores se leen por separado).
+        # Si alguna imagen no pasa el control de calidad se leen por separado
+        # y solo se rechaza esa; el resultado del control se reutiliza en la
+        # lectura individual en lugar de evaluar de nuevo la imagen.
+        rechazo_matricula = rechazo_km = CALIDAD_PENDIENTE
+        if not matricula and not kilometros and self.llamador is not None:
+            rechazo_matricula = self._revisar_calidad(imagen_matricula, 'matricula')
+            rechazo_km = self._revisar_calidad(imagen_cuentakilometros, 'cuentakilometros')
+        if rechazo_matricula is None and rechazo_km is None:
+            inicio = time.perf_counter()
+            try:
+                combinado = self._extraer_vehiculo_gemini(imagen_matricula, imagen_cuentakilometros)
+                # La latencia de la llamada combinada se reparte entre ambos campos
+                latencia = (time.perf_counter() - inicio) / 2
+                matricula = combinado['matricula']
+                kilometros = combinado['kilometros']
+                resultado_base = {'confianza': 0.95, 'metodo': 'gemini'}
+                for clave, texto in ((clave_matricula, matricula), (clave_km, kilometros)):
+                    if self.enrutador.es_valido({**resultado_base, 'texto': texto}):
+                        self.cache.guardar(clave, {**resultado_base, 'texto': texto}, latencia)
+                if matricula:
+                    campos['matricula'] = {'metodo': 'gemini_combinado', 'confianza': resultado_base['confianza']}
+                if kilometros:
+                    campos['kilometros'] = {'metodo': 'gemini_combinado', 'confianza': resultado_base['confianza']}
+            except PlazoAgotado as e:
+                # Con el plazo agotado no se encadenan más llamadas a Gemini
+                log.error("Gemini no respondió a tiempo en la petición combinada: %s", e)
+                return {
+                    'exito': False,
+                    'matricula': '',
+                    'kilometros': '',
+                    'error': 'Gemini no respondió a tiempo, inténtalo de nuevo',
+                    'metodo': 'gemini_combinado'
+                }
+            except Exception as e:
+                log.warning("Error en la petición combinada, se usará el modo de dos llamadas: %s", e)
+        
+        # Fallback a la lectura individual de los campos no válidos
+        resultado_matricula = None
+        resultado_km = None
+        if not matricula:
+            resultado_matricula = self.procesar_matricula(imagen_matricula, rechazo_calidad=rechazo_matricula)
+            matricula = resultado_matricula.get('matricula', '')
+            campos['matricula'] = {'metodo': resultado_matricula.get('metodo', 'gemini'),
+                                   'confianza': resultado_matricula.get('confianza', 0.0)}
+        if not kilometros:
+            resultado_km = self.procesar_cuentakilometros(imagen_cuentakilometros, rechazo_calidad=rechazo_km)
+            kilometros = resultado_km.get('kilometros', '')
+            campos['kilometros'] = {'metodo': resultado_km.get('metodo', 'gemini'),
+                                    'confianza': resultado_km.get('confianza', 0.0)}
+        
+        if matricula and kilometros:
             return {
-                'exito': False,
-                'error': resultado.get('error', 'No se pudieron detectar los kilómetros'),
-                'metodo': resultado.get('metodo', 'gemini')
+                'exito': True,
+                'matricula': matricula,
+                'kilometros': kilometros,
+                **self.resumir_campos(campos),
+                'campos': campos
             }
+        
+        errores = []
+        calidad = {}
+        if not matricula:
+            resultado_matricula = resultado_matricula or {}
+            if 'calidad' in resultado_matricula:
+                calidad['matricula'] = resultado_matricula['calidad']
+                errores.append(f"Matrícula: {resultado_matricula['error']}")
+            else:
+                errores.append(resultado_matricula.get('error', 'No se pudo detectar la matrícula'))
+        if not kilometros:
+            resultado_km = resultado_km or {}
+            if 'calidad' in resultado_km:
+                calidad['cuentakilometros'] = resultado_km['calidad']
+                errores.append(f"Cuentakilómetros: {resultado_km['error']}")
+            else:
+                errores.append(resultado_km.get('error', 'No se pudieron detectar los kilómetros'))
+        resultado = {
+            'exito': False,
+            'matricula': matricula,
+            'kilometros': kilometros,
+            'error': '; '.join(errores),
+            'metodo': self.resumir_campos(campos)['metodo'],
+            'campos': campos
+        }
+        if calidad:
+            resultado['calidad'] = calidad
+        return resultado
@@ -0,0 +1,90 @@
+"""
+Plausibilidad del kilometraje según el historial de cada matrícula.
+
+limpiar_cuentakilometros solo comprueba que la lectura tenga como mucho
+seis dígitos, así que un dígito perdido o duplicado por el OCR pasa la
+validación. Cada lectura nueva se compara con la lectura anterior y la
+siguiente de la misma matrícula (las importaciones pueden dejar lecturas
+posteriores a una fecha dada):
+  - el cuentakilómetros no retrocede
+  - el aumento no supera un máximo de km por día
+
+Las dos lecturas contiguas se obtienen con el índice (usuario, matricula,
+fecha) del almacén, así que la comprobación es una búsqueda por índice
+independientemente del tamaño del historial.
+"""
+
+import os
+from datetime import datetime
+
+from almacen_vehiculos import kilometros_numericos
+
+
+def _fecha(texto):
+    return datetime.fromisoformat(texto)
+
+
+class ValidadorKilometraje:
+    """Comprueba lecturas del cuentakilómetros contra el historial de la matrícula"""
+
+    def __init__(self, almacen, km_max_dia=1500):
+        """
+        Inicializa el validador
+
+        Args:
+            almacen: AlmacenVehiculos con el historial
+            km_max_dia: Aumento máximo plausible en km por día transcurrido
+                        (un intervalo de menos de un día cuenta como uno)
+        """
+        self.almacen = almacen
+        self.km_max_dia = km_max_dia
+
+    @classmethod
+    def desde_entorno(cls, almacen):
+        """Crea el validador con VEHICULOS_KM_MAX_DIA"""
+        return cls(almacen, km_max_dia=int(os.getenv('VEHICULOS_KM_MAX_DIA', '1500')))
+
+    def _incoherencia(self, km, fecha, anterior, siguiente):
+        """Motivo por el que km no encaja entre las lecturas contiguas (None si encaja)"""
+        if anterior is not None:
+            km_anterior = kilometros_numericos(anterior['kilometros'])
+            if km < km_anterior:
+                return f"El kilometraje es menor que la lectura anterior ({km_anterior} km el {anterior['fecha']})"
+            dias = max((fecha - _fecha(anterior['fecha'])).total_seconds() / 86400, 1)
+            if km - km_anterior > self.km_max_dia * dias:
+                return (f"Aumento de {km - km_anterior} km en {dias:.0f} día(s) desde la lectura "
+                        f"anterior ({km_anterior} km el {anterior['fecha']})")
+        if siguiente is not None:
+            km_siguiente = kilometros_numericos(siguiente['kilometros'])
+            if km > km_siguiente:
+                return f"El kilometraje es mayor que la lectura posterior ({km_siguiente} km el {siguiente['fecha']})"
+            dias = max((_fecha(siguiente['fecha']) - fecha).total_seconds() / 86400, 1)
+            if km_siguiente - km > self.km_max_dia * dias:
+                return (f"Faltan {km_siguiente - km} km hasta la lectura posterior "
+                        f"({km_siguiente} km el {siguiente['fecha']})")
+        return None
+
+    def evaluar(self, usuario, matricula, kilometros, fecha=None):
+        """
+        Evalúa una lectura del cuentakilómetros
+
+        Args:
+            usuario: Propietario del historial
+            matricula: Matrícula del vehículo
+            kilometros: Lectura a evaluar
+            fecha: Fecha de la lectura ('AAAA-MM-DD HH:MM:SS', por defecto ahora)
+
+        Returns:
+            dict: {'plausible', 'motivo', 'anterior', 'siguiente'};
+            'anterior' y 'siguiente' son las lecturas contiguas del historial
+            ({'kilometros', 'fecha'} o None)
+        """
+        fecha = fecha or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        anterior, siguiente = self.almacen.lecturas_contiguas(usuario, matricula, fecha)
+        motivo = self._incoherencia(kilometros_numericos(kilometros), _fecha(fecha), anterior, siguiente)
+        return {
+            'plausible': motivo is None,
+            'motivo': motivo,
+            'anterior': {'kilometros': anterior['kilometros'], 'fecha': anterior['fecha']} if anterior else None,
+            'siguiente': {'kilometros': siguiente['kilometros'], 'fecha': siguiente['fecha']} if siguiente else None,
+        }
@@ -0,0 +1,151 @@
+"""
+Preprocesado de imágenes antes de enviarlas a Gemini.
+
+Reduce la imagen a un lado máximo configurable, recorta opcionalmente la
+región de interés (fija o, para matrículas, localizada con OpenCV) y la
+recodifica como JPEG directamente desde el array BGR de OpenCV
+(cv2.imencode trabaja en BGR), evitando la conversión BGR→RGB→PIL y la
+codificación WEBP sin pérdida que hace la librería de Gemini con las
+imágenes PIL creadas en memoria. Si la imagen llega codificada (ImagenOCR)
+y no hay nada que recortar ni reducir, se envían sus bytes sin decodificarla.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from detector_matricula import recortar_matricula
+from ocr_imagen import ImagenOCR
+
+
+def _leer_roi(valor):
+    """Convierte 'x,y,ancho,alto' (fracciones 0-1) en tupla, o None"""
+    if not valor:
+        return None
+    partes = [float(p) for p in valor.split(',')]
+    if len(partes) != 4:
+        raise ValueError(f"ROI no válida: '{valor}' (formato x,y,ancho,alto)")
+    return tuple(partes)
+
+
+class Preprocesador:
+    """Etapa configurable de redimensionado, recorte y recodificación"""
+
+    def __init__(self, lado_max=1600, calidad_jpeg=85, rois=None,
+                 detectar_matricula=True, umbral_matricula=0.6):
+        """
+        Inicializa el preprocesador
+
+        Args:
+            lado_max: Longitud máxima del lado mayor en píxeles (0 desactiva el redimensionado)
+            calidad_jpeg: Calidad JPEG de la recodificación (1-100)
+            rois: Diccionario tipo_ocr -> (x, y, ancho, alto) en fracciones de la imagen
+            detectar_matricula: Recortar la matrícula localizada antes de enviarla
+            umbral_matricula: Confianza mínima de la localización; por debajo
+                              se envía el fotograma completo
+        """
+        self.lado_max = lado_max
+        self.calidad_jpeg = calidad_jpeg
+        self.rois = rois or {}
+        self.detectar_matricula = detectar_matricula
+        self.umbral_matricula = umbral_matricula
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea el preprocesador a partir de las variables de entorno OCR_PREPROCESADO_*"""
+        return cls(
+            lado_max=int(os.getenv('OCR_PREPROCESADO_LADO_MAX', '1600')),
+            calidad_jpeg=int(os.getenv('OCR_PREPROCESADO_CALIDAD', '85')),
+            rois={
+                'matricula': _leer_roi(os.getenv('OCR_ROI_MATRICULA')),
+                'cuentakilometros': _leer_roi(os.getenv('OCR_ROI_CUENTAKILOMETROS')),
+            },
+            detectar_matricula=os.getenv('OCR_DETECTAR_MATRICULA', '1') == '1',
+            umbral_matricula=float(os.getenv('OCR_DETECTAR_MATRICULA_UMBRAL', '0.6')),
+        )
+
+    def firma(self):
+        """Identifica la configuración (forma parte de la clave de caché)"""
+        rois = ';'.join(f"{k}={v}" for k, v in sorted(self.rois.items()) if v)
+        detector = f"det{self.umbral_matricula}" if self.detectar_matricula else ''
+        return f"{self.lado_max}:{self.calidad_jpeg}:{rois}:{detector}"
+
+    def recortar(self, imagen, tipo_ocr):
+        """Recorta la región de interés configurada o detectada para el tipo de OCR"""
+        imagen = self._recortar_roi(imagen, tipo_ocr)
+        if tipo_ocr == 'matricula' and self.detectar_matricula:
+            imagen, _ = recortar_matricula(imagen, umbral=self.umbral_matricula)
+        return imagen
+
+    def _recortar_roi(self, imagen, tipo_ocr):
+        """Recorta la región fija configurada para el tipo de OCR"""
+        roi = self.rois.get(tipo_ocr)
+        if not roi:
+            return imagen
+
+        alto, ancho = imagen.shape[:2]
+        x, y, w, h = roi
+        x0 = max(0, int(x * ancho))
+        y0 = max(0, int(y * alto))
+        x1 = min(ancho, int((x + w) * ancho))
+        y1 = min(alto, int((y + h) * alto))
+        if x1 <= x0 or y1 <= y0:
+            return imagen
+        return imagen[y0:y1, x0:x1]
+
+    def redimensionar(self, imagen):
+        """Reduce la imagen para que su lado mayor no supere lado_max"""
+        alto, ancho = imagen.shape[:2]
+        lado = max(alto, ancho)
+        if not self.lado_max or lado <= self.lado_max:
+            return imagen
+
+        escala = self.lado_max / lado
+        nuevo = (max(1, round(ancho * escala)), max(1, round(alto * escala)))
+        return cv2.resize(imagen, nuevo, interpolation=cv2.INTER_AREA)
+
+    def recorta(self, tipo_ocr):
+        """Si para el tipo de OCR hay que recortar la imagen (ROI fija o detección)"""
+        return bool(self.rois.get(tipo_ocr)) or (tipo_ocr == 'matricula' and self.detectar_matricula)
+
+    def sin_cambios(self, imagen, tipo_ocr):
+        """Si la imagen (ImagenOCR) se puede enviar tal cual: sin recorte y dentro de lado_max"""
+        if not imagen.reenviable or self.recorta(tipo_ocr):
+            return False
+        return not self.lado_max or max(imagen.tamano) <= self.lado_max
+
+    def codificar(self, imagen):
+        """Codifica un array BGR como JPEG"""
+        ok, buffer = cv2.imencode('.jpg', imagen, [cv2.IMWRITE_JPEG_QUALITY, self.calidad_jpeg])
+        if not ok:
+            raise ValueError("No se pudo codificar la imagen como JPEG")
+        return buffer.tobytes()
+
+    def preparar(self, imagen, tipo_ocr):
+        """
+        Prepara una imagen para enviarla al modelo
+
+        Args:
+            imagen: ImagenOCR, ruta a la imagen o array numpy (BGR)
+            tipo_ocr: Tipo de OCR ('matricula' o 'cuentakilometros')
+
+        Returns:
+            dict: Blob {'mime_type', 'data': bytes} aceptado por Gemini
+        """
+        if isinstance(imagen, ImagenOCR):
+            if self.sin_cambios(imagen, tipo_ocr):
+                return {'mime_type': imagen.mime_type, 'data': imagen.datos}
+            # Sin recorte basta con decodificar al tamaño más cercano a lado_max
+            imagen = imagen.bgr if self.recorta(tipo_ocr) else imagen.bgr_reducida(self.lado_max)
+        elif isinstance(imagen, str):
+            ruta = imagen
+            imagen = cv2.imread(ruta, cv2.IMREAD_COLOR)
+            if imagen is None:
+                raise ValueError(f"No se pudo leer la imagen: {ruta}")
+        elif not isinstance(imagen, np.ndarray):
+            raise ValueError("imagen_path debe ser una ruta de archivo o array numpy")
+
+        imagen = self.recortar(imagen, tipo_ocr)
+        imagen = self.redimensionar(imagen)
+        return {'mime_type': 'image/jpeg', 'data': self.codificar(imagen)}
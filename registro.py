@@ -0,0 +1,184 @@
+"""
+Registro (logging) estructurado y no bloqueante de la aplicación.
+
+Los módulos usan logging.getLogger(__name__) y configurar_registro()
+instala en el logger raíz un QueueHandler: el hilo que atiende la petición
+solo mete el registro en una cola en memoria y un hilo de fondo
+(QueueListener) le da formato y lo escribe en stdout. Así una salida lenta
+(tubería del contenedor, recolector de logs) no bloquea las peticiones, y
+el coste por registro no crece con la concurrencia. Si la cola se llena
+los registros se descartan y se cuentan en lugar de esperar.
+
+Cada registro lleva el identificador de la petición (cabecera X-Request-ID
+o uno nuevo, ver app.py; en la cola OCR, el del trabajo), que se guarda en
+una variable de contexto y se propaga a los hilos con copiar_contexto().
+
+Con LOG_MUESTREO < 1 solo se conservan los registros INFO/DEBUG de esa
+fracción de peticiones, elegidas por su identificador (una petición se
+registra entera o no se registra); WARNING y superiores se conservan
+siempre.
+
+Variables de entorno: LOG_NIVEL (INFO), LOG_FORMATO ('json' o 'texto'),
+LOG_MUESTREO (1.0) y LOG_COLA_MAX (10000).
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+
+id_peticion = contextvars.ContextVar('id_peticion', default='-')
+
+# Atributos propios de LogRecord; el resto (extra=...) se añade al JSON
+_ATRIBUTOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'id_peticion'}
+
+_lock = threading.Lock()
+_manejador = None
+_escritor = None
+_listener = None
+
+
+def copiar_contexto(funcion):
+    """
+    Envuelve funcion para ejecutarla con el contexto actual (identificador de
+    petición incluido), p. ej. al enviarla a un ThreadPoolExecutor
+    """
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.run(funcion, *args, **kwargs)
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos extra=... al mismo nivel"""
+
+    def format(self, record):
+        datos = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'id_peticion': getattr(record, 'id_peticion', '-'),
+            'pid': record.process,
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR:
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible de desarrollo: 'INFO: mensaje [id_peticion]'"""
+
+    def __init__(self):
+        super().__init__('%(levelname)s: %(message)s [%(id_peticion)s]')
+
+
+class SalidaAgrupada(logging.StreamHandler):
+    """StreamHandler que vacía el búfer solo cuando no quedan registros en la cola"""
+
+    def flush(self):
+        # Un write() al sistema por ráfaga de registros en lugar de uno por registro
+        if _manejador is None or _manejador.queue.empty():
+            super().flush()
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que añade el identificador de petición, aplica el muestreo
+    y nunca bloquea: con la cola llena el registro se descarta
+    """
+
+    def __init__(self, cola, muestreo=1.0, maximo=10000):
+        super().__init__(cola)
+        self.muestreo = muestreo
+        self.maximo = maximo
+        self._umbral = int(muestreo * 10000)
+        self.descartados = 0
+        self.muestreados = 0
+
+    def emit(self, record):
+        record.id_peticion = id_peticion.get()
+        if self._umbral < 10000 and record.levelno < logging.WARNING and record.id_peticion != '-':
+            if zlib.crc32(record.id_peticion.encode()) % 10000 >= self._umbral:
+                self.muestreados += 1
+                return
+        super().emit(record)
+
+    def prepare(self, record):
+        # La cola es del propio proceso: basta con fijar el mensaje (por si los
+        # argumentos cambian después); el formato y la traza se generan en el hilo de fondo
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue no tiene límite: se comprueba aquí (de forma aproximada,
+        # sin bloqueo) para que el centinela de parada siempre quepa
+        if self.queue.qsize() >= self.maximo:
+            self.descartados += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+def _iniciar_listener():
+    """Crea la cola y el hilo de escritura de este proceso"""
+    global _listener
+    cola = queue.SimpleQueue()
+    _manejador.queue = cola
+    _listener = logging.handlers.QueueListener(cola, _escritor, respect_handler_level=True)
+    _listener.start()
+
+
+def _tras_fork():
+    # El hilo de escritura no sobrevive a fork(): cada worker arranca el suyo
+    if _manejador is not None:
+        _iniciar_listener()
+
+
+def _detener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        _escritor.flush()
+
+
+def configurar_registro():
+    """Instala el registro en cola en el logger raíz (solo la primera vez)"""
+    global _manejador, _escritor
+    with _lock:
+        if _manejador is not None:
+            return _manejador
+
+        _escritor = SalidaAgrupada(sys.stdout)
+        _escritor.setFormatter(FormatoTexto() if os.getenv('LOG_FORMATO', 'json') == 'texto' else FormatoJSON())
+        _manejador = ManejadorCola(None, muestreo=float(os.getenv('LOG_MUESTREO', '1')),
+                                   maximo=int(os.getenv('LOG_COLA_MAX', '10000')))
+        _iniciar_listener()
+
+        raiz = logging.getLogger()
+        raiz.addHandler(_manejador)
+        raiz.setLevel(os.getenv('LOG_NIVEL', 'INFO').upper())
+
+        os.register_at_fork(after_in_child=_tras_fork)
+        atexit.register(_detener)
+        return _manejador
+
+
+def estadisticas():
+    """Registros descartados por cola llena y omitidos por el muestreo en este proceso"""
+    if _manejador is None:
+        return {'descartados': 0, 'muestreados': 0, 'en_cola': 0}
+    return {
+        'descartados': _manejador.descartados,
+        'muestreados': _manejador.muestreados,
+        'en_cola': _manejador.queue.qsize(),
+    }
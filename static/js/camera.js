@@ -61,9 +61,9 @@ async function inicializarCamara() {
 
 /**
  * Captura una imagen del video
- * @returns {string} Imagen en formato base64
+ * @returns {Promise<Blob>} Imagen JPEG binaria
  */
-function capturarImagen() {
+async function capturarImagen() {
     const context = canvas.getContext('2d');
     canvas.width = video.videoWidth;
     canvas.height = video.videoHeight;
@@ -71,14 +71,23 @@ function capturarImagen() {
     // Dibujar el frame actual del video en el canvas
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
     
-    // Convertir a base64
-    const imagenBase64 = canvas.toDataURL('image/jpeg', 0.95);
+    // Codificar como JPEG binario (un tercio menos de datos que base64)
+    const imagen = await new Promise((resolve, reject) => {
+        canvas.toBlob(
+            (blob) => blob ? resolve(blob) : reject(new Error('No se pudo codificar la imagen')),
+            'image/jpeg',
+            0.95
+        );
+    });
     
     // Mostrar preview
-    previewImage.src = imagenBase64;
+    if (previewImage.src.startsWith('blob:')) {
+        URL.revokeObjectURL(previewImage.src);
+    }
+    previewImage.src = URL.createObjectURL(imagen);
     previewContainer.style.display = 'block';
     
-    return imagenBase64;
+    return imagen;
 }
 
 /**
@@ -89,20 +98,18 @@ function capturarImagen() {
 async function procesarImagen(endpoint, tipo) {
     try {
         // Capturar imagen
-        const imagenBase64 = capturarImagen();
+        const imagen = await capturarImagen();
         
         // Mostrar loader
         loader.style.display = 'flex';
         
-        // Enviar al servidor
+        // Enviar al servidor como cuerpo binario
         const response = await fetch(endpoint, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'image/jpeg'
             },
-            body: JSON.stringify({
-                image: imagenBase64
-            })
+            body: imagen
         });
         
         const resultado = await response.json();
@@ -1,6 +1,7 @@
 // Estado de la captura
 let pasoActual = 1; // 1 = matrícula, 2 = kilometraje
 let matriculaCapturada = '';
+let imagenMatricula = null; // JPEG del paso 1, se lee junto con el cuentakilómetros
 let kilometrosCapturados = '';
 let stream = null;
 let usingCamera = true; // true = cámara, false = imagen cargada
@@ -83,44 +84,17 @@ function detenerCamara() {
     }
 }
 
-// Capturar matrícula (paso 1)
+// Capturar matrícula (paso 1). La foto se guarda y se lee en el paso 2,
+// junto con el cuentakilómetros, en una sola petición a /ocr/vehiculo
 async function capturarMatricula() {
     try {
         btnCapturar.disabled = true;
-        mostrarLoader('Procesando matrícula...');
         
         // Capturar imagen
-        const imageData = capturarImagen();
-        
-        // Enviar al servidor
-        const response = await fetch('/ocr/matricula', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
-        });
-        
-        const resultado = await response.json();
-        
-        ocultarLoader();
-        
-        if (resultado.exito) {
-            matriculaCapturada = resultado.matricula;
-            matriculaSpan.textContent = matriculaCapturada;
-            resultadosTemp.style.display = 'block';
-            
-            // Preparar para paso 2
-            prepararPaso2();
-            
-        } else {
-            alert('Error al procesar matrícula: ' + (resultado.error || 'Error desconocido'));
-            btnCapturar.disabled = false;
-        }
+        guardarImagenMatricula(await capturarImagen());
         
     } catch (error) {
         console.error('Error:', error);
-        ocultarLoader();
         alert('Error al capturar matrícula: ' + error.message);
         btnCapturar.disabled = false;
     }
@@ -130,35 +104,14 @@ async function capturarMatricula() {
 async function capturarKilometraje() {
     try {
         btnCapturar.disabled = true;
-        mostrarLoader('Procesando kilometraje...');
+        mostrarLoader('Procesando matrícula y kilometraje...');
         
-        // Capturar imagen
-        const imageData = capturarImagen();
-        
-        // Enviar al servidor
-        const response = await fetch('/ocr/cuentakilometros', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
-        });
-        
-        const resultado = await response.json();
+        // Capturar imagen y leer ambas fotos
+        const resultado = await leerVehiculo(await capturarImagen());
         
         ocultarLoader();
         
-        if (resultado.exito) {
-            kilometrosCapturados = resultado.kilometros;
-            kilometrosSpan.textContent = kilometrosCapturados;
-            
-            // Guardar vehículo y volver
-            await guardarVehiculo();
-            
-        } else {
-            alert('Error al procesar kilometraje: ' + (resultado.error || 'Error desconocido'));
-            btnCapturar.disabled = false;
-        }
+        await aplicarLecturaVehiculo(resultado);
         
     } catch (error) {
         console.error('Error:', error);
@@ -168,8 +121,59 @@ async function capturarKilometraje() {
     }
 }
 
+// Guardar la foto de la matrícula y pasar al cuentakilómetros
+function guardarImagenMatricula(imagen) {
+    imagenMatricula = imagen;
+    matriculaCapturada = '';
+    matriculaSpan.textContent = 'Pendiente de lectura';
+    resultadosTemp.style.display = 'block';
+    
+    // Preparar para paso 2
+    prepararPaso2();
+}
+
+// Leer matrícula y cuentakilómetros en una sola petición (multipart, sin base64).
+// Con 'Prefer: respond-async' el servidor puede encolar la lectura (202)
+async function leerVehiculo(imagenCuentakilometros) {
+    const datos = new FormData();
+    datos.append('matricula', imagenMatricula, 'matricula.jpg');
+    datos.append('cuentakilometros', imagenCuentakilometros, 'cuentakilometros.jpg');
+    
+    const response = await fetch('/ocr/vehiculo', {
+        method: 'POST',
+        headers: { 'Prefer': 'respond-async' },
+        body: datos
+    });
+    return resultadoOCR(response);
+}
+
+// Mostrar la lectura del vehículo y guardarlo. Si falla la matrícula se
+// vuelve al paso 1; si solo falla el cuentakilómetros, se repite el paso 2
+async function aplicarLecturaVehiculo(resultado) {
+    if (resultado.matricula) {
+        matriculaCapturada = resultado.matricula;
+        matriculaSpan.textContent = matriculaCapturada;
+    }
+    
+    if (resultado.exito) {
+        kilometrosCapturados = resultado.kilometros;
+        kilometrosSpan.textContent = kilometrosCapturados;
+        
+        // Guardar vehículo y volver
+        await guardarVehiculo();
+        return;
+    }
+    
+    alert('Error al procesar el vehículo: ' + (resultado.error || 'Error desconocido'));
+    if (resultado.matricula) {
+        btnCapturar.disabled = false;
+    } else {
+        prepararPaso1();
+    }
+}
+
 // Guardar vehículo en el servidor
-async function guardarVehiculo() {
+async function guardarVehiculo(confirmar = false) {
     try {
         mostrarLoader('Guardando vehículo...');
         
@@ -180,7 +184,8 @@ async function guardarVehiculo() {
             },
             body: JSON.stringify({
                 matricula: matriculaCapturada,
-                kilometros: kilometrosCapturados
+                kilometros: kilometrosCapturados,
+                confirmar: confirmar
             })
         });
         
@@ -188,6 +193,21 @@ async function guardarVehiculo() {
         
         ocultarLoader();
         
+        if (response.status === 409 && resultado.plausibilidad) {
+            // El kilometraje no encaja con el historial de la matrícula
+            const guardar = confirm(
+                `⚠️ ${resultado.plausibilidad.motivo}.\n\n` +
+                `Lectura: ${kilometrosCapturados} km\n\n` +
+                '¿Guardar de todos modos? Pulsa Cancelar para volver a leer el cuentakilómetros.'
+            );
+            if (guardar) {
+                await guardarVehiculo(true);
+            } else {
+                volverALeerKilometraje();
+            }
+            return;
+        }
+        
         if (resultado.success) {
             // Detener cámara
             detenerCamara();
@@ -205,6 +225,18 @@ async function guardarVehiculo() {
     }
 }
 
+// Repetir el paso 2 tras una lectura de kilometraje no plausible
+function volverALeerKilometraje() {
+    kilometrosCapturados = '';
+    kilometrosSpan.textContent = '-';
+    if (modoManual) {
+        inputKilometraje.value = '';
+        inputKilometraje.focus();
+    } else {
+        prepararPaso2();
+    }
+}
+
 // Capturar imagen del video
 function capturarImagen() {
     // Ajustar canvas al tamaño del video
@@ -215,8 +247,68 @@ function capturarImagen() {
     const ctx = canvas.getContext('2d');
     ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
     
-    // Convertir a base64
-    return canvas.toDataURL('image/jpeg', 0.9);
+    return imagenCanvas();
+}
+
+// Codificar el contenido del canvas como JPEG binario (Blob)
+function imagenCanvas() {
+    return new Promise((resolve, reject) => {
+        canvas.toBlob(
+            (blob) => blob ? resolve(blob) : reject(new Error('No se pudo codificar la imagen')),
+            'image/jpeg',
+            0.9
+        );
+    });
+}
+
+// Enviar una imagen JPEG al servidor como cuerpo binario, sin base64.
+// Con 'Prefer: respond-async' el servidor puede encolar la lectura (202)
+function enviarImagen(url, imagen, parametros = {}) {
+    const query = new URLSearchParams(
+        Object.entries(parametros).filter(([, valor]) => valor)
+    ).toString();
+    return fetch(query ? `${url}?${query}` : url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'image/jpeg',
+            'Prefer': 'respond-async'
+        },
+        body: imagen
+    });
+}
+
+// Tiempo máximo esperando un trabajo encolado antes de darlo por perdido
+const ESPERA_MAXIMA_TRABAJO_MS = 120000;
+
+// Resultado de una lectura OCR. Si el servidor la ha encolado (202),
+// consultar el trabajo hasta que termine o se agote ESPERA_MAXIMA_TRABAJO_MS
+async function resultadoOCR(response) {
+    if (response.status !== 202) {
+        return response.json();
+    }
+    
+    const trabajo = await response.json();
+    const limite = Date.now() + ESPERA_MAXIMA_TRABAJO_MS;
+    let espera = 300;
+    while (true) {
+        if (Date.now() + espera > limite) {
+            return {
+                exito: false,
+                error: 'La lectura está tardando demasiado; inténtalo de nuevo en unos minutos'
+            };
+        }
+        await new Promise(resolve => setTimeout(resolve, espera));
+        const consulta = await fetch(trabajo.url);
+        const estado = await consulta.json();
+        
+        if (estado.estado === 'completado') {
+            return estado.resultado;
+        }
+        if (!consulta.ok || estado.estado === 'error') {
+            return { exito: false, error: estado.error || 'Error desconocido' };
+        }
+        espera = Math.min(espera * 1.5, 2000);
+    }
 }
 
 // Convertir imagen cargada a base64
@@ -357,48 +449,16 @@ btnCapturar.addEventListener('click', async function() {
     }
 });
 
-// Procesar matrícula desde imagen cargada
+// Guardar la matrícula desde imagen cargada (se lee en el paso 2)
 async function procesarMatriculaImagen() {
     try {
         btnCapturar.disabled = true;
-        mostrarLoader('Procesando matrícula...');
-        
-        // La imagen ya está en el canvas, convertir a base64
-        const imageData = canvas.toDataURL('image/jpeg', 0.9);
-        
-        // Enviar al servidor
-        const response = await fetch('/ocr/matricula', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
-        });
-        
-        if (!response.ok) {
-            throw new Error(`Error del servidor: ${response.status}`);
-        }
-        
-        const resultado = await response.json();
         
-        ocultarLoader();
-        
-        if (resultado.exito) {
-            matriculaCapturada = resultado.matricula;
-            matriculaSpan.textContent = matriculaCapturada;
-            resultadosTemp.style.display = 'block';
-            
-            // Preparar para paso 2
-            prepararPaso2();
-            
-        } else {
-            alert('Error al procesar matrícula: ' + (resultado.error || 'Error desconocido'));
-            btnCapturar.disabled = false;
-        }
+        // La imagen ya está en el canvas, codificar como JPEG
+        guardarImagenMatricula(await imagenCanvas());
         
     } catch (error) {
         console.error('Error completo:', error);
-        ocultarLoader();
         alert('Error al procesar matrícula: ' + error.message);
         btnCapturar.disabled = false;
     }
@@ -408,46 +468,20 @@ async function procesarMatriculaImagen() {
 async function procesarKilometrajeImagen() {
     try {
         btnCapturar.disabled = true;
-        mostrarLoader('Procesando kilometraje...');
-        
-        // La imagen ya está en el canvas, convertir a base64
-        const imageData = canvas.toDataURL('image/jpeg', 0.9);
-        
-        console.log('Enviando imagen de kilometraje, tamaño:', imageData.length);
-        
-        // Enviar al servidor
-        const response = await fetch('/ocr/cuentakilometros', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
-        });
+        mostrarLoader('Procesando matrícula y kilometraje...');
         
-        console.log('Respuesta recibida:', response.status, response.statusText);
+        // La imagen ya está en el canvas, codificar como JPEG
+        const imagen = await imagenCanvas();
         
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('Error del servidor:', errorText);
-            throw new Error(`Error del servidor (${response.status}): ${errorText.substring(0, 100)}`);
-        }
+        console.log('Enviando imagen de kilometraje, tamaño:', imagen.size);
         
-        const resultado = await response.json();
+        // Leer ambas fotos en una sola petición
+        const resultado = await leerVehiculo(imagen);
         console.log('Resultado:', resultado);
         
         ocultarLoader();
         
-        if (resultado.exito) {
-            kilometrosCapturados = resultado.kilometros;
-            kilometrosSpan.textContent = kilometrosCapturados;
-            
-            // Guardar vehículo y volver
-            await guardarVehiculo();
-            
-        } else {
-            alert('Error al procesar kilometraje: ' + (resultado.error || 'Error desconocido'));
-            btnCapturar.disabled = false;
-        }
+        await aplicarLecturaVehiculo(resultado);
         
     } catch (error) {
         console.error('Error completo:', error);
@@ -457,6 +491,37 @@ async function procesarKilometrajeImagen() {
     }
 }
 
+// Volver al paso 1 (p. ej. si no se pudo leer la matrícula)
+function prepararPaso1() {
+    pasoActual = 1;
+    imagenMatricula = null;
+    matriculaCapturada = '';
+    pasoActualSpan.textContent = '1';
+    pasoTextoSpan.textContent = 'Matrícula';
+    matriculaSpan.textContent = '-';
+    btnManual.style.display = 'none';
+    
+    if (stream !== null && usingCamera) {
+        btnTexto.textContent = 'Capturar Matrícula';
+        statusText.textContent = 'Cámara lista - Captura la matrícula';
+        btnCapturar.disabled = false;
+        btnCapturar.querySelector('.btn-icon').textContent = '📸';
+        video.style.display = 'block';
+        canvas.style.display = 'none';
+        dropZone.style.display = 'none';
+    } else {
+        usingCamera = false;
+        btnTexto.textContent = 'Cargar Imagen';
+        statusText.textContent = 'Arrastra o selecciona la imagen de la matrícula';
+        statusIndicator.classList.remove('status-ready');
+        canvas.style.display = 'none';
+        video.style.display = 'none';
+        dropZone.style.display = 'flex';
+        btnCapturar.disabled = true;
+        btnCapturar.querySelector('.btn-icon').textContent = '📁';
+    }
+}
+
 // Preparar interfaz para paso 2
 function prepararPaso2() {
     pasoActual = 2;
@@ -526,6 +591,29 @@ async function confirmarKilometrajeManual() {
         return;
     }
     
+    // Sin foto del cuentakilómetros, la matrícula se lee sola
+    if (!matriculaCapturada) {
+        try {
+            mostrarLoader('Procesando matrícula...');
+            const resultado = await resultadoOCR(await enviarImagen('/ocr/matricula', imagenMatricula));
+            ocultarLoader();
+            
+            if (!resultado.exito) {
+                alert('Error al procesar matrícula: ' + (resultado.error || 'Error desconocido'));
+                cancelarEntradaManual();
+                prepararPaso1();
+                return;
+            }
+            matriculaCapturada = resultado.matricula;
+            matriculaSpan.textContent = matriculaCapturada;
+        } catch (error) {
+            console.error('Error:', error);
+            ocultarLoader();
+            alert('Error al procesar matrícula: ' + error.message);
+            return;
+        }
+    }
+    
     // Guardar kilometraje
     kilometrosCapturados = km;
     kilometrosSpan.textContent = kilometrosCapturados;
@@ -0,0 +1,137 @@
+import io
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+os.environ.update({
+    'OCR_MOTORES': 'simulado',
+    'VEHICULOS_ALMACEN': 'memoria',
+    'LOGIN_USERS': 'prueba:clave',
+    'OCR_PRECALENTAR': '0',
+    'OCR_COLA': '0',
+})
+
+import app as aplicacion  # noqa: E402
+import registro  # noqa: E402
+
+
+@pytest.fixture(scope='module', autouse=True)
+def detener_registro():
+    # El hilo de registro escribe en la salida que captura pytest: se vacía
+    # y se detiene antes de que pytest la cierre
+    yield
+    registro._detener()
+
+
+@pytest.fixture
+def cliente():
+    aplicacion.app.config['TESTING'] = True
+    with aplicacion.app.test_client() as cliente:
+        cliente.post('/login', data={'username': 'prueba', 'password': 'clave'})
+        yield cliente
+
+
+def test_agregar_vehiculo_normaliza_la_matricula(cliente):
+    respuesta = cliente.post('/agregar_vehiculo', json={'matricula': ' 1234-abc ', 'kilometros': '15000'})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['vehiculo']['matricula'] == '1234ABC'
+
+
+def test_agregar_vehiculo_normaliza_los_kilometros(cliente):
+    respuesta = cliente.post('/agregar_vehiculo', json={'matricula': '2468BCD', 'kilometros': '15.000 km'})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['vehiculo']['kilometros'] == '15000'
+
+
+def test_kilometros_no_validos(cliente):
+    respuesta = cliente.post('/agregar_vehiculo', json={'matricula': '1357CDF', 'kilometros': '1.234.567 km'})
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {'success': False, 'error': 'Kilometraje no válido'}
+
+
+def test_editar_vehiculo_normaliza_la_matricula(cliente):
+    vehiculo = cliente.post('/agregar_vehiculo', json={'matricula': '5678XYZ', 'kilometros': '20000'}).get_json()
+    respuesta = cliente.post('/editar_vehiculo', json={
+        'id': vehiculo['vehiculo']['id'], 'matricula': '5678 xyz', 'kilometros': '21000'})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['vehiculo']['matricula'] == '5678XYZ'
+
+
+def test_matricula_no_valida(cliente):
+    respuesta = cliente.post('/agregar_vehiculo', json={'matricula': '--', 'kilometros': '1000'})
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {'success': False, 'error': 'Matrícula no válida'}
+
+
+def jpeg():
+    # Con textura, para que el control de calidad no la rechace por borrosa
+    imagen = np.random.default_rng(0).integers(40, 220, (300, 400, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', imagen)[1].tobytes()
+
+
+def test_vehiculo_lee_ambas_fotos_de_un_formulario(cliente):
+    # Así envía las fotos la pantalla de captura (static/js/captura.js)
+    respuesta = cliente.post('/ocr/vehiculo', headers={'Prefer': 'respond-async'}, data={
+        'matricula': (io.BytesIO(jpeg()), 'matricula.jpg'),
+        'cuentakilometros': (io.BytesIO(jpeg()), 'cuentakilometros.jpg'),
+    })
+    assert respuesta.status_code == 200
+    resultado = respuesta.get_json()
+    assert resultado['exito']
+    assert (resultado['matricula'], resultado['kilometros']) == ('1234ABC', '123456')
+
+
+# Cada endpoint conserva la clave de éxito del resto de sus respuestas
+@pytest.mark.parametrize('ruta, peticion, clave', [
+    ('/ocr/matricula', {'data': b'no es una imagen', 'content_type': 'image/jpeg'}, 'success'),
+    ('/ocr/matricula', {'json': {'image': 'data:image/jpeg;base64,bm8gZXMgdW5hIGltYWdlbg=='}}, 'success'),
+    ('/ocr/matricula', {'json': {'image': 'data:image/jpeg;base64,%%%'}}, 'success'),
+    ('/ocr/cuentakilometros', {'data': {'image': (io.BytesIO(b'texto'), 'foto.jpg')}}, 'exito'),
+    ('/ocr/vehiculo', {'json': {'matricula': 'bm8=', 'cuentakilometros': 'bm8='}}, 'exito'),
+])
+def test_imagen_no_valida_responde_400(cliente, ruta, peticion, clave):
+    respuesta = cliente.post(ruta, **peticion)
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {clave: False, 'error': 'Imagen no válida'}
+
+
+def test_imagen_no_valida_en_lote(cliente):
+    respuesta = cliente.post('/ocr/batch', json={'imagenes': [{'tipo': 'matricula', 'image': 'bm8='}]})
+    linea = json.loads(respuesta.get_data(as_text=True).splitlines()[0])
+    assert linea['exito'] is False
+    assert linea['error'] == 'Imagen no válida'
+
+
+def test_lote_admite_mas_que_el_limite_de_una_imagen(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'OCR_BATCH_MB_POR_IMAGEN', 10)
+    imagen = 'A' * (17 * 1024 * 1024)
+    respuesta = cliente.post('/ocr/batch', json={'imagenes': [{'tipo': 'matricula', 'image': imagen}]})
+    assert respuesta.status_code == 200
+    assert json.loads(respuesta.get_data(as_text=True).splitlines()[0])['error'] == 'Imagen no válida'
+
+
+def test_lote_demasiado_grande_responde_413(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'OCR_BATCH_MAX_IMAGENES', 1)
+    monkeypatch.setattr(aplicacion, 'OCR_BATCH_MB_POR_IMAGEN', 1)
+    imagen = 'A' * (17 * 1024 * 1024)
+    respuesta = cliente.post('/ocr/batch', json={'imagenes': [{'tipo': 'matricula', 'image': imagen}]})
+    assert respuesta.status_code == 413
+    assert respuesta.get_json() == {'success': False, 'error': 'El lote supera el máximo de 16 MB'}
+
+
+@pytest.mark.parametrize('limite, esperados', [('abc', 50), ('100000', 200), ('-5', 1), ('3', 3)])
+def test_listado_ajusta_el_limite(cliente, limite, esperados):
+    for i in range(210 - aplicacion.get_almacen().contar('prueba')):
+        aplicacion.get_almacen().agregar('prueba', f'{i:04d}LST', str(i))
+    respuesta = cliente.get(f'/api/vehiculos?limite={limite}')
+    assert respuesta.status_code == 200
+    assert len(respuesta.get_json()['vehiculos']) == esperados
+
+
+def test_listado_con_fecha_no_valida(cliente):
+    respuesta = cliente.get('/api/vehiculos?desde=ayer')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['error'].startswith('Parámetros del listado no válidos')
@@ -0,0 +1,47 @@
+import time
+
+from cola_ocr import ERROR, MAX_INTENTOS, PROCESANDO, ColaOCR
+
+
+def cola(tmp_path, **kwargs):
+    return ColaOCR(lambda *args: {'success': True}, str(tmp_path / 'cola.sqlite3'), **kwargs)
+
+
+def test_trabajo_abandonado_se_reintenta(tmp_path):
+    cola_ocr = cola(tmp_path, plazo=10)
+    id_trabajo = cola_ocr.encolar('u', 'matricula', {'imagen': b'datos'})
+    assert cola_ocr._reclamar()['id'] == id_trabajo
+
+    # Su proceso murió: pasado el plazo otro hilo lo vuelve a tomar
+    cola_ocr._conexion().execute("UPDATE trabajos SET iniciado = ?", (time.time() - 60,))
+    trabajo = cola_ocr._reclamar()
+    assert trabajo['id'] == id_trabajo
+    assert trabajo['imagenes'] == {'imagen': b'datos'}
+
+
+def test_trabajo_que_agota_los_intentos_queda_en_error(tmp_path):
+    cola_ocr = cola(tmp_path, plazo=10, ttl=0)
+    id_trabajo = cola_ocr.encolar('u', 'matricula', {'imagen': b'datos'})
+    conn = cola_ocr._conexion()
+    conn.execute("UPDATE trabajos SET estado = ?, intentos = ?, iniciado = ?",
+                 (PROCESANDO, MAX_INTENTOS, time.time() - 60))
+
+    assert cola_ocr._reclamar() is None
+    trabajo = cola_ocr.consultar(id_trabajo, 'u')
+    assert trabajo['estado'] == ERROR
+    assert 'plazo' in trabajo['error']
+    assert conn.execute("SELECT COUNT(*) FROM imagenes_trabajo").fetchone()[0] == 0
+
+    # La limpieza normal lo borra tras el TTL
+    time.sleep(0.01)
+    cola_ocr._limpiar()
+    assert cola_ocr.consultar(id_trabajo, 'u') is None
+
+
+def test_trabajo_en_plazo_no_se_toca(tmp_path):
+    cola_ocr = cola(tmp_path, plazo=300)
+    id_trabajo = cola_ocr.encolar('u', 'matricula', {'imagen': b'datos'})
+    cola_ocr._conexion().execute("UPDATE trabajos SET estado = ?, intentos = ?, iniciado = ?",
+                                 (PROCESANDO, MAX_INTENTOS, time.time()))
+    assert cola_ocr._reclamar() is None
+    assert cola_ocr.consultar(id_trabajo, 'u')['estado'] == PROCESANDO
@@ -0,0 +1,28 @@
+import os
+
+from almacen_vehiculos import AlmacenVehiculos, AlmacenVehiculosSQLite
+from cola_ocr import ColaOCR
+
+
+def test_ficheros_en_el_directorio_de_datos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATOS_DIR', str(tmp_path / 'datos'))
+    monkeypatch.setenv('VEHICULOS_ALMACEN', 'sqlite')
+    monkeypatch.delenv('VEHICULOS_RUTA', raising=False)
+    monkeypatch.delenv('OCR_COLA_RUTA', raising=False)
+
+    AlmacenVehiculos.desde_entorno().agregar('u', '1234ABC', '1000')
+    ColaOCR.desde_entorno(lambda *args: {})
+    assert sorted(f for f in os.listdir(tmp_path / 'datos') if f.endswith('.sqlite3')) == [
+        'ocr_cola.sqlite3', 'vehiculos.sqlite3']
+
+
+def test_se_conserva_el_fichero_de_vehiculos_anterior(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATOS_DIR', str(tmp_path / 'datos'))
+    monkeypatch.setenv('VEHICULOS_ALMACEN', 'sqlite')
+    monkeypatch.delenv('VEHICULOS_RUTA', raising=False)
+    AlmacenVehiculosSQLite('vehiculos.sqlite3').agregar('u', '1234ABC', '1000')
+
+    assert AlmacenVehiculos.desde_entorno().contar('u') == 1
+    assert not os.path.exists(tmp_path / 'datos' / 'vehiculos.sqlite3')
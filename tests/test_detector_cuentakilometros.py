@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+from detector_cuentakilometros import leer_tira
+
+SEGMENTOS = {
+    '0': 'abcdef', '1': 'bc', '2': 'abdeg', '3': 'abcdg', '4': 'bcfg',
+    '5': 'acdfg', '6': 'acdefg', '7': 'abc', '8': 'abcdefg', '9': 'abcdfg',
+}
+
+
+def display(texto, alto=60):
+    """Tira sintética de un display LCD de siete segmentos (trazos oscuros sobre fondo claro)"""
+    ancho, trazo = int(alto * 0.55), alto // 10
+    tira = np.full((alto + 20, len(texto) * (ancho + 12) + 20), 200, np.uint8)
+    for i, caracter in enumerate(texto):
+        x, y, medio = 10 + i * (ancho + 12), 10, 10 + alto // 2
+        zonas = {
+            'a': (x + trazo, y, x + ancho - trazo, y + trazo),
+            'b': (x + ancho - trazo, y + trazo, x + ancho, medio - 2),
+            'c': (x + ancho - trazo, medio + 2, x + ancho, y + alto - trazo),
+            'd': (x + trazo, y + alto - trazo, x + ancho - trazo, y + alto),
+            'e': (x, medio + 2, x + trazo, y + alto - trazo),
+            'f': (x, y + trazo, x + trazo, medio - 2),
+            'g': (x + trazo, medio - trazo // 2, x + ancho - trazo, medio + trazo // 2),
+        }
+        for segmento in SEGMENTOS[caracter]:
+            x0, y0, x1, y1 = zonas[segmento]
+            cv2.rectangle(tira, (x0, y0), (x1 - 1, y1 - 1), 30, -1)
+    return tira
+
+
+def barras(ancho, n=5, alto=60):
+    """Tira clara con n barras oscuras macizas"""
+    tira = np.full((alto + 20, n * 40 + 20), 200, np.uint8)
+    for i in range(n):
+        cv2.rectangle(tira, (15 + i * 40, 18), (15 + i * 40 + ancho, 18 + int(alto * 0.75)), 30, -1)
+    return tira
+
+
+@pytest.mark.parametrize('texto', ['1081', '1111', '9119', '7410', '2589'])
+def test_lee_displays_de_siete_segmentos(texto):
+    lectura, confianza = leer_tira(display(texto))
+    assert lectura == texto
+    assert confianza >= 0.8
+
+
+@pytest.mark.parametrize('ancho', [6, 10, 14, 18, 25])
+def test_barras_macizas_no_se_leen_como_digitos(ancho):
+    _, confianza = leer_tira(barras(ancho))
+    assert confianza < 0.8
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from llamadas_gemini import LlamadorGemini
+from registro import id_peticion
+
+
+class ModeloLento:
+    """Primera petición lenta y las siguientes rápidas; anota el id de petición de cada una"""
+
+    def __init__(self, esperas):
+        self.esperas = list(esperas)
+        self.ids = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, partes, request_options=None, **kwargs):
+        with self._lock:
+            espera = self.esperas.pop(0) if self.esperas else 0.0
+            self.ids.append(id_peticion.get())
+        time.sleep(espera)
+        return 'ok'
+
+
+def test_cobertura_gana_a_la_peticion_lenta_con_el_contexto_de_registro():
+    modelo = ModeloLento([5.0, 0.1])
+    llamador = LlamadorGemini(modelo, plazo=2.0, retardo_cobertura=0.3)
+    token = id_peticion.set('peticion-1')
+    try:
+        inicio = time.monotonic()
+        assert llamador.generar(['prompt']) == 'ok'
+        assert time.monotonic() - inicio < 1.0
+    finally:
+        id_peticion.reset(token)
+
+    assert modelo.ids == ['peticion-1', 'peticion-1']
+    estadisticas = llamador.estadisticas()
+    assert estadisticas['coberturas'] == 1
+    assert estadisticas['coberturas_ganadoras'] == 1
+    assert estadisticas['plazos_agotados'] == 0
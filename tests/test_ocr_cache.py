@@ -0,0 +1,35 @@
+import time
+
+from ocr_cache import CacheOCR, calcular_clave
+
+
+def entradas(cache):
+    return cache._conexion().execute("SELECT COUNT(*) FROM cache_ocr").fetchone()[0]
+
+
+def test_purga_solo_cada_purga_cada_escrituras(tmp_path):
+    cache = CacheOCR(max_memoria=0, ruta_disco=str(tmp_path / 'cache.sqlite3'), max_disco=5, purga_cada=10)
+    for i in range(10):
+        cache.guardar(f'clave{i}', {'texto': str(i)})
+    # Solo la primera escritura purga: entre purgas se admiten más de max_disco
+    assert entradas(cache) == 10
+
+    cache.guardar('clave10', {'texto': '10'})
+    assert entradas(cache) == 5
+    assert cache.obtener('clave10') == {'texto': '10'}
+    assert cache.obtener('clave0') is None
+
+
+def test_purga_caducadas(tmp_path):
+    cache = CacheOCR(max_memoria=0, ruta_disco=str(tmp_path / 'cache.sqlite3'), ttl=60, purga_cada=2)
+    cache.guardar('antigua', {'texto': 'a'})
+    cache._conexion().execute("UPDATE cache_ocr SET creado = ?", (time.time() - 3600,))
+    cache._conexion().commit()
+    cache.guardar('nueva', {'texto': 'b'})
+    cache.guardar('otra', {'texto': 'c'})
+    assert entradas(cache) == 2
+
+
+def test_clave_de_los_bytes_originales():
+    assert calcular_clave(b'jpeg', 'matricula', 'v1') == calcular_clave(b'jpeg', 'matricula', 'v1')
+    assert calcular_clave(b'jpeg', 'matricula', 'v1') != calcular_clave(b'jpeg', 'cuentakilometros', 'v1')
@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+from calidad_imagen import ControlCalidad
+from ocr_cache import CacheOCR
+from ocr_imagen import ImagenOCR
+from ocr_processor import OCRProcessor
+
+
+def foto(color):
+    imagen = np.full((300, 400, 3), color, np.uint8)
+    return ImagenOCR.desde_bytes(cv2.imencode('.jpg', imagen)[1].tobytes())
+
+
+class MotorCombinado:
+    """Llamador falso: la petición combinada no lee el cuentakilómetros y la individual sí"""
+
+    def generar(self, contenido, **kwargs):
+        if len(contenido) == 3:
+            texto = '{"matricula": "1234ABC", "kilometros": "NO_DETECTADO"}'
+        else:
+            texto = '45678'
+        return type('Respuesta', (), {'text': texto})()
+
+
+def procesador(llamador=None, calidad=None):
+    ocr = OCRProcessor(motor='gemini', model=object(), llamador=llamador, cache=CacheOCR(max_memoria=16),
+                       umbral_lectura_local=None,
+                       calidad=calidad or ControlCalidad(activo=False))
+    ocr.preprocesador.detectar_matricula = False
+    return ocr
+
+
+def test_vehiculo_con_matricula_en_cache_y_cuentakilometros_local():
+    ocr = procesador()
+    matricula, cuentakilometros = foto(120), foto(60)
+    ocr.cache.guardar(ocr._clave(matricula, 'matricula'),
+                      {'texto': '1234ABC', 'confianza': 0.95, 'metodo': 'gemini'}, 1.0)
+    ocr._leer_cuentakilometros_local = lambda imagen: {'texto': '45678', 'confianza': 0.82, 'metodo': 'local_7seg'}
+
+    resultado = ocr.procesar_vehiculo(matricula, cuentakilometros)
+    assert resultado['exito']
+    assert resultado['metodo'] == 'cache+local_7seg'
+    assert resultado['confianza'] == 0.82
+    assert resultado['campos'] == {
+        'matricula': {'metodo': 'cache', 'confianza': 0.95},
+        'kilometros': {'metodo': 'local_7seg', 'confianza': 0.82},
+    }
+
+
+def test_vehiculo_combinado_con_relectura_individual():
+    ocr = procesador(MotorCombinado())
+    resultado = ocr.procesar_vehiculo(foto(120), foto(60))
+    assert (resultado['matricula'], resultado['kilometros']) == ('1234ABC', '45678')
+    assert resultado['metodo'] == 'gemini_combinado+gemini'
+    assert resultado['campos']['matricula']['metodo'] == 'gemini_combinado'
+    assert resultado['campos']['kilometros']['metodo'] == 'gemini'
+
+
+class CalidadContador(ControlCalidad):
+    """Control de calidad que cuenta las imágenes evaluadas"""
+
+    def __init__(self):
+        super().__init__(lado_min=0, nitidez_min=0, brillo_min=0)
+        self.evaluadas = 0
+
+    def evaluar(self, imagen):
+        self.evaluadas += 1
+        return super().evaluar(imagen)
+
+
+def test_vehiculo_evalua_la_calidad_una_vez_por_imagen():
+    calidad = CalidadContador()
+    ocr = procesador(MotorCombinado(), calidad)
+    resultado = ocr.procesar_vehiculo(foto(120), foto(60))
+    assert resultado['campos']['kilometros']['metodo'] == 'gemini'
+    assert calidad.evaluadas == 2
+
+
+class MotorContador:
+    """Llamador falso que cuenta las llamadas"""
+
+    def __init__(self):
+        self.llamadas = 0
+
+    def generar(self, contenido, **kwargs):
+        self.llamadas += 1
+        return type('Respuesta', (), {'text': '1234ABC'})()
+
+
+def test_reenvio_de_la_misma_foto_se_sirve_de_la_cache():
+    llamador = MotorContador()
+    ocr = procesador(llamador)
+    datos = foto(120).datos
+    for _ in range(3):
+        assert ocr.procesar_matricula(ImagenOCR.desde_bytes(datos))['matricula'] == '1234ABC'
+    assert llamador.llamadas == 1
+
+
+def test_lectura_por_debajo_de_la_confianza_minima_no_se_cachea():
+    llamador = MotorContador()
+    ocr = procesador(llamador)
+    ocr.enrutador.confianza_min = 0.99
+    datos = foto(120).datos
+    for _ in range(2):
+        resultado = ocr.extraer_texto_ocr(ImagenOCR.desde_bytes(datos), 'matricula')
+        assert resultado['texto'] == '1234ABC' and not resultado.get('cache')
+    assert llamador.llamadas == 2
@@ -0,0 +1,37 @@
+"""
+Reglas de limpieza y validación de matrículas y cuentakilómetros.
+
+Las comparten el OCR (OCRProcessor) y la importación masiva de registros,
+de modo que un vehículo importado cumple las mismas reglas que uno leído
+de una foto. No dependen de Gemini ni de OpenCV.
+"""
+
+import re
+
+_NO_ALFANUMERICO = re.compile(r'[^A-Z0-9]')
+_NO_DIGITO = re.compile(r'[^0-9]')
+
+
+def limpiar_matricula(texto):
+    """Limpia y valida el formato de matrícula ('' si no es válida)"""
+    # Eliminar espacios, guiones y caracteres no alfanuméricos
+    texto = _NO_ALFANUMERICO.sub('', texto.upper())
+
+    # Validar formato europeo típico (4 números + 3 letras o similar)
+    if len(texto) < 4 or len(texto) > 10:
+        return ''
+
+    return texto
+
+
+def limpiar_cuentakilometros(texto):
+    """Limpia y valida los números del cuentakilómetros ('' si no son válidos)"""
+    # Extraer solo dígitos
+    texto = _NO_DIGITO.sub('', texto)
+
+    # Validar rango razonable (entre 0 y 999999 km)
+    if not texto or len(texto) > 6:
+        return ''
+
+    # Eliminar ceros a la izquierda pero mantener al menos un dígito
+    return texto.lstrip('0') or '0'